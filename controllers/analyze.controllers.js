@@ -1,7 +1,9 @@
-import { PythonShell } from "python-shell";
 import axios from "axios";
 import fs from "fs";
+import path from "path";
 import { User } from "../models/users.models.js"; // Adjust path as needed
+import { PythonWorkerPool } from "../services/pythonWorkerPool.js";
+import { JobQueue, QueueFullError } from "../services/analysisQueue.js";
 
 const prototypePrompt1 = fs.readFileSync("prompts/prompt1.txt", "utf8");
 
@@ -9,72 +11,107 @@ const prototypePrompt1 = fs.readFileSync("prompts/prompt1.txt", "utf8");
 const OPENAI_API_KEY =
   process.env.OPENAI_API_KEY;
 
-async function runPoseDetector(imagePath) {
-  return new Promise((resolve, reject) => {
-    // Validate file exists
-    if (!fs.existsSync(imagePath)) {
-      return reject(new Error("Image file not found"));
-    }
+// Long-lived Python workers, so cv2/mediapipe/sklearn are imported once
+const analysisWorkers = new PythonWorkerPool("tools/analyze_image.py");
 
-    const imageBuffer = fs.readFileSync(imagePath);
-    const base64Image = imageBuffer.toString("base64");
+// Bounds how many analyses (Python + GPT) run at once and how many may wait;
+// one running job per Python worker keeps memory flat under bursts
+const analysisQueue = new JobQueue({
+  concurrency: parseInt(process.env.ANALYSIS_CONCURRENCY, 10) || analysisWorkers.size,
+});
 
-    const pyshell = new PythonShell("tools/pose_detector.py");
-    let output = "";
+// Ask the workers for per-stage timings on every request (ANALYSIS_METRICS=1)
+const ANALYSIS_METRICS = process.env.ANALYSIS_METRICS === "1";
 
-    pyshell.on("message", (message) => {
-      output += message + "\n";
-    });
+// Let ?profile=1 run cProfile in the worker (ANALYSIS_PROFILING=1). Off by
+// default: profiling slows the job down and any caller could ask for it
+const ANALYSIS_PROFILING = process.env.ANALYSIS_PROFILING === "1";
 
-    pyshell.on("stderr", (stderr) => {
-      console.error("Python stderr:", stderr);
-    });
+function wantsProfile(req) {
+  return ANALYSIS_PROFILING && req.query?.profile === "1";
+}
 
-    pyshell.send(JSON.stringify({ image: base64Image }));
+// Pre-flight check of resolution, blur and exposure on a 256 px decode. It
+// takes a few milliseconds and runs before a job is queued, so unreadable
+// or too small uploads never reach MediaPipe or GPT; its other findings
+// are returned with the analysis as warnings
+const qualityWorkers = new PythonWorkerPool("tools/quality_gate.py", {
+  size: parseInt(process.env.QUALITY_WORKERS, 10) || 1,
+});
 
-    pyshell.end((err) => {
-      if (err) return reject(err);
-      resolve(output.trim());
-    });
-  });
-}
+// Also require a detectable face or person (QUALITY_PRESENCE_CHECK=1)
+const QUALITY_PRESENCE_CHECK = process.env.QUALITY_PRESENCE_CHECK === "1";
 
-async function runToneDetector(imagePath, landmarkResponse) {
-  return new Promise((resolve, reject) => {
-    // Validate file exists
-    if (!fs.existsSync(imagePath)) {
-      return reject(new Error("Image file not found"));
-    }
+// A stuck quality check must not hold the upload back for long
+const QUALITY_TIMEOUT_MS = 5000;
 
-    const imageBuffer = fs.readFileSync(imagePath);
-    const base64Image = imageBuffer.toString("base64");
+// Resolves to the quality gate's verdict, or null when the gate itself
+// failed; analysis then goes ahead as before
+async function checkImageQuality(imagePath) {
+  try {
+    const result = await qualityWorkers.run(
+      { image_path: path.resolve(imagePath), presence: QUALITY_PRESENCE_CHECK },
+      null,
+      { timeoutMs: QUALITY_TIMEOUT_MS }
+    );
+    if (result.error) throw new Error(result.error);
+    return result;
+  } catch (error) {
+    console.error("Image quality check error:", error);
+    return null;
+  }
+}
 
-    const pyshell = new PythonShell("tools/skintone_detector.py");
-    let output = "";
+// Answers 422 with the reasons, and deletes the upload, only when the image
+// cannot be analyzed at all (unreadable, or below the minimum size).
+// Resolves to null when the request was answered, otherwise to the gate's
+// warnings (exposure, blur, no person found) for the analysis result.
+async function screenUpload(res, imagePath) {
+  const quality = await checkImageQuality(imagePath);
+  if (!quality) return [];
+  if (quality.ok) return quality.warnings || [];
+
+  removeUpload(imagePath);
+  res.status(422).json({
+    error: quality.reasons.map((reason) => reason.message).join("; "),
+    reasons: quality.reasons,
+    measurements: quality.measurements,
+  });
+  return null;
+}
 
-    pyshell.on("message", (message) => {
-      output += message + "\n";
-    });
+// Adds the quality gate's warnings to an analysis result
+function withQualityWarnings(result, warnings) {
+  return warnings.length ? { ...result, qualityWarnings: warnings } : result;
+}
 
-    pyshell.on("stderr", (stderr) => {
-      console.error("Python stderr:", stderr);
-    });
+// Runs pose and skin tone detection in one pass over a single decode.
+// With profile set the worker also runs cProfile and returns a summary.
+async function runImageAnalysis(imagePath, { profile = false, signal = null } = {}) {
+  // Validate file exists
+  if (!fs.existsSync(imagePath)) {
+    throw new Error("Image file not found");
+  }
 
-    pyshell.send(
-      JSON.stringify({
-        image: base64Image,
-        keypoints_text: landmarkResponse,
-      })
-    );
+  // The worker decodes straight from the file multer already wrote
+  const payload = { image_path: path.resolve(imagePath) };
+  if (ANALYSIS_METRICS) payload.metrics = true;
+  if (profile) payload.profile = true;
 
-    pyshell.end((err) => {
-      if (err) return reject(err);
-      resolve(output.trim());
-    });
-  });
+  const result = await analysisWorkers.run(payload, null, { signal });
+  if (result.error) throw new Error(result.error);
+
+  if (result.timings) {
+    console.log("Analysis timings:", JSON.stringify(result.timings));
+    console.log("Analysis metrics:", JSON.stringify(result.metrics));
+  }
+  if (result.profile) {
+    console.log("Analysis profile:\n" + result.profile.top_cumulative.join("\n"));
+  }
+  return result;
 }
 
-async function getBodyShapeFromGPT(landmarkResponse, toneResponse, imagePath) {
+async function getBodyShapeFromGPT(landmarkResponse, toneResponse, imagePath, signal = null) {
   const messages = [
     {
       role: "system",
@@ -125,6 +162,7 @@ async function getBodyShapeFromGPT(landmarkResponse, toneResponse, imagePath) {
           "Content-Type": "application/json",
           Authorization: `Bearer ${process.env.OPENAI_API_KEY}`,
         },
+        signal,
       }
     );
 
@@ -188,10 +226,14 @@ function extractUndertone(gptResponse) {
 }
 
 // Helper function to save user body info
-async function saveUserBodyInfo(userId, bodyShape, undertone) {
+async function saveUserBodyInfo(userId, bodyShape, undertone, skinColorRgb = null) {
   try {
     const updateData = {};
     
+    if (Array.isArray(skinColorRgb) && skinColorRgb.length === 3) {
+      updateData['userBodyInfo.skinColorRgb'] = skinColorRgb;
+    }
+    
     if (bodyShape) {
       updateData['userBodyInfo.bodyShape'] = bodyShape;
     }
@@ -227,6 +269,102 @@ async function saveUserBodyInfo(userId, bodyShape, undertone) {
   }
 }
 
+// Deletes the multer upload once an analysis no longer needs it
+function removeUpload(imagePath) {
+  if (imagePath && fs.existsSync(imagePath)) {
+    try {
+      fs.unlinkSync(imagePath);
+    } catch (cleanupError) {
+      console.error("File cleanup error:", cleanupError);
+    }
+  }
+}
+
+// Runs work(signal) on the analysis queue and answers the request. With
+// ?async=1 the client gets 202 and a job id to poll; otherwise the response
+// waits for the job. A full queue is rejected at once with 503.
+async function submitAnalysisJob(req, res, imagePath, work, label) {
+  let job;
+  try {
+    job = analysisQueue.submit(
+      async (signal) => {
+        try {
+          return await work(signal);
+        } finally {
+          removeUpload(imagePath);
+        }
+      },
+      { owner: String(req.user._id) }
+    );
+  } catch (error) {
+    removeUpload(imagePath);
+    if (error instanceof QueueFullError) {
+      res.set("Retry-After", "5");
+      return res.status(503).json({ error: error.message });
+    }
+    throw error;
+  }
+
+  if (req.query?.async === "1") {
+    return res.status(202).json({
+      jobId: job.id,
+      status: job.status,
+      statusUrl: `/api/analyze/jobs/${job.id}`,
+    });
+  }
+
+  await job.done;
+  if (job.status === "done") return res.json(job.result);
+
+  console.error(`${label} error:`, job.error);
+  res
+    .status(job.statusCode || (job.timedOut ? 504 : 500))
+    .json({ error: job.error || "Processing failed" });
+}
+
+async function runAutoAnalysis({ imagePath, userId, profile }, signal) {
+  const analysis = await runImageAnalysis(imagePath, { profile, signal });
+  const landmarkResponse = analysis.pose;
+  const toneResponse = analysis.skin_tone;
+
+  // Without landmarks GPT has nothing to infer a body shape from
+  if (!landmarkResponse?.detected) {
+    throw Object.assign(
+      new Error("No person detected in the image; upload a clear full-body photo"),
+      { statusCode: 422 }
+    );
+  }
+
+  let bodyShapeResult = await getBodyShapeFromGPT(
+    landmarkResponse,
+    toneResponse,
+    imagePath,
+    signal
+  );
+
+  console.log("Tone response:", toneResponse);
+  console.log("Keypoints response:", landmarkResponse);
+  console.log("GPT response 1: ", bodyShapeResult);
+
+  // Extract and save body shape and undertone
+  const bodyShape = extractBodyShape(bodyShapeResult);
+  const undertone = extractUndertone(bodyShapeResult);
+  
+  let updatedUser = null;
+  if (bodyShape || undertone || toneResponse?.main_color_rgb) {
+    updatedUser = await saveUserBodyInfo(userId, bodyShape, undertone, toneResponse?.main_color_rgb);
+  }
+
+  return {
+    bodyShapeResult,
+    saved: {
+      bodyShape: bodyShape || 'Not detected',
+      undertone: undertone || 'Not detected',
+      updated: !!updatedUser
+    }
+  };
+}
+
 export const analyzeAuto = async (req, res) => {
   const imagePath = req.file?.path;
   const userId = req.user?._id; // Assuming you have user authentication middleware
@@ -235,48 +373,24 @@ export const analyzeAuto = async (req, res) => {
   if (!userId) return res.status(401).json({ error: "User authentication required" });
 
   try {
-    const landmarkResponse = await runPoseDetector(imagePath);
-    const toneResponse = await runToneDetector(imagePath, landmarkResponse);
-
-    let bodyShapeResult = await getBodyShapeFromGPT(
-      landmarkResponse,
-      toneResponse,
-      imagePath
+    const qualityWarnings = await screenUpload(res, imagePath);
+    if (!qualityWarnings) return;
+
+    const profile = wantsProfile(req);
+    await submitAnalysisJob(
+      req,
+      res,
+      imagePath,
+      async (signal) =>
+        withQualityWarnings(
+          await runAutoAnalysis({ imagePath, userId, profile }, signal),
+          qualityWarnings
+        ),
+      "analyzeAuto"
     );
-
-    console.log("Tone response:", toneResponse);
-    console.log("Keypoints response:", landmarkResponse);
-    console.log("GPT response 1: ", bodyShapeResult);
-
-    // Extract and save body shape and undertone
-    const bodyShape = extractBodyShape(bodyShapeResult);
-    const undertone = extractUndertone(bodyShapeResult);
-    
-    let updatedUser = null;
-    if (bodyShape || undertone) {
-      updatedUser = await saveUserBodyInfo(userId, bodyShape, undertone);
-    }
-
-    res.json({
-      bodyShapeResult,
-      saved: {
-        bodyShape: bodyShape || 'Not detected',
-        undertone: undertone || 'Not detected',
-        updated: !!updatedUser
-      }
-    });
   } catch (error) {
     console.error("analyzeAuto error:", error);
     res.status(500).json({ error: error.message || "Processing failed" });
-  } finally {
-    // Safe file cleanup
-    if (imagePath && fs.existsSync(imagePath)) {
-      try {
-        fs.unlinkSync(imagePath);
-      } catch (cleanupError) {
-        console.error("File cleanup error:", cleanupError);
-      }
-    }
   }
 };
 
@@ -335,6 +449,50 @@ export const analyzeManual = async (req, res) => {
   }
 };
 
+async function runHybridAnalysis({ imagePath, userId, profile, bodyShapeInput, gender }, signal) {
+  const analysis = await runImageAnalysis(imagePath, { profile, signal });
+  const landmarkResponse = analysis.pose;
+  const toneResponse = analysis.skin_tone;
+
+  const requestData = {
+    body_shape: bodyShapeInput,
+    gender: gender || "female",
+  };
+
+  let bodyShapeResult = await getBodyShapeFromGPT(
+    requestData,
+    toneResponse,
+    imagePath,
+    signal
+  );
+
+  console.log("Tone response:", toneResponse);
+  console.log("Keypoints response:", landmarkResponse);
+  console.log("GPT response 1: ", bodyShapeResult);
+
+  // For hybrid, use manual body shape and detected undertone
+  const bodyShape = bodyShapeInput.toLowerCase().trim();
+  const undertone = extractUndertone(bodyShapeResult);
+  
+  // Validate body shape
+  const validShapes = ['rectangle', 'hourglass', 'pear', 'apple', 'inverted triangle'];
+  const validBodyShape = validShapes.includes(bodyShape) ? bodyShape : null;
+  
+  let updatedUser = null;
+  if (validBodyShape || undertone || toneResponse?.main_color_rgb) {
+    updatedUser = await saveUserBodyInfo(userId, validBodyShape, undertone, toneResponse?.main_color_rgb);
+  }
+
+  return {
+    bodyShapeResult,
+    saved: {
+      bodyShape: validBodyShape || 'Invalid body shape',
+      undertone: undertone || 'Not detected',
+      updated: !!updatedUser
+    }
+  };
+}
+
 export const analyzeHybrid = async (req, res) => {
   const imagePath = req.file?.path;
   const userId = req.user?._id; // Assuming you have user authentication middleware
@@ -348,56 +506,36 @@ export const analyzeHybrid = async (req, res) => {
   }
 
   try {
-    const landmarkResponse = await runPoseDetector(imagePath);
-    const toneResponse = await runToneDetector(imagePath, landmarkResponse);
-
-    const requestData = {
-      body_shape: req.body.body_shape,
-      gender: req.body.gender || "female",
+    const qualityWarnings = await screenUpload(res, imagePath);
+    if (!qualityWarnings) return;
+
+    const job = {
+      imagePath,
+      userId,
+      profile: wantsProfile(req),
+      bodyShapeInput: req.body.body_shape,
+      gender: req.body.gender,
     };
-
-    let bodyShapeResult = await getBodyShapeFromGPT(
-      requestData,
-      toneResponse,
-      imagePath
+    await submitAnalysisJob(
+      req,
+      res,
+      imagePath,
+      async (signal) =>
+        withQualityWarnings(await runHybridAnalysis(job, signal), qualityWarnings),
+      "analyzeHybrid"
     );
-
-    console.log("Tone response:", toneResponse);
-    console.log("Keypoints response:", landmarkResponse);
-    console.log("GPT response 1: ", bodyShapeResult);
-
-    // For hybrid, use manual body shape and detected undertone
-    const bodyShape = req.body.body_shape.toLowerCase().trim();
-    const undertone = extractUndertone(bodyShapeResult);
-    
-    // Validate body shape
-    const validShapes = ['rectangle', 'hourglass', 'pear', 'apple', 'inverted triangle'];
-    const validBodyShape = validShapes.includes(bodyShape) ? bodyShape : null;
-    
-    let updatedUser = null;
-    if (validBodyShape || undertone) {
-      updatedUser = await saveUserBodyInfo(userId, validBodyShape, undertone);
-    }
-
-    res.json({
-      bodyShapeResult,
-      saved: {
-        bodyShape: validBodyShape || 'Invalid body shape',
-        undertone: undertone || 'Not detected',
-        updated: !!updatedUser
-      }
-    });
   } catch (error) {
     console.error("analyzeHybrid error:", error);
     res.status(500).json({ error: error.message || "Processing failed" });
-  } finally {
-    // Safe file cleanup
-    if (imagePath && fs.existsSync(imagePath)) {
-      try {
-        fs.unlinkSync(imagePath);
-      } catch (cleanupError) {
-        console.error("File cleanup error:", cleanupError);
-      }
-    }
   }
-};
\ No newline at end of file
+};
+
+// Status and, once finished, result of a queued analysis job. Jobs are only
+// visible to the user who submitted them.
+export const getAnalysisJob = async (req, res) => {
+  const job = analysisQueue.get(req.params.jobId);
+  if (!job || job.owner !== String(req.user?._id)) {
+    return res.status(404).json({ error: "Job not found" });
+  }
+  res.json(analysisQueue.describe(job));
+};
@@ -4,11 +4,19 @@ import {  addToWardrobe } from '../services/addToWardrobe.js';
 import { User } from "../models/users.models.js";
 import fs from "fs/promises";
 import crypto from "crypto";
+import { PythonWorkerPool } from "../services/pythonWorkerPool.js";
+import { extractGarmentColorsBatch } from "../services/garmentColors.js";
 import {
   uploadOnCloudinary,
   deleteFromCloudinary,
 } from "../utils/cloudinary.js";
 
+// Ranking only needs NumPy and keeps per-user color indices warm, so one
+// long-lived worker is enough unless RANKING_WORKERS says otherwise
+const rankingWorkers = new PythonWorkerPool("tools/wardrobe_ranking.py", {
+  size: parseInt(process.env.RANKING_WORKERS, 10) || 1,
+});
+
 const ALL_CATEGORIES = [
   "Tops",
   "Bottoms",
@@ -249,88 +257,108 @@ export const addGarmentToDigitalWardrobeByCategory = async (req, res) => {
 
     const mismatched = [];
 
-    for (const file of files) {
-      let imageUrl = null;
-      try {
-        const imageBuffer = await fs.readFile(file.path);
-        const imageHash = generateImageHash(imageBuffer);
-
-        const existing = await DigitalWardrobe.findOne({
-          userId,
-          "uploadedImages.imageHash": imageHash,
-        });
-
-        if (existing) {
-          console.log("Duplicate image");
-          continue;
-        }
-
-        const base64Image = imageBuffer.toString("base64");
-        const metadata = await extractClothingMetadata(
-          base64Image,
-          file.mimetype
-        );
-
-        if (!metadata || !Array.isArray(metadata) || metadata.length === 0) {
-          console.log("Metadata extraction failed");
-          continue;
-        }
+    try {
+      // Skip images already in the wardrobe before any local or Gemini analysis
+      const uploads = [];
+      for (const file of files) {
+        try {
+          const imageBuffer = await fs.readFile(file.path);
+          const imageHash = generateImageHash(imageBuffer);
 
-        // Upload to Cloudinary before checking mismatch (since you want to show URL)
-        imageUrl = await uploadOnCloudinary(file.path);
-        if (!imageUrl) {
-          console.log("Upload to Cloudinary failed!");
-          continue;
-        }
+          const existing = await DigitalWardrobe.findOne({
+            userId,
+            "uploadedImages.imageHash": imageHash,
+          });
 
-        const validGarments = metadata.filter((g) => g.category === category);
+          if (existing) {
+            console.log("Duplicate image");
+            continue;
+          }
 
-        if (validGarments.length === 0) {
-          mismatched.push({
-            filename: file.originalname,
-            imageUrl, // So frontend can show this in the alert
-            reason: `No garment matched category "${category}"`,
-            suggestedCategories: [...new Set(metadata.map((g) => g.category))],
-          });
-          continue;
+          uploads.push({ file, imageBuffer, imageHash });
+        } catch (err) {
+          console.error(`Error processing ${file.originalname}:`, err);
         }
+      }
 
-        const garments = validGarments.map((item) => ({
-          itemName: item.itemName.trim(),
-          category: item.category,
-          color: {
-            name: item.color.name.trim(),
-            hex: item.color.hex.trim(),
-          },
-          fabric: item.fabric,
-          occasion: Array.isArray(item.occasion)
-            ? item.occasion.slice(0, 3).map((occ) => occ.trim())
-            : [item.occasion?.trim()].filter(Boolean).slice(0, 3),
-          season: Array.isArray(item.season)
-            ? item.season.slice(0, 2)
-            : [item.season].filter(Boolean).slice(0, 2),
-        }));
+      // Colors of every new upload in one local pass; Gemini only reports the rest
+      const localColors = await extractGarmentColorsBatch(
+        uploads.map(({ file }) => file.path)
+      );
 
-        if (garments.length === 0) {
-          console.log("No valid garments after filtering");
-          continue;
+      for (const [index, { file, imageBuffer, imageHash }] of uploads.entries()) {
+        let imageUrl = null;
+        try {
+          const base64Image = imageBuffer.toString("base64");
+          const metadata = await extractClothingMetadata(
+            base64Image,
+            file.mimetype,
+            localColors[index]
+          );
+
+          if (!metadata || !Array.isArray(metadata) || metadata.length === 0) {
+            console.log("Metadata extraction failed");
+            continue;
+          }
+
+          // Upload to Cloudinary before checking mismatch (since you want to show URL)
+          imageUrl = await uploadOnCloudinary(file.path);
+          if (!imageUrl) {
+            console.log("Upload to Cloudinary failed!");
+            continue;
+          }
+
+          const validGarments = metadata.filter((g) => g.category === category);
+
+          if (validGarments.length === 0) {
+            mismatched.push({
+              filename: file.originalname,
+              imageUrl, // So frontend can show this in the alert
+              reason: `No garment matched category "${category}"`,
+              suggestedCategories: [...new Set(metadata.map((g) => g.category))],
+            });
+            continue;
+          }
+
+          const garments = validGarments.map((item) => ({
+            itemName: item.itemName.trim(),
+            category: item.category,
+            color: {
+              name: item.color.name.trim(),
+              hex: item.color.hex.trim(),
+            },
+            fabric: item.fabric,
+            occasion: Array.isArray(item.occasion)
+              ? item.occasion.slice(0, 3).map((occ) => occ.trim())
+              : [item.occasion?.trim()].filter(Boolean).slice(0, 3),
+            season: Array.isArray(item.season)
+              ? item.season.slice(0, 2)
+              : [item.season].filter(Boolean).slice(0, 2),
+          }));
+
+          if (garments.length === 0) {
+            console.log("No valid garments after filtering");
+            continue;
+          }
+
+          const imageEntry = {
+            imageUrl,
+            imageHash,
+            garments,
+            createdAt: new Date(),
+          };
+
+          await DigitalWardrobe.findOneAndUpdate(
+            { userId },
+            { $push: { uploadedImages: imageEntry } },
+            { upsert: true, new: true }
+          );
+        } catch (err) {
+          console.error(`Error processing ${file.originalname}:`, err);
         }
-
-        const imageEntry = {
-          imageUrl,
-          imageHash,
-          garments,
-          createdAt: new Date(),
-        };
-
-        await DigitalWardrobe.findOneAndUpdate(
-          { userId },
-          { $push: { uploadedImages: imageEntry } },
-          { upsert: true, new: true }
-        );
-      } catch (err) {
-        console.error(`Error processing ${file.originalname}:`, err);
-      } finally {
+      }
+    } finally {
+      for (const file of files) {
         try {
           await fs.unlink(file.path);
         } catch (err) {
@@ -840,6 +868,105 @@ export const filterGarments = async (req, res) => {
 //   }
 // };
 
+// Parses a ?skinRgb=r,g,b override; null unless it is exactly three
+// integers in 0-255
+function parseSkinRgb(value) {
+  const parts = String(value).split(",");
+  if (parts.length !== 3) return null;
+  const rgb = parts.map((part) => (/^\s*\d{1,3}\s*$/.test(part) ? Number(part) : NaN));
+  return rgb.every((channel) => channel <= 255) ? rgb : null;
+}
+
+// Ranks the user's garments by how well their colors suit the user's skin
+// tone (stored undertone and detected skin color, or ?undertone= and
+// ?skinRgb=r,g,b overrides). Optional ?category= narrows the garments and
+// ?top= sets how many are returned (default 10).
+export const rankGarmentsBySkinTone = async (req, res) => {
+  try {
+    const userId = req.user._id;
+    if (!userId) {
+      return res.status(401).json({ message: "Unauthorized access" });
+    }
+
+    const { category, undertone, skinRgb, top } = req.query;
+    const skinRgbOverride = skinRgb !== undefined ? parseSkinRgb(skinRgb) : null;
+    if (skinRgb !== undefined && !skinRgbOverride) {
+      return res.status(400).json({
+        message: "skinRgb must be three integers from 0 to 255, e.g. skinRgb=198,152,120",
+      });
+    }
+    const categoryFilter = category ? category.split(",") : null;
+
+    const [wardrobe, user] = await Promise.all([
+      DigitalWardrobe.findOne({ userId }),
+      User.findById(userId).select("userBodyInfo"),
+    ]);
+    if (!wardrobe || wardrobe.uploadedImages.length === 0) {
+      return res.status(404).json({ message: "No garments found in wardrobe" });
+    }
+
+    const skin = {
+      undertone: undertone || user?.userBodyInfo?.undertone,
+      main_color_rgb:
+        skinRgbOverride ||
+        (user?.userBodyInfo?.skinColorRgb?.length === 3
+          ? [...user.userBodyInfo.skinColorRgb]
+          : undefined),
+    };
+    if (!skin.undertone && !skin.main_color_rgb) {
+      return res.status(400).json({
+        message: "No skin tone on file; run an analysis or pass undertone / skinRgb",
+      });
+    }
+
+    const garments = new Map();
+    const items = [];
+    for (const image of wardrobe.uploadedImages) {
+      for (const garment of image.garments) {
+        if (!garment.color?.hex) continue;
+        if (categoryFilter && !categoryFilter.includes(garment.category)) continue;
+        const id = garment._id.toString();
+        garments.set(id, { image, garment });
+        items.push({ id, hex: garment.color.hex });
+      }
+    }
+
+    // The worker keeps each wardrobe's LAB index until the wardrobe changes
+    const ranking = await rankingWorkers.run({
+      items,
+      skin,
+      top_k: parseInt(top, 10) || 10,
+      index_key: `${userId}:${wardrobe.updatedAt?.getTime()}:${category || ""}`,
+    });
+    if (ranking.error) throw new Error(ranking.error);
+
+    const results = ranking.results.map(({ id, score }) => {
+      const { image, garment } = garments.get(id);
+      return {
+        imageId: image._id,
+        garmentId: garment._id,
+        itemName: garment.itemName,
+        category: garment.category,
+        color: garment.color,
+        imageUrl: image.imageUrl,
+        score,
+      };
+    });
+
+    return res.status(200).json({
+      message: "Garments ranked by skin tone",
+      skin,
+      results,
+    });
+  } catch (err) {
+    console.error("Error in rankGarmentsBySkinTone:", err);
+    return res.status(500).json({
+      message: "Failed to rank garments",
+      error: process.env.NODE_ENV === "development" ? err.message : undefined,
+    });
+  }
+};
+
 export const getGarmentDetails = async (req, res) => {
   const { garmentId } = req.params;
   const userId = req.user._id;
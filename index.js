@@ -9,6 +9,7 @@ import fs from "fs";
 import { v4 as uuidv4 } from "uuid";
 import { connectDB } from "./db/connectDB.js";
 import cors from "cors";
+import { garmentColorFor } from "./services/garmentColors.js";
 
 import eventRoute from "./routes/events.routes.js";
 import userRoute from "./routes/users.routes.js";
@@ -84,10 +85,7 @@ app.get("/", (req, res) => {
   res.send("well come to zuri server");
 });
 
-// Function to extract clothing metadata using Gemini API
-export async function extractClothingMetadata(base64Image, mimetype) {
-  try {
-    const prompt = `
+const CLOTHING_PROMPT = `
 You are a fashion analysis AI. Given a clothing image (either a single dress or a topwear + bottomwear combination), return a JSON array of 1–2 objects with the following strict structure:
 
 [
@@ -111,7 +109,34 @@ Rules:
 - color must include both a human-readable name and a hex code.
 - Never return null, undefined, empty strings, or invalid fields.
 - Do not include any explanation, comment, or markdown — just the pure JSON array.
-        `.trim();
+`;
+
+// Same as CLOTHING_PROMPT with the color replaced by the garment's position
+const CLOTHING_PROMPT_WITHOUT_COLOR = `
+Given a clothing image (a single garment or a topwear + bottomwear combination), return a JSON array of 1–2 objects:
+
+[
+  {
+    "itemName": "e.g. Floral Crop Top",
+    "category": one of "Tops", "Bottoms", "Dresses", "Ethnic", "Swimwear", "Footwear", "Accessories", "co-ord set",
+    "part": "upper" for topwear, "lower" for bottomwear, "full" for a single garment,
+    "fabric": one tag like "Silk",
+    "occasion": up to 3 lowercase tags like ["party", "work", "travel"],
+    "season": 1–2 of "Summer", "Winter", "Monsoon", "Autumn", "Spring", "All Season"
+  }
+]
+
+Never return null or empty fields. Return only the JSON array, without markdown.
+`;
+
+// Function to extract clothing metadata using Gemini API
+//
+// When localColors (from services/garmentColors.js) is given, the color is
+// not asked from Gemini: each garment only reports which part of the photo
+// it covers and takes the locally extracted color of that part.
+export async function extractClothingMetadata(base64Image, mimetype, localColors = null) {
+  try {
+    const prompt = (localColors ? CLOTHING_PROMPT_WITHOUT_COLOR : CLOTHING_PROMPT).trim();
 
     const response = await ai.models.generateContent({
       model: "gemini-2.0-flash-exp",
@@ -143,7 +168,12 @@ Rules:
     if (!jsonString) throw new Error("Empty response from Gemini");
 
     const parsedMetadata = JSON.parse(jsonString);
-    return parsedMetadata;
+    if (!localColors || !Array.isArray(parsedMetadata)) return parsedMetadata;
+
+    return parsedMetadata.map(({ part, ...item }) => ({
+      ...item,
+      color: garmentColorFor(localColors, part),
+    }));
   } catch (error) {
     console.error("Metadata extraction error:", error);
     throw new Error(
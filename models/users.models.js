@@ -46,6 +46,11 @@ const userSchema = new mongoose.Schema(
         type: String,
         enum: ['cool', 'warm', 'neutral'],
       },
+      // Main skin color [r, g, b] found by the skin tone detector
+      skinColorRgb: {
+        type: [Number],
+        default: undefined,
+      },
       height: {
         feet: {
           type: Number,
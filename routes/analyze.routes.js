@@ -1,5 +1,5 @@
 import express from "express";
-import { analyzeAuto, analyzeManual, analyzeHybrid } from "../controllers/analyze.controllers.js";
+import { analyzeAuto, analyzeManual, analyzeHybrid, getAnalysisJob } from "../controllers/analyze.controllers.js";
 import {imageCheck} from "../controllers/checkfullbody.controllers.js";
 import { upload } from "../middleware/multer.middleware.js";
 import { verifyJWT } from "../middleware/auth.middleware.js"; // Your existing JWT middleware
@@ -19,6 +19,9 @@ router.post("/manual",verifyJWT, analyzeManual);
 // Hybrid analysis route - requires image upload and authentication
 router.post("/hybrid",verifyJWT, upload.single("image"), analyzeHybrid);
 
+// Status/result of an analysis submitted with ?async=1
+router.get("/jobs/:jobId", verifyJWT, getAnalysisJob);
+
 router.post("/checkimage",upload.single("image"), imageCheck);
 
 export default router;
\ No newline at end of file
@@ -12,7 +12,8 @@ import {
 //   getGarmentsByColor,
   getCategoryCounts ,
   getGarmentDetails,
-  filterGarments
+  filterGarments,
+  rankGarmentsBySkinTone
 } from "../controllers/digitalWardrobe.controllers.js";
 import { verifyJWT } from "../middleware/auth.middleware.js";
 import { upload } from "../middleware/multer.middleware.js";
@@ -40,6 +41,9 @@ router.delete("/deleteGarment/:garmentId", verifyJWT, deleteGarment);
 router.get("/garments/category", verifyJWT, getGarmentsByCategory);
 router.get("/filterGarments", verifyJWT, filterGarments);
 
+// Rank garments by how well their colors suit the user's skin tone
+router.get("/rankGarments", verifyJWT, rankGarmentsBySkinTone);
+
 // router.get("/garments/fabric", verifyJWT, getGarmentsByFabric);
 // router.get("/garments/occasion", verifyJWT, getGarmentsByOccasion);
 // router.get("/garments/season", verifyJWT, getGarmentsBySeason);
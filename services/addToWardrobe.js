@@ -4,6 +4,7 @@ import { uploadOnCloudinary } from '../utils/cloudinary.js';
 import { extractClothingMetadata } from '../index.js';
 import { generateImageHash } from '../controllers/digitalWardrobe.controllers.js';
 import { User } from '../models/users.models.js';
+import { extractGarmentColors, extractGarmentColorsBatch } from './garmentColors.js';
 
 export const addToWardrobe = async (userId, files) => {
   const user = await User.findById(userId);
@@ -12,78 +13,95 @@ export const addToWardrobe = async (userId, files) => {
   let processedCount = 0;
   let skippedCount = 0;
 
-  for (const file of files) {
-    try {
-      const imageBuffer = await fs.readFile(file.path);
-      const imageHash = generateImageHash(imageBuffer);
-
-      const existingWardrobe = await DigitalWardrobe.findOne({
-        userId,
-        'uploadedImages.imageHash': imageHash
-      });
-
-      if (existingWardrobe) {
-        skippedCount++;
-        console.log(`Image ${file.filename} already exists, skipping...`);
-        continue;
-      }
-
-      const base64Image = imageBuffer.toString('base64');
-      const metadata = await extractClothingMetadata(base64Image, file.mimetype);
-
-      if (!metadata || !Array.isArray(metadata) || metadata.length === 0) {
-        console.error(`Failed to extract metadata for ${file.filename}`);
-        continue;
+  try {
+    // Skip images already in the wardrobe before any local or Gemini analysis
+    const uploads = [];
+    for (const file of files) {
+      try {
+        const imageBuffer = await fs.readFile(file.path);
+        const imageHash = generateImageHash(imageBuffer);
+
+        const existingWardrobe = await DigitalWardrobe.findOne({
+          userId,
+          'uploadedImages.imageHash': imageHash
+        });
+
+        if (existingWardrobe) {
+          skippedCount++;
+          console.log(`Image ${file.filename} already exists, skipping...`);
+          continue;
+        }
+
+        uploads.push({ file, imageBuffer, imageHash });
+      } catch (fileError) {
+        console.error(`Error processing file ${file.filename}:`, fileError);
       }
+    }
 
-      const imageUrl = await uploadOnCloudinary(file.path);
-      if (!imageUrl) {
-        console.error(`Failed to upload ${file.filename} to cloudinary`);
-        continue;
-      }
+    // Colors of every new upload in one local pass; Gemini only reports the rest
+    const localColors = await extractGarmentColorsBatch(uploads.map(({ file }) => file.path));
 
-      const garments = metadata
-        .filter(item => item?.itemName && item?.category && item?.color?.name && item?.color?.hex && item?.fabric)
-        .map(item => ({
-          itemName: item.itemName.trim(),
-          category: item.category,
-          color: {
-            name: item.color.name.trim(),
-            hex: item.color.hex.trim()
-          },
-          fabric: item.fabric,
-          occasion: Array.isArray(item.occasion)
-            ? item.occasion.slice(0, 3).map(occ => occ.trim())
-            : [item.occasion?.trim()].filter(Boolean).slice(0, 3),
-          season: Array.isArray(item.season)
-            ? item.season.slice(0, 2)
-            : [item.season].filter(Boolean).slice(0, 2)
-        }));
-
-      if (garments.length === 0) {
-        console.error(`No valid garments found in ${file.filename}`);
+    for (const [index, { file, imageBuffer, imageHash }] of uploads.entries()) {
+      try {
+        const base64Image = imageBuffer.toString('base64');
+        const metadata = await extractClothingMetadata(base64Image, file.mimetype, localColors[index]);
+
+        if (!metadata || !Array.isArray(metadata) || metadata.length === 0) {
+          console.error(`Failed to extract metadata for ${file.filename}`);
+          continue;
+        }
+
+        const imageUrl = await uploadOnCloudinary(file.path);
+        if (!imageUrl) {
+          console.error(`Failed to upload ${file.filename} to cloudinary`);
+          continue;
+        }
+
+        const garments = metadata
+          .filter(item => item?.itemName && item?.category && item?.color?.name && item?.color?.hex && item?.fabric)
+          .map(item => ({
+            itemName: item.itemName.trim(),
+            category: item.category,
+            color: {
+              name: item.color.name.trim(),
+              hex: item.color.hex.trim()
+            },
+            fabric: item.fabric,
+            occasion: Array.isArray(item.occasion)
+              ? item.occasion.slice(0, 3).map(occ => occ.trim())
+              : [item.occasion?.trim()].filter(Boolean).slice(0, 3),
+            season: Array.isArray(item.season)
+              ? item.season.slice(0, 2)
+              : [item.season].filter(Boolean).slice(0, 2)
+          }));
+
+        if (garments.length === 0) {
+          console.error(`No valid garments found in ${file.filename}`);
+          continue;
+        }
+
+        const imageEntry = {
+          imageUrl,
+          imageHash,
+          garments,
+          createdAt: new Date()
+        };
+
+        await DigitalWardrobe.findOneAndUpdate(
+          { userId },
+          { $push: { uploadedImages: imageEntry } },
+          { upsert: true, new: true }
+        );
+
+        processedCount++;
+        console.log(`Successfully processed ${file.filename} with ${garments.length} garments`);
+      } catch (fileError) {
+        console.error(`Error processing file ${file.filename}:`, fileError);
         continue;
       }
-
-      const imageEntry = {
-        imageUrl,
-        imageHash,
-        garments,
-        createdAt: new Date()
-      };
-
-      await DigitalWardrobe.findOneAndUpdate(
-        { userId },
-        { $push: { uploadedImages: imageEntry } },
-        { upsert: true, new: true }
-      );
-
-      processedCount++;
-      console.log(`Successfully processed ${file.filename} with ${garments.length} garments`);
-    } catch (fileError) {
-      console.error(`Error processing file ${file.filename}:`, fileError);
-      continue;
-    } finally {
+    }
+  } finally {
+    for (const file of files) {
       try {
         await fs.unlink(file.path);
       } catch (unlinkError) {
@@ -114,7 +132,8 @@ export const addToWardrobeFromUrl = async (userId, imageUrl, imageBuffer, filena
     }
 
     const base64Image = imageBuffer.toString('base64');
-    const metadata = await extractClothingMetadata(base64Image, 'image/jpeg'); // You can pass the actual mimetype
+    const localColors = await extractGarmentColors(imageBuffer);
+    const metadata = await extractClothingMetadata(base64Image, 'image/jpeg', localColors); // You can pass the actual mimetype
 
     if (!metadata || !Array.isArray(metadata) || metadata.length === 0) {
       console.error(`Failed to extract metadata for ${filename}`);
@@ -0,0 +1,164 @@
+import crypto from "crypto";
+import os from "os";
+
+// Jobs allowed to run at the same time
+const DEFAULT_CONCURRENCY =
+  parseInt(process.env.ANALYSIS_CONCURRENCY, 10) || os.cpus().length;
+
+// Jobs allowed to wait for a free slot; further submissions are rejected
+const DEFAULT_MAX_DEPTH = parseInt(process.env.ANALYSIS_QUEUE_DEPTH, 10) || 32;
+
+// Time a job may run before it is aborted
+const DEFAULT_JOB_TIMEOUT_MS =
+  parseInt(process.env.ANALYSIS_JOB_TIMEOUT_MS, 10) || 120000;
+
+// How long finished jobs stay available to the status endpoint
+const DEFAULT_RESULT_TTL_MS =
+  parseInt(process.env.ANALYSIS_JOB_TTL_MS, 10) || 10 * 60 * 1000;
+
+export class QueueFullError extends Error {
+  constructor(depth) {
+    super(`Analysis queue is full (${depth} jobs waiting), try again shortly`);
+    this.name = "QueueFullError";
+  }
+}
+
+export class JobTimeoutError extends Error {
+  constructor(timeoutMs) {
+    super(`Analysis timed out after ${timeoutMs} ms`);
+    this.name = "JobTimeoutError";
+  }
+}
+
+// Runs async jobs with a fixed concurrency and a bounded waiting list, so a
+// burst of uploads queues up (or is turned away) instead of piling work on
+// the Python workers. Every job gets an id that can be polled until it
+// expires. A task receives an AbortSignal that fires when the job times
+// out; tasks pass it on to the worker pool and HTTP calls so stuck work is
+// actually stopped.
+export class JobQueue {
+  constructor({
+    concurrency = DEFAULT_CONCURRENCY,
+    maxDepth = DEFAULT_MAX_DEPTH,
+    timeoutMs = DEFAULT_JOB_TIMEOUT_MS,
+    resultTtlMs = DEFAULT_RESULT_TTL_MS,
+  } = {}) {
+    this.concurrency = Math.max(1, concurrency);
+    this.maxDepth = Math.max(0, maxDepth);
+    this.timeoutMs = timeoutMs;
+    this.resultTtlMs = resultTtlMs;
+    this.jobs = new Map();
+    this.waiting = [];
+    this.running = 0;
+  }
+
+  // Queues task(signal) and returns the job. Throws QueueFullError right
+  // away when the waiting list is full.
+  submit(task, { owner = null } = {}) {
+    if (this.running >= this.concurrency && this.waiting.length >= this.maxDepth) {
+      throw new QueueFullError(this.waiting.length);
+    }
+
+    const job = {
+      id: crypto.randomUUID(),
+      owner,
+      status: "queued",
+      result: null,
+      error: null,
+      timedOut: false,
+      createdAt: Date.now(),
+      startedAt: null,
+      finishedAt: null,
+      task,
+    };
+    job.done = new Promise((resolve) => {
+      job.settle = resolve;
+    });
+
+    this.jobs.set(job.id, job);
+    this.waiting.push(job);
+    this.drain();
+    return job;
+  }
+
+  drain() {
+    while (this.running < this.concurrency && this.waiting.length > 0) {
+      this.start(this.waiting.shift());
+    }
+  }
+
+  // The job is settled (and its caller answered) when the task finishes or
+  // times out, whichever comes first, but its slot is only freed once the
+  // task's promise settles: a task that ignores the abort signal keeps
+  // counting against the concurrency limit until it actually stops.
+  async start(job) {
+    this.running++;
+    job.status = "running";
+    job.startedAt = Date.now();
+
+    const controller = new AbortController();
+    const timer = setTimeout(() => {
+      const err = new JobTimeoutError(this.timeoutMs);
+      controller.abort(err);
+      this.finish(job, err);
+    }, this.timeoutMs);
+
+    try {
+      this.finish(job, null, await job.task(controller.signal));
+    } catch (error) {
+      this.finish(job, error);
+    } finally {
+      clearTimeout(timer);
+      job.task = null;
+      this.running--;
+      this.drain();
+    }
+  }
+
+  // Records the outcome of a job once; later outcomes (a task finishing
+  // after its timeout) are ignored
+  finish(job, error, result = null) {
+    if (job.finishedAt) return;
+    if (error) {
+      job.status = "failed";
+      job.error = error.message || "Processing failed";
+      job.timedOut = error instanceof JobTimeoutError;
+      // Set by tasks that reject their input rather than fail (e.g. 422)
+      job.statusCode = error.statusCode || null;
+    } else {
+      job.status = "done";
+      job.result = result;
+    }
+    job.finishedAt = Date.now();
+    job.settle(job);
+    setTimeout(() => this.jobs.delete(job.id), this.resultTtlMs).unref();
+  }
+
+  get(id) {
+    return this.jobs.get(id) || null;
+  }
+
+  // Public view of a job for the status endpoint
+  describe(job) {
+    const view = {
+      jobId: job.id,
+      status: job.status,
+      createdAt: new Date(job.createdAt).toISOString(),
+      startedAt: job.startedAt ? new Date(job.startedAt).toISOString() : null,
+      finishedAt: job.finishedAt ? new Date(job.finishedAt).toISOString() : null,
+    };
+    if (job.status === "queued") view.position = this.waiting.indexOf(job) + 1;
+    if (job.status === "done") view.result = job.result;
+    if (job.status === "failed") view.error = job.error;
+    return view;
+  }
+
+  stats() {
+    return {
+      running: this.running,
+      waiting: this.waiting.length,
+      concurrency: this.concurrency,
+      maxDepth: this.maxDepth,
+    };
+  }
+}
@@ -0,0 +1,44 @@
+import path from "path";
+import { PythonWorkerPool } from "./pythonWorkerPool.js";
+
+// Garment colors are computed locally at 256 px in tens of milliseconds,
+// so one long-lived worker is enough unless GARMENT_COLOR_WORKERS says otherwise
+const garmentColorWorkers = new PythonWorkerPool("tools/garment_colors.py", {
+  size: parseInt(process.env.GARMENT_COLOR_WORKERS, 10) || 1,
+});
+
+// Colors of the garment(s) in one image, sent as a raw frame. Resolves to
+// null when the local extraction fails, so callers can fall back to Gemini.
+export async function extractGarmentColors(imageBuffer) {
+  try {
+    const result = await garmentColorWorkers.run({}, imageBuffer);
+    if (result.error) throw new Error(result.error);
+    return result;
+  } catch (error) {
+    console.error("Garment color extraction error:", error);
+    return null;
+  }
+}
+
+// Colors of many uploaded files in a single worker request, in the order of
+// filePaths; failed images are null.
+export async function extractGarmentColorsBatch(filePaths) {
+  if (filePaths.length === 0) return [];
+  try {
+    const { results, error } = await garmentColorWorkers.run({
+      images: filePaths.map((filePath) => ({ image_path: path.resolve(filePath) })),
+    });
+    if (error) throw new Error(error);
+    return results.map((result) => (result.error ? null : result));
+  } catch (error) {
+    console.error("Garment color batch extraction error:", error);
+    return filePaths.map(() => null);
+  }
+}
+
+// Color of one garment of an image: the upper or lower half of the
+// foreground for a topwear + bottomwear photo, the whole garment otherwise
+export function garmentColorFor(colors, part) {
+  const color = colors.parts?.[part] || colors.color;
+  return { name: color.name, hex: color.hex };
+}
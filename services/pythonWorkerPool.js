@@ -0,0 +1,171 @@
+import { PythonShell } from "python-shell";
+import os from "os";
+
+// Number of long-lived Python processes kept per analysis script
+const DEFAULT_POOL_SIZE =
+  parseInt(process.env.ANALYSIS_WORKERS, 10) || os.cpus().length;
+
+// Variables OpenCV, BLAS and OpenMP read at load time; mirrors
+// THREAD_ENV_VARS in tools/thread_limits.py
+const THREAD_ENV_VARS = [
+  "OPENCV_FOR_THREADS_NUM",
+  "OMP_NUM_THREADS",
+  "OPENBLAS_NUM_THREADS",
+  "MKL_NUM_THREADS",
+  "NUMEXPR_NUM_THREADS",
+  "VECLIB_MAXIMUM_THREADS",
+];
+
+// Keeps a fixed set of Python processes started with --worker so that
+// imports and models stay warm between requests. Requests are written as
+// one JSON line each and matched to responses through their id.
+//
+// Each worker is limited to `threads` threads in OpenCV, BLAS and OpenMP
+// (ANALYSIS_THREADS, or an equal share of the cores by default), so a full
+// pool does not start a thread per core in every process.
+export class PythonWorkerPool {
+  constructor(scriptPath, { size = DEFAULT_POOL_SIZE, threads } = {}) {
+    this.scriptPath = scriptPath;
+    this.size = Math.max(1, size);
+    this.threads =
+      threads ||
+      parseInt(process.env.ANALYSIS_THREADS, 10) ||
+      Math.max(1, Math.floor(os.cpus().length / this.size));
+    this.workers = [];
+    this.nextId = 1;
+  }
+
+  workerEnv() {
+    const env = { ...process.env, ANALYSIS_THREADS: String(this.threads) };
+    for (const name of THREAD_ENV_VARS) {
+      env[name] = String(this.threads);
+    }
+    return env;
+  }
+
+  spawnWorker() {
+    const worker = {
+      shell: new PythonShell(this.scriptPath, {
+        args: ["--worker"],
+        env: this.workerEnv(),
+      }),
+      pending: new Map(),
+      alive: true,
+    };
+
+    worker.shell.on("message", (message) => {
+      let response;
+      try {
+        response = JSON.parse(message);
+      } catch (error) {
+        console.error("Python worker output:", message);
+        return;
+      }
+
+      const job = worker.pending.get(response.id);
+      if (!job) return;
+      worker.pending.delete(response.id);
+      job.resolve(response.result);
+    });
+
+    worker.shell.on("stderr", (stderr) => {
+      console.error("Python stderr:", stderr);
+    });
+
+    const fail = (err) => {
+      if (!worker.alive) return;
+      worker.alive = false;
+      this.workers = this.workers.filter((w) => w !== worker);
+      for (const job of worker.pending.values()) {
+        job.reject(err || new Error("Python worker exited"));
+      }
+      worker.pending.clear();
+    };
+
+    worker.fail = fail;
+    worker.shell.on("error", fail);
+    worker.shell.on("pythonError", fail);
+    worker.shell.on("close", () => fail());
+
+    this.workers.push(worker);
+    return worker;
+  }
+
+  // Pick the least busy worker, starting a new one while below pool size
+  acquireWorker() {
+    const idle = this.workers.find((w) => w.pending.size === 0);
+    if (idle) return idle;
+    if (this.workers.length < this.size) return this.spawnWorker();
+
+    return this.workers.reduce((best, w) =>
+      w.pending.size < best.pending.size ? w : best
+    );
+  }
+
+  // Kills a worker that stopped responding. Its pending requests fail and
+  // the next request starts a fresh process in its place.
+  killWorker(worker, err) {
+    worker.shell.kill("SIGKILL");
+    worker.fail(err);
+  }
+
+  // Sends one request. When imageBuffer is given it is written as a raw
+  // frame after the JSON header instead of being base64 encoded. When
+  // timeoutMs passes or signal aborts before the response arrives, the
+  // worker is assumed stuck and killed.
+  run(payload, imageBuffer = null, { timeoutMs = 0, signal = null } = {}) {
+    return new Promise((resolve, reject) => {
+      if (signal?.aborted) {
+        reject(signal.reason || new Error("Analysis aborted"));
+        return;
+      }
+
+      const worker = this.acquireWorker();
+      const id = this.nextId++;
+      const header = imageBuffer
+        ? { ...payload, id, image_bytes: imageBuffer.length }
+        : { ...payload, id };
+
+      let timer = null;
+      const onAbort = () =>
+        this.killWorker(worker, signal.reason || new Error("Analysis aborted"));
+      const cleanup = () => {
+        clearTimeout(timer);
+        signal?.removeEventListener("abort", onAbort);
+      };
+
+      worker.pending.set(id, {
+        resolve: (result) => {
+          cleanup();
+          resolve(result);
+        },
+        reject: (err) => {
+          cleanup();
+          reject(err);
+        },
+      });
+      if (timeoutMs > 0) {
+        timer = setTimeout(
+          () =>
+            this.killWorker(
+              worker,
+              new Error(`Python worker timed out after ${timeoutMs} ms`)
+            ),
+          timeoutMs
+        );
+      }
+      signal?.addEventListener("abort", onAbort, { once: true });
+
+      worker.shell.send(JSON.stringify(header));
+      if (imageBuffer) worker.shell.stdin.write(imageBuffer);
+    });
+  }
+
+  close() {
+    for (const worker of this.workers) {
+      worker.alive = false;
+      worker.shell.kill();
+    }
+    this.workers = [];
+  }
+}
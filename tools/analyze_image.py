@@ -0,0 +1,306 @@
+import sys
+import json
+
+from worker import run_worker, read_request
+from batch import run_batch_cli
+from image_io import DEFAULT_MAX_EDGE, lazy_analysis_image, load_frame_sequence, request_digest
+from result_cache import cached
+from instrumentation import stage, record_metric, run_instrumented
+from color_engines import DEFAULT_COLOR_METHOD
+from pose_detector import (
+    cached_pose,
+    cached_people,
+    detect_normalized_landmarks,
+    detect_sequence_normalized,
+    parse_max_poses,
+)
+from landmarks import (
+    LANDMARK_FIELDS,
+    landmarks_bbox,
+    landmarks_to_array,
+    landmarks_to_json,
+    landmarks_to_keypoints,
+    smooth_landmark_sequence,
+)
+from skintone_detector import (
+    SKINTONE_CACHE_NAMESPACE,
+    DEFAULT_STREAMING,
+    detect_skin_tone_from_image,
+    detect_skin_tones_for_people,
+    add_debugging_info,
+    build_skin_rois,
+    collect_skin_summary,
+    describe_skin_colors,
+)
+from skin_profile import add_image, load_profile, profile_confidence, profile_variance
+
+def skin_tone_for_pose(image_rgb, normalized, color_method=None, streaming=None):
+    """
+    Run skin tone detection using in-memory MediaPipe landmarks.
+
+    Args:
+        image_rgb: RGB analysis image
+        normalized: Normalized landmarks from detect_normalized_landmarks
+        color_method: Optional dominant color backend
+        streaming: Optional streaming skin summary switch (see
+            detect_skin_tone_from_image)
+
+    Returns:
+        Skin tone dictionary
+    """
+    # Skin regions are cut from the analysis image, so use its coordinates
+    analysis_size = (image_rgb.shape[1], image_rgb.shape[0])
+    keypoints = landmarks_to_keypoints(landmarks_to_array(normalized, analysis_size))
+
+    skin_tone_info = detect_skin_tone_from_image(image_rgb, keypoints, color_method, streaming)
+    if "error" in skin_tone_info:
+        skin_tone_info = add_debugging_info(skin_tone_info, image_rgb.shape)
+    return skin_tone_info
+
+def skin_tones_for_people(image_rgb, people, color_method=None):
+    """
+    Run skin tone detection for every person found by cached_people.
+
+    Args:
+        image_rgb: RGB analysis image
+        people: Normalized landmarks per person
+        color_method: Optional dominant color backend
+
+    Returns:
+        Dictionary with "people": one skin tone dictionary per person
+    """
+    analysis_size = (image_rgb.shape[1], image_rgb.shape[0])
+    arrays = [landmarks_to_array(normalized, analysis_size) for normalized in people]
+    return {"people": detect_skin_tones_for_people(
+        image_rgb,
+        [(landmarks_to_keypoints(array), landmarks_bbox(array, analysis_size)) for array in arrays],
+        color_method,
+    )}
+
+def pose_summary(normalized, original_size):
+    """
+    Pose part of the response for one person.
+
+    Args:
+        normalized: Normalized landmarks or None
+        original_size: (width, height) of the upload
+
+    Returns:
+        Dictionary with "detected", "fields", "landmarks" and "keypoints"
+    """
+    array = landmarks_to_array(normalized, original_size)
+    keypoints = landmarks_to_keypoints(array)["keypoints"]
+    return {
+        "detected": array is not None,
+        "fields": list(LANDMARK_FIELDS),
+        "landmarks": landmarks_to_json(array),
+        "keypoints": {
+            name: [round(x, 2), round(y, 2)] for name, (x, y) in keypoints.items()
+        },
+    }
+
+def build_result(normalized, original_size, analysis_size, skin_tone_info):
+    """
+    Assemble the combined pose and skin tone response.
+
+    Args:
+        normalized: Normalized landmarks or None
+        original_size: (width, height) of the upload
+        analysis_size: (width, height) of the analysis image
+        skin_tone_info: Skin tone dictionary
+
+    Returns:
+        Dictionary with "pose" and "skin_tone" results
+    """
+    return {
+        "pose": pose_summary(normalized, original_size),
+        "skin_tone": skin_tone_info,
+        "image_size": list(original_size),
+        "analysis_size": list(analysis_size),
+    }
+
+def build_people_result(people, original_size, analysis_size, skin_tones):
+    """
+    Assemble the multi-person response.
+
+    Args:
+        people: Normalized landmarks per person
+        original_size: (width, height) of the upload
+        analysis_size: (width, height) of the analysis image
+        skin_tones: Skin tone dictionaries, one per person
+
+    Returns:
+        Dictionary with "people" (each with "bbox" in upload coordinates,
+        "pose" and "skin_tone"), "image_size" and "analysis_size"
+    """
+    return {
+        "people": [
+            {
+                "bbox": landmarks_bbox(landmarks_to_array(normalized, original_size), original_size),
+                "pose": pose_summary(normalized, original_size),
+                "skin_tone": skin_tone_info,
+            }
+            for normalized, skin_tone_info in zip(people, skin_tones)
+        ],
+        "image_size": list(original_size),
+        "analysis_size": list(analysis_size),
+    }
+
+def analyze_image(image_rgb, original_size=None, color_method=None):
+    """
+    Run pose detection and skin tone detection on one decoded image.
+
+    The landmarks found by MediaPipe are handed to the skin tone detector in
+    memory, so the image is decoded once and no text is exchanged between
+    the two stages.
+
+    Args:
+        image_rgb: RGB image array, possibly downscaled for analysis
+        original_size: Optional (width, height) of the uploaded image;
+            reported landmarks are mapped back to it
+        color_method: Optional dominant color backend for the skin tone step
+
+    Returns:
+        Dictionary with "pose" and "skin_tone" results
+    """
+    analysis_size = (image_rgb.shape[1], image_rgb.shape[0])
+    if original_size is None:
+        original_size = analysis_size
+
+    normalized = detect_normalized_landmarks(image_rgb)
+    skin_tone_info = skin_tone_for_pose(image_rgb, normalized, color_method)
+    return build_result(normalized, original_size, analysis_size, skin_tone_info)
+
+def analyze_sequence(frames, original_size):
+    """
+    Analyze consecutive frames of one person into a single stable result.
+
+    Pose runs in tracking mode, so only the first frames pay for person
+    detection. The landmarks are smoothed into one set (visibility-weighted
+    median per coordinate). Each frame's skin pixels are summarized inside
+    that frame's own ROIs (the smoothed landmarks stand in for frames
+    where the pose was lost), and the summaries are merged with equal
+    weight per frame, like the photos of a skin tone profile.
+
+    Args:
+        frames: List of RGB frame arrays of one size, in order
+        original_size: (width, height) of the source frames
+
+    Returns:
+        Dictionary with "pose", "skin_tone" (with "lab_stats",
+        "variance" and "confidence" across frames), "frames",
+        "image_size" and "analysis_size"
+    """
+    analysis_size = (frames[0].shape[1], frames[0].shape[0])
+    sequence = detect_sequence_normalized(frames)
+    smoothed = smooth_landmark_sequence(sequence)
+    record_metric("pose_frames", sum(rows is not None for rows in sequence))
+
+    profile_summary, records = load_profile(None)
+    for frame, normalized in zip(frames, sequence):
+        normalized = normalized if normalized is not None else smoothed
+        keypoints = landmarks_to_keypoints(landmarks_to_array(normalized, analysis_size))
+        add_image(profile_summary, records, None, collect_skin_summary(frame, build_skin_rois(frame, keypoints)))
+
+    if records:
+        with stage("clustering"):
+            skin_tone_info = describe_skin_colors(profile_summary.dominant_colors(3))
+        variance = profile_variance(profile_summary, records)
+        skin_tone_info.update({
+            "lab_stats": profile_summary.lab_stats(),
+            "variance": variance,
+            "confidence": profile_confidence(records, variance),
+        })
+    else:
+        skin_tone_info = add_debugging_info(
+            {"error": "No skin pixels detected in any frame"}, frames[0].shape)
+
+    result = build_result(smoothed, original_size, analysis_size, skin_tone_info)
+    result["frames"] = {
+        "count": len(frames),
+        "pose_detected": sum(rows is not None for rows in sequence),
+        "skin_detected": len(records),
+    }
+    return result
+
+def analyze_request(parsed):
+    """
+    Decode the image carried by a request and analyze it.
+
+    The pose and skin tone stages each go through the result cache, keyed
+    by the image digest; the image is only decoded if a stage misses.
+
+    With 'max_poses', up to that many people are detected (see
+    pose_detector.detect_pose) and each gets their own skin tone, all from
+    one decode, one pose pass and one masking pass. Requests with "op":
+    "sequence" carry a clip ('video_path') or ordered 'frames' instead of
+    one image and get one smoothed result (see analyze_sequence); they
+    are not cached.
+
+    Args:
+        parsed: Request dictionary carrying the image (see image_io.load_analysis_image)
+
+    Returns:
+        Analysis dictionary or a dictionary with an "error" entry
+    """
+    try:
+        if parsed.get('op') == 'sequence':
+            frames, original_size = load_frame_sequence(parsed)
+            return analyze_sequence(frames, original_size)
+
+        load_image = lazy_analysis_image(parsed)
+        digest = request_digest(parsed)
+        max_edge = parsed.get('max_edge', DEFAULT_MAX_EDGE)
+        color_method = parsed.get('color_method') or DEFAULT_COLOR_METHOD
+        streaming = bool(parsed.get('streaming', DEFAULT_STREAMING))
+        max_poses = parse_max_poses(parsed)
+
+        if max_poses is not None:
+            found = cached_people(load_image, digest, max_edge, max_poses)
+            skin_tones = cached(
+                SKINTONE_CACHE_NAMESPACE,
+                digest,
+                {"max_edge": max_edge, "color_method": color_method, "people": found["people"]},
+                lambda: skin_tones_for_people(load_image()[0], found["people"], color_method),
+            )
+            return build_people_result(found["people"], found["image_size"],
+                                       found["analysis_size"], skin_tones["people"])
+
+        pose = cached_pose(load_image, digest, max_edge)
+        normalized = pose["normalized"]
+
+        skin_tone_info = cached(
+            SKINTONE_CACHE_NAMESPACE,
+            digest,
+            {
+                "max_edge": max_edge,
+                "color_method": color_method,
+                "streaming": streaming,
+                "landmarks": normalized,
+            },
+            lambda: skin_tone_for_pose(load_image()[0], normalized, color_method, streaming),
+        )
+
+        return build_result(normalized, pose["image_size"], pose["analysis_size"], skin_tone_info)
+
+    except Exception as e:
+        return {"error": f"Failed to process image: {str(e)}"}
+
+if __name__ == "__main__":
+    # Long-lived mode: one JSON request per line, one JSON response per line
+    if "--worker" in sys.argv[1:]:
+        run_worker(analyze_request)
+        sys.exit(0)
+
+    # Offline mode: many images from a directory, manifest or JSONL stream
+    if "--batch" in sys.argv[1:]:
+        run_batch_cli(analyze_request)
+        sys.exit(0)
+
+    try:
+        parsed = read_request()
+    except Exception as e:
+        print(json.dumps({"error": f"Failed to parse input: {str(e)}"}))
+        sys.exit(0)
+
+    print(json.dumps(run_instrumented(parsed, analyze_request)))
@@ -0,0 +1,178 @@
+import os
+import sys
+import json
+import contextlib
+
+from instrumentation import run_instrumented
+from thread_limits import ANALYSIS_THREADS, apply_thread_limits
+
+# File extensions picked up when a directory is given as batch input
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp', '.tif', '.tiff')
+
+def iter_batch_inputs(source):
+    """
+    Yield one request dictionary per image of a batch source.
+
+    The source can be a directory (every image file below it, in sorted
+    order), "-" for stdin, or a file. Each line of stdin or of a file is
+    either a JSON request (JSONL) or a plain image path (manifest); blank
+    lines and lines starting with "#" are skipped.
+
+    Args:
+        source: Directory, file path or "-"
+
+    Yields:
+        Request dictionaries, each with an "id"
+    """
+    if os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    path = os.path.join(root, name)
+                    yield {"id": os.path.relpath(path, source), "image_path": os.path.abspath(path)}
+        return
+
+    stream = sys.stdin if source == '-' else open(source)
+    try:
+        for line_number, line in enumerate(stream, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if line.startswith('{'):
+                request = json.loads(line)
+                request.setdefault("id", line_number)
+            else:
+                request = {"id": line, "image_path": os.path.abspath(line)}
+            yield request
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+def load_checkpoint(checkpoint_path):
+    """
+    Read the ids already completed by a previous run.
+
+    Args:
+        checkpoint_path: Path of the checkpoint file, or None
+
+    Returns:
+        Set of completed ids (as JSON strings, so 1 and "1" stay distinct)
+    """
+    if not checkpoint_path or not os.path.exists(checkpoint_path):
+        return set()
+    with open(checkpoint_path) as f:
+        return {line.rstrip('\n') for line in f if line.strip()}
+
+def _run_one(args):
+    """
+    Run a handler on one request, turning exceptions into error results.
+
+    Args:
+        args: (handle_request, request) tuple
+
+    Returns:
+        Result line dictionary with "id" and either "result" or "error"
+    """
+    handle_request, request = args
+    try:
+        # Keep handler output off stdout, which may carry the JSONL results
+        with contextlib.redirect_stdout(sys.stderr):
+            result = run_instrumented(request, handle_request)
+        return {"id": request.get("id"), "result": result}
+    except Exception as e:
+        return {"id": request.get("id"), "error": f"Failed to process image: {str(e)}"}
+
+def run_batch(handle_request, source, output=None, workers=1, checkpoint_path=None):
+    """
+    Analyze every image of a batch source with a process pool.
+
+    Results are written as JSONL in input order, each tagged with the id of
+    its request. A failing image produces an error line (or a result with
+    an "error" entry) and the run continues. With a checkpoint file, ids
+    whose results were written are recorded there and skipped when the run
+    is started again. Every process is limited to ANALYSIS_THREADS
+    threads, or to its share of the cores when that is not set.
+
+    Args:
+        handle_request: Module-level callable taking a request dictionary
+        source: Batch source (see iter_batch_inputs)
+        output: Output JSONL path (appended to), or None for stdout
+        workers: Number of worker processes; 1 runs in this process
+        checkpoint_path: Optional checkpoint file path
+
+    Returns:
+        Dictionary with "processed", "failed" and "skipped" counts
+    """
+    import multiprocessing
+
+    done = load_checkpoint(checkpoint_path)
+    counts = {"processed": 0, "failed": 0, "skipped": 0}
+
+    def pending():
+        for request in iter_batch_inputs(source):
+            if json.dumps(request.get("id")) in done:
+                counts["skipped"] += 1
+                continue
+            yield (handle_request, request)
+
+    out = open(output, 'a') if output else sys.stdout
+    checkpoint = open(checkpoint_path, 'a') if checkpoint_path else None
+    # Pool processes share the cores: without ANALYSIS_THREADS each gets
+    # an equal part of them instead of a thread per core
+    threads = ANALYSIS_THREADS or (max(1, (os.cpu_count() or 1) // workers) if workers > 1 else 0)
+    if workers > 1:
+        pool = multiprocessing.Pool(workers, initializer=apply_thread_limits, initargs=(threads,))
+    else:
+        pool = None
+        apply_thread_limits(threads)
+
+    try:
+        results = pool.imap(_run_one, pending(), chunksize=1) if pool else map(_run_one, pending())
+        for line in results:
+            out.write(json.dumps(line) + "\n")
+            out.flush()
+
+            counts["processed"] += 1
+            result = line.get("result")
+            if "error" in line or (isinstance(result, dict) and "error" in result):
+                counts["failed"] += 1
+            if checkpoint:
+                checkpoint.write(json.dumps(line["id"]) + "\n")
+                checkpoint.flush()
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+        if checkpoint:
+            checkpoint.close()
+        if out is not sys.stdout:
+            out.close()
+
+    return counts
+
+def run_batch_cli(handle_request, argv=None):
+    """
+    Command-line entry point shared by the analysis tools' --batch mode.
+
+    Args:
+        handle_request: Module-level callable taking a request dictionary
+        argv: Argument list, defaults to sys.argv[1:]
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Analyze many images in one run.")
+    parser.add_argument('--batch', required=True, metavar='SOURCE',
+                        help='Image directory, manifest/JSONL file, or - for stdin')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Worker processes (default: number of CPUs)')
+    parser.add_argument('--output', help='Append JSONL results here instead of stdout')
+    parser.add_argument('--checkpoint', help='Record finished ids here and skip them on restart')
+    args = parser.parse_args(argv)
+
+    counts = run_batch(handle_request, args.batch, args.output, args.workers, args.checkpoint)
+    print(
+        f"Batch finished: {counts['processed']} processed, {counts['failed']} failed, "
+        f"{counts['skipped']} skipped",
+        file=sys.stderr,
+    )
@@ -0,0 +1,88 @@
+"""
+Accuracy and speed comparison of the dominant color backends.
+
+Generates synthetic skin pixel sets (a skin tone with sensor-like noise and
+shading, mixed with clothing/background colors), runs every backend from
+color_engines.COLOR_ENGINES and reports, against the 'kmeans' reference:
+time per call, the largest per-channel difference of the main color, and
+whether the Fitzpatrick, Monk and undertone classes agree.
+
+Usage:
+    python tools/benchmarks/color_engines.py [--sizes 50000,500000,2000000]
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from color_engines import COLOR_ENGINES
+from skintone_detector import classify_skin_tone, classify_monk_skin_tone, classify_undertone
+
+# Representative skin tones, light to deep
+SKIN_TONES = [
+    (246, 237, 228), (234, 208, 184), (225, 184, 153), (198, 150, 117),
+    (170, 122, 89), (141, 96, 66), (110, 72, 48), (72, 46, 32),
+]
+
+# Colors that leak into skin regions (clothing, hair, background)
+CONTAMINANTS = [(30, 30, 35), (200, 40, 50), (40, 70, 140), (235, 235, 235)]
+
+def make_pixels(tone, n, noise, contamination, rng):
+    """
+    Build an (n, 3) pixel set around a skin tone.
+
+    Args:
+        tone: (r, g, b) base skin color
+        n: Number of pixels
+        noise: Standard deviation of per-pixel noise
+        contamination: Fraction of non-skin pixels
+        rng: numpy Generator
+
+    Returns:
+        (n, 3) uint8 array
+    """
+    n_skin = int(n * (1 - contamination))
+    shading = rng.uniform(0.85, 1.1, size=(n_skin, 1))
+    skin = np.array(tone) * shading + rng.normal(0, noise, size=(n_skin, 3))
+
+    other = np.array(CONTAMINANTS)[rng.integers(0, len(CONTAMINANTS), n - n_skin)]
+    other = other + rng.normal(0, noise, size=other.shape)
+
+    pixels = np.clip(np.vstack([skin, other]), 1, 255).astype(np.uint8)
+    return pixels[rng.permutation(n)]
+
+def classes(color):
+    return (classify_skin_tone(color)[1], classify_monk_skin_tone(color)[1], classify_undertone(color))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='50000,500000,2000000',
+                        help='Comma-separated pixel counts')
+    parser.add_argument('--noise', type=float, default=10.0)
+    parser.add_argument('--contamination', type=float, default=0.2)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    sizes = [int(s) for s in args.sizes.split(',')]
+
+    print(f"{'pixels':>9} {'method':>10} {'time_s':>8} {'max_diff':>8} {'class_match':>11}")
+    for n in sizes:
+        corpus = [make_pixels(t, n, args.noise, args.contamination, rng) for t in SKIN_TONES]
+        reference = None
+
+        for name, engine in COLOR_ENGINES.items():
+            start = time.perf_counter()
+            mains = [engine(p, 3)[0] for p in corpus]
+            elapsed = (time.perf_counter() - start) / len(corpus)
+
+            if reference is None:
+                reference = mains
+            diff = max(max(abs(a - b) for a, b in zip(m, r)) for m, r in zip(mains, reference))
+            matches = sum(classes(m) == classes(r) for m, r in zip(mains, reference))
+            print(f"{n:>9} {name:>10} {elapsed:>8.3f} {diff:>8} {matches:>7}/{len(corpus)}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Accuracy and speed of the local garment color extraction.
+
+Every case is a synthetic product shot generated in memory: a garment
+shape in one or two colors (top and bottom) on a plain or noisy backdrop,
+slightly blurred so its edges are anti-aliased like a real photo. Each
+case runs garment_colors.analyze_garment and reports the segmentation
+used, the main color and the upper/lower part colors against the names
+the case was drawn with, and the median time of --repeat runs.
+
+The cases include black and white garments on white and black backdrops,
+which get_dominant_colors' "black is background" filter used to erase.
+The script exits with status 1 when any case is named wrongly.
+
+Usage:
+    python tools/benchmarks/garment_colors.py [--repeat 5] [--edge 256]
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# (case, backdrop RGB, backdrop noise, upper RGB, lower RGB, expected upper
+# name, expected lower name); a single-color garment repeats its color
+CASES = [
+    ("black_on_white", (255, 255, 255), 0, (0, 0, 0), (0, 0, 0), "Black", "Black"),
+    ("white_on_black", (0, 0, 0), 0, (255, 255, 255), (255, 255, 255), "White", "White"),
+    ("black_on_grey", (128, 128, 128), 6, (5, 5, 5), (5, 5, 5), "Black", "Black"),
+    ("red_on_white", (250, 250, 250), 3, (208, 2, 27), (208, 2, 27), "Red", "Red"),
+    ("white_top_black_bottom", (190, 190, 190), 4, (255, 255, 255), (0, 0, 0), "White", "Black"),
+    ("mustard_top_denim_bottom", (245, 245, 220), 4, (225, 173, 1), (21, 96, 189), "Mustard", "Denim Blue"),
+]
+
+def synthetic_garment(edge, backdrop, noise, upper, lower, seed=0):
+    """
+    RGB product shot of a garment, upper and lower halves in their colors.
+
+    Args:
+        edge: Longest edge (height) of the image
+        backdrop: (r, g, b) backdrop color
+        noise: Standard deviation of the backdrop noise
+        upper, lower: (r, g, b) colors of the garment's halves
+
+    Returns:
+        (edge, 3 * edge // 4, 3) uint8 array
+    """
+    import cv2
+
+    rng = np.random.default_rng(seed)
+    height, width = edge, 3 * edge // 4
+    image = np.clip(np.array(backdrop, dtype=np.float64) + rng.normal(0, noise, (height, width, 3)), 0, 255)
+    image = image.astype(np.uint8)
+
+    top, bottom = int(height * 0.15), int(height * 0.9)
+    middle = (top + bottom) // 2
+    left, right = int(width * 0.25), int(width * 0.75)
+    # Shoulders wider than the waist, so the shape is not a plain rectangle
+    cv2.rectangle(image, (left - width // 10, top), (right + width // 10, top + height // 10), upper, -1)
+    cv2.rectangle(image, (left, top), (right, middle), upper, -1)
+    cv2.rectangle(image, (left, middle), (right, bottom), lower, -1)
+    return cv2.GaussianBlur(image, (3, 3), 0)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per case (median is kept)')
+    parser.add_argument('--edge', type=int, default=256, help='Longest edge of the images')
+    args = parser.parse_args()
+
+    from garment_colors import analyze_garment
+
+    print(f"{'case':<26} {'seg':>8} {'main':>12} {'upper':>12} {'lower':>12} {'ms':>7}  ok")
+    failures = 0
+    for name, backdrop, noise, upper, lower, want_upper, want_lower in CASES:
+        image = synthetic_garment(args.edge, backdrop, noise, upper, lower)
+        analyze_garment(image)
+        times = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            result = analyze_garment(image)
+            times.append((time.perf_counter() - start) * 1000)
+
+        if "error" in result:
+            failures += 1
+            print(f"{name:<26} error: {result['error']}")
+            continue
+        got_upper = result["parts"].get("upper", {}).get("name")
+        got_lower = result["parts"].get("lower", {}).get("name")
+        ok = (got_upper, got_lower) == (want_upper, want_lower) and result["color"]["name"] in (want_upper, want_lower)
+        failures += not ok
+        print(f"{name:<26} {result['segmentation']:>8} {result['color']['name']:>12} {str(got_upper):>12} "
+              f"{str(got_lower):>12} {statistics.median(times):>7.1f}  {'yes' if ok else 'NO'}")
+
+    if failures:
+        print(f"\n{failures} case(s) named wrongly")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,313 @@
+"""
+Per-stage timing and peak memory of the skin tone and pose pipeline on a
+synthetic image corpus.
+
+Every corpus entry is a JPEG generated in memory: a textured background
+with a person-like figure (face, neck, forearms, clothing) whose skin
+covers a chosen share of the frame, at several resolutions. Each entry is
+measured in a fresh process so that peak RSS (ru_maxrss) belongs to that
+entry alone. Stages are timed separately:
+
+    decode_full     process_base64_image (full resolution, legacy path)
+    decode          image_io.decode_image_for_analysis (analysis size)
+    regions         skin_regions.extract_skin_rois
+    masking         collect_region_pixels (shared masks, overlaps counted once)
+    clustering      get_dominant_colors
+    classification  tone_arrays.classify_colors
+    pose            pose_detector.detect_normalized_landmarks (skipped
+                    when MediaPipe is not installed or fails to load)
+    total           detect_skin_tone_from_image end to end
+
+Every stage runs once untimed first, so one-off costs (KMeans thread pool
+start-up, model loading) are left out; times are the median of --repeat
+runs, in milliseconds. With --save-baseline the results are written to a
+JSON file; with --baseline they are compared against one, and the script
+exits with status 1 when a stage is slower than --tolerance times its
+baseline (stages under 1 ms are ignored, they are too noisy to compare).
+
+Usage:
+    python tools/benchmarks/pipeline.py [--sizes 640,1280,4000]
+        [--mixes portrait,full_body,no_skin] [--repeat 3]
+        [--save-baseline FILE | --baseline FILE [--tolerance 1.25]]
+"""
+import os
+import sys
+import json
+import time
+import base64
+import argparse
+import platform
+import resource
+import statistics
+import multiprocessing
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# Share of the frame covered by the figure, per skin/background mix
+MIXES = {
+    # Head and shoulders filling the frame, mostly skin
+    "portrait": 1.0,
+    # Small full-body figure on a large background
+    "full_body": 0.45,
+    # Background only, exercises the fallback paths
+    "no_skin": 0.0,
+}
+
+SKIN_COLOR = (205, 150, 120)
+CLOTHING_COLOR = (40, 60, 120)
+STAGES = ("decode_full", "decode", "regions", "masking", "clustering",
+          "classification", "pose", "total")
+
+def synthetic_case(width, mix, seed=0):
+    """
+    Draw a synthetic photo and the keypoints of its figure.
+
+    Args:
+        width: Image width; height is 4/3 of it (portrait orientation)
+        mix: Figure scale from MIXES (0 for no figure)
+        seed: Random seed of the background texture and noise
+
+    Returns:
+        Tuple of (RGB image array, keypoints dictionary)
+    """
+    rng = np.random.default_rng(seed)
+    h, w = width * 4 // 3, width
+
+    # Low-frequency textured background (walls, foliage)
+    small = rng.integers(40, 200, size=(max(2, h // 64), max(2, w // 64), 3), dtype=np.uint8)
+    image = cv2.resize(small, (w, h), interpolation=cv2.INTER_CUBIC)
+
+    keypoints = {}
+    if mix > 0:
+        s = mix * w
+        cx, top = w / 2, h * (0.5 - 0.45 * mix)
+
+        def pt(dx, dy):
+            return (int(cx + dx * s), int(top + dy * s))
+
+        face = pt(0, 0.18)
+        cv2.ellipse(image, face, (int(0.12 * s), int(0.16 * s)), 0, 0, 360, SKIN_COLOR, -1)
+        cv2.rectangle(image, pt(-0.04, 0.3), pt(0.04, 0.4), SKIN_COLOR, -1)
+        cv2.rectangle(image, pt(-0.25, 0.38), pt(0.25, 1.2), CLOTHING_COLOR, -1)
+        for side in (-1, 1):
+            cv2.line(image, pt(side * 0.27, 0.45), pt(side * 0.3, 0.75), CLOTHING_COLOR, int(0.09 * s))
+            cv2.line(image, pt(side * 0.3, 0.75), pt(side * 0.28, 1.05), SKIN_COLOR, int(0.07 * s))
+
+        keypoints = {
+            "nose": list(pt(0, 0.2)),
+            "left_eye": list(pt(0.05, 0.14)),
+            "right_eye": list(pt(-0.05, 0.14)),
+            "left_ear": list(pt(0.11, 0.17)),
+            "right_ear": list(pt(-0.11, 0.17)),
+            "left_shoulder": list(pt(0.22, 0.42)),
+            "right_shoulder": list(pt(-0.22, 0.42)),
+            "left_elbow": list(pt(0.3, 0.75)),
+            "right_elbow": list(pt(-0.3, 0.75)),
+            "left_wrist": list(pt(0.28, 1.05)),
+            "right_wrist": list(pt(-0.28, 1.05)),
+        }
+        keypoints = {name: [min(max(x, 0), w - 1), min(max(y, 0), h - 1)]
+                     for name, (x, y) in keypoints.items()}
+
+    # Sensor-like noise
+    noise = rng.integers(-8, 9, size=image.shape, dtype=np.int16)
+    image = np.clip(image.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+    return image, {"keypoints": keypoints}
+
+def encode_jpeg(image_rgb, quality=90):
+    ok, encoded = cv2.imencode('.jpg', cv2.cvtColor(image_rgb, cv2.COLOR_RGB2BGR),
+                               [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise RuntimeError("JPEG encoding failed")
+    return encoded.tobytes()
+
+def timed(fn, repeat):
+    """
+    Run fn once to warm up, then repeat times.
+
+    Returns:
+        Tuple of (median milliseconds, last return value)
+    """
+    fn()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times), value
+
+def measure_case(width, mix_name, repeat, max_edge, color_method):
+    """
+    Measure every stage on one corpus entry. Runs in its own process.
+
+    Returns:
+        Dictionary of stage times (ms), peak RSS (MB) and image details
+    """
+    from image_io import decode_image_for_analysis
+    from tone_arrays import classify_colors
+    from skin_regions import extract_skin_rois
+    from skintone_detector import (
+        collect_region_pixels,
+        get_dominant_colors,
+        detect_skin_tone_from_image,
+        process_base64_image,
+        scale_keypoints,
+    )
+
+    drawn, keypoints = synthetic_case(width, MIXES[mix_name])
+    encoded = encode_jpeg(drawn)
+    encoded_b64 = base64.b64encode(encoded).decode('ascii')
+    del drawn
+
+    times = {}
+    times["decode_full"], _ = timed(lambda: process_base64_image(encoded_b64), repeat)
+    times["decode"], (image, (orig_w, orig_h)) = timed(
+        lambda: decode_image_for_analysis(encoded, max_edge), repeat)
+    keypoints = scale_keypoints(keypoints, image.shape[1] / orig_w, image.shape[0] / orig_h)
+
+    times["regions"], rois = timed(lambda: extract_skin_rois(image.shape, keypoints), repeat)
+    if not rois:
+        h, w = image.shape[:2]
+        rois = [("center", (w // 4, h // 4, w // 2, h // 2), None),
+                ("upper_center", (w // 3, h // 6, w // 3, h // 3), None)]
+
+    times["masking"], pixels = timed(lambda: collect_region_pixels(image, rois), repeat)
+    times["clustering"], colors = timed(
+        lambda: get_dominant_colors(pixels, n_colors=3, method=color_method), repeat)
+    times["classification"], _ = timed(lambda: classify_colors(colors[:3]), repeat)
+
+    pose_error = None
+    try:
+        from pose_detector import detect_normalized_landmarks
+        times["pose"], _ = timed(lambda: detect_normalized_landmarks(image), repeat)
+    except Exception as e:
+        # MediaPipe missing or unusable here; the other stages still count
+        times["pose"] = None
+        pose_error = str(e)
+
+    times["total"], result = timed(
+        lambda: detect_skin_tone_from_image(image, keypoints, color_method), repeat)
+
+    return {
+        "case": f"{width}px/{mix_name}",
+        "image_size": [orig_w, orig_h],
+        "analysis_size": [image.shape[1], image.shape[0]],
+        "encoded_kb": round(len(encoded) / 1024, 1),
+        "skin_pixels": int(len(pixels)),
+        "main_color_rgb": result.get("main_color_rgb"),
+        "times_ms": {k: (round(v, 2) if v is not None else None) for k, v in times.items()},
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        "pose_error": pose_error,
+        "peak_rss_mb": round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            / (2**20 if platform.system() == "Darwin" else 2**10), 1),
+    }
+
+def _child(queue, args):
+    try:
+        queue.put(measure_case(*args))
+    except Exception as e:
+        queue.put({"case": f"{args[0]}px/{args[1]}", "error": str(e)})
+
+def run_isolated(*args):
+    """Run measure_case in a fresh (spawned) process."""
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=_child, args=(queue, args))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+def compare(results, baseline, tolerance):
+    """
+    Print each stage's ratio to the baseline.
+
+    Returns:
+        List of (case, stage, ratio) regressions above tolerance
+    """
+    previous = {entry["case"]: entry for entry in baseline.get("results", [])}
+    regressions = []
+    print(f"\n{'case':<18} {'stage':<15} {'base_ms':>9} {'now_ms':>9} {'ratio':>6}")
+    for entry in results:
+        old = previous.get(entry["case"])
+        if old is None or "error" in entry or "error" in old:
+            continue
+        rows = list(entry["times_ms"].items()) + [("peak_rss_mb", entry["peak_rss_mb"])]
+        for stage, now in rows:
+            before = old["times_ms"].get(stage) if stage != "peak_rss_mb" else old["peak_rss_mb"]
+            if now is None or not before:
+                continue
+            ratio = now / before
+            flag = ""
+            if ratio > tolerance and (stage == "peak_rss_mb" or before >= 1):
+                regressions.append((entry["case"], stage, ratio))
+                flag = "  REGRESSION"
+            print(f"{entry['case']:<18} {stage:<15} {before:>9.2f} {now:>9.2f} {ratio:>6.2f}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='640,1280,4000',
+                        help='Comma-separated image widths')
+    parser.add_argument('--mixes', default=','.join(MIXES),
+                        help=f"Comma-separated skin/background mixes ({', '.join(MIXES)})")
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per stage (median is kept)')
+    parser.add_argument('--max-edge', type=int, default=None,
+                        help='Analysis size (default: ANALYSIS_MAX_EDGE)')
+    parser.add_argument('--color-method', default=None,
+                        help='Dominant color backend (default: DOMINANT_COLOR_METHOD)')
+    parser.add_argument('--save-baseline', metavar='FILE', help='Write results as a baseline')
+    parser.add_argument('--baseline', metavar='FILE', help='Compare against a saved baseline')
+    parser.add_argument('--tolerance', type=float, default=1.25,
+                        help='Slowdown ratio reported as a regression')
+    args = parser.parse_args()
+
+    if args.max_edge is None:
+        from image_io import DEFAULT_MAX_EDGE
+        args.max_edge = DEFAULT_MAX_EDGE
+
+    header = f"{'case':<18} {'analysis':>10} " + " ".join(f"{s[:8]:>8}" for s in STAGES) + f" {'rss_MB':>7}"
+    print(header)
+    results = []
+    for width in (int(s) for s in args.sizes.split(',')):
+        for mix in args.mixes.split(','):
+            entry = run_isolated(width, mix, args.repeat, args.max_edge, args.color_method)
+            results.append(entry)
+            if "error" in entry:
+                print(f"{entry['case']:<18} error: {entry['error']}")
+                continue
+            cells = " ".join(
+                f"{'-':>8}" if entry["times_ms"][s] is None else f"{entry['times_ms'][s]:>8.1f}"
+                for s in STAGES
+            )
+            size = "x".join(map(str, entry["analysis_size"]))
+            print(f"{entry['case']:<18} {size:>10} {cells} {entry['peak_rss_mb']:>7.1f}")
+
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+        "max_edge": args.max_edge,
+        "repeat": args.repeat,
+        "results": results,
+    }
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nBaseline written to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} stage(s) slower than {args.tolerance}x the baseline")
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
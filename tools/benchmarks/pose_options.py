@@ -0,0 +1,192 @@
+"""
+Latency and throughput of the pose model and thread options.
+
+Every combination of --models (POSE_MODEL: lite, full, heavy or a .task
+path), --segmentation (POSE_SEGMENTATION off/on), --threads
+(ANALYSIS_THREADS, applied with thread_limits.apply_thread_limits) and
+--procs (worker processes running at once) is measured in fresh
+interpreters started with that environment, the way the Node pool starts
+its workers. Each process analyzes --repeat synthetic images (pose
+detection, then skin tone detection) after one untimed warm-up request.
+
+Reported per row:
+
+    pose_p50 / pose_p95   detect_normalized_landmarks latency, ms
+    skin_p50              detect_skin_tone_from_image latency, ms
+    req_p50 / req_p95     whole request latency, ms
+    req/s                 requests finished per second by all processes
+    req/s/core            req/s divided by the cores the row may use
+                          (procs x threads, at most the machine's cores)
+
+Latencies of rows with several processes are measured under that load.
+Rows where MediaPipe cannot load report the skin stage alone, with the
+error. With --json the full results are also written to a file.
+
+Usage:
+    python tools/benchmarks/pose_options.py [--models lite,full,heavy]
+        [--segmentation off,on] [--threads 1,2,4] [--procs 1,4]
+        [--repeat 20] [--width 1024] [--json FILE]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+TOOLS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, TOOLS_DIR)
+
+def percentile(values, q):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+def child(config):
+    """
+    Time requests in this process. Runs in a fresh interpreter.
+
+    Args:
+        config: Dictionary with "threads", "repeat" and "width"
+
+    Returns:
+        Dictionary of per-request latencies (ms), "wall_s" of the timed
+        loop and "pose_error" (None when pose detection ran)
+    """
+    from thread_limits import apply_thread_limits
+    apply_thread_limits(config["threads"])
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from pipeline import MIXES, synthetic_case
+    from skintone_detector import detect_skin_tone_from_image
+    from pose_detector import detect_normalized_landmarks
+
+    images = [synthetic_case(config["width"], MIXES["full_body"], seed) for seed in range(4)]
+    keypoints = [case[1] for case in images]
+    images = [case[0] for case in images]
+
+    pose_error = None
+    try:
+        detect_normalized_landmarks(images[0])
+    except Exception as e:
+        pose_error = str(e)
+    detect_skin_tone_from_image(images[0], keypoints[0])
+
+    pose_ms, skin_ms, request_ms = [], [], []
+    loop_start = time.perf_counter()
+    for i in range(config["repeat"]):
+        image = images[i % len(images)]
+        start = time.perf_counter()
+        if pose_error is None:
+            detect_normalized_landmarks(image)
+        posed = time.perf_counter()
+        detect_skin_tone_from_image(image, keypoints[i % len(images)])
+        end = time.perf_counter()
+        pose_ms.append((posed - start) * 1000)
+        skin_ms.append((end - posed) * 1000)
+        request_ms.append((end - start) * 1000)
+
+    return {
+        "pose_ms": pose_ms if pose_error is None else None,
+        "skin_ms": skin_ms,
+        "request_ms": request_ms,
+        "wall_s": time.perf_counter() - loop_start,
+        "pose_error": pose_error,
+    }
+
+def measure(model, segmentation, threads, procs, repeat, width):
+    """
+    Run procs child processes at once with one option combination.
+
+    Returns:
+        Dictionary with the options, latency percentiles and throughput
+    """
+    from thread_limits import thread_env
+
+    env = dict(os.environ, POSE_MODEL=model, POSE_SEGMENTATION='1' if segmentation else '0')
+    env.update(thread_env(threads))
+    config = json.dumps({"threads": threads, "repeat": repeat, "width": width})
+
+    children = [
+        subprocess.Popen([sys.executable, os.path.abspath(__file__), '--child', config],
+                         cwd=TOOLS_DIR, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        for _ in range(procs)
+    ]
+    runs = []
+    for process in children:
+        stdout, stderr = process.communicate()
+        if process.returncode != 0:
+            raise RuntimeError(stderr.strip().splitlines()[-1])
+        runs.append(json.loads(stdout.strip().splitlines()[-1]))
+
+    requests = [ms for run in runs for ms in run["request_ms"]]
+    skin = [ms for run in runs for ms in run["skin_ms"]]
+    pose = [ms for run in runs if run["pose_ms"] for ms in run["pose_ms"]]
+    throughput = len(requests) / max(run["wall_s"] for run in runs)
+    cores = min(os.cpu_count() or 1, procs * threads)
+
+    return {
+        "model": model,
+        "segmentation": segmentation,
+        "threads": threads,
+        "procs": procs,
+        "pose_p50": round(percentile(pose, 50), 1) if pose else None,
+        "pose_p95": round(percentile(pose, 95), 1) if pose else None,
+        "skin_p50": round(percentile(skin, 50), 1),
+        "req_p50": round(percentile(requests, 50), 1),
+        "req_p95": round(percentile(requests, 95), 1),
+        "req_per_s": round(throughput, 2),
+        "req_per_s_per_core": round(throughput / cores, 2),
+        "pose_error": runs[0]["pose_error"],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--models', default='lite,full,heavy',
+                        help='Comma-separated POSE_MODEL values (lite, full, heavy or .task paths)')
+    parser.add_argument('--segmentation', default='off', help='Comma-separated off/on values')
+    parser.add_argument('--threads', default='1,2,4', help='Comma-separated threads per process')
+    parser.add_argument('--procs', default=f"1,{os.cpu_count() or 1}",
+                        help='Comma-separated numbers of processes running at once')
+    parser.add_argument('--repeat', type=int, default=20, help='Timed requests per process')
+    parser.add_argument('--width', type=int, default=1024, help='Synthetic image width')
+    parser.add_argument('--json', metavar='FILE', help='Also write the results to FILE')
+    args = parser.parse_args()
+
+    def cell(value, width):
+        return f"{'-':>{width}}" if value is None else f"{value:>{width}}"
+
+    print(f"{'model':<10} {'seg':>4} {'thr':>4} {'procs':>5} {'pose_p50':>9} {'pose_p95':>9} "
+          f"{'skin_p50':>9} {'req_p50':>8} {'req_p95':>8} {'req/s':>7} {'req/s/core':>11}")
+    results = []
+    errors = set()
+    for model in args.models.split(','):
+        for segmentation in (s == 'on' for s in args.segmentation.split(',')):
+            for threads in (int(t) for t in args.threads.split(',')):
+                for procs in sorted({int(p) for p in args.procs.split(',')}):
+                    try:
+                        row = measure(model, segmentation, threads, procs, args.repeat, args.width)
+                    except Exception as e:
+                        print(f"{os.path.basename(model):<10} error: {e}")
+                        continue
+                    results.append(row)
+                    if row["pose_error"]:
+                        errors.add(row["pose_error"])
+                    print(f"{os.path.basename(model):<10} {'on' if segmentation else 'off':>4} {threads:>4} "
+                          f"{procs:>5} {cell(row['pose_p50'], 9)} {cell(row['pose_p95'], 9)} "
+                          f"{row['skin_p50']:>9} {row['req_p50']:>8} {row['req_p95']:>8} "
+                          f"{row['req_per_s']:>7} {row['req_per_s_per_core']:>11}")
+
+    for error in sorted(errors):
+        print(f"\nPose detection skipped: {error}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({"cpu_count": os.cpu_count(), "width": args.width, "repeat": args.repeat,
+                       "results": results}, f, indent=2)
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3 and sys.argv[1] == '--child':
+        print(json.dumps(child(json.loads(sys.argv[2]))))
+    else:
+        main()
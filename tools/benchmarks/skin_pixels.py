@@ -0,0 +1,87 @@
+"""
+Memory and time of skin pixel collection, before and after the switch to
+boolean masks in detect_skin_tone_from_image.
+
+The "legacy" path reproduces the original loop: a masked copy per region,
+non-black selection with np.where and a Python list grown one pixel at a
+time, overlapping regions counted twice. The "mask" path is the shipped
+collect_region_pixels (shared SharedSkinMask planes, overlaps counted
+once, REGION_WEIGHTS applied by repeating pixels) and the "stream" path
+the shipped collect_skin_summary. The pixels column counts weighted
+pixels, so "mask" and "stream" agree. Peak memory is measured with
+tracemalloc, which sees NumPy allocations.
+
+Usage:
+    python tools/benchmarks/skin_pixels.py [--sizes 1024,2048,4000]
+"""
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from skintone_detector import (
+    build_skin_rois,
+    collect_region_pixels,
+    collect_skin_summary,
+    skin_mask,
+)
+
+def legacy_collect(image, rois):
+    import cv2
+
+    all_skin_pixels = []
+    for _, region, _ in rois:
+        # Masked copy of the region, as the removed remove_non_skin_regions made
+        x, y, w, h = region
+        roi = image[y:y+h, x:x+w]
+        skin_image = cv2.bitwise_and(roi, roi, mask=skin_mask(image, region).view(np.uint8)).copy()
+        non_black = skin_image[np.where((skin_image != [0, 0, 0]).all(axis=2))]
+        if len(non_black) > 0:
+            all_skin_pixels.extend(non_black)
+    return np.array(all_skin_pixels)
+
+def fallback_rois(image):
+    """Center and upper-center boxes used without keypoints."""
+    return build_skin_rois(image, {"keypoints": {}})
+
+def synthetic_image(edge, rng):
+    h, w = edge * 3 // 4, edge
+    image = np.empty((h, w, 3), np.uint8)
+    image[:] = (60, 90, 40)
+    yy, xx = np.mgrid[0:h, 0:w]
+    person = ((xx - w / 2) / (w / 4)) ** 2 + ((yy - h / 2) / (h / 2.5)) ** 2 < 1
+    image[person] = (205, 150, 120)
+    noise = rng.integers(-10, 11, size=image.shape)
+    return np.clip(image.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+def measure(fn, image, rois):
+    tracemalloc.start()
+    start = time.perf_counter()
+    pixels = fn(image, rois)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, int(pixels.n) if hasattr(pixels, 'n') else len(pixels)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='1024,2048,4000',
+                        help='Comma-separated image widths')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'width':>6} {'path':>7} {'time_s':>8} {'peak_MB':>8} {'pixels':>9}")
+    for edge in (int(s) for s in args.sizes.split(',')):
+        image = synthetic_image(edge, rng)
+        rois = fallback_rois(image)
+        for name, fn in (('legacy', legacy_collect), ('mask', collect_region_pixels),
+                         ('stream', collect_skin_summary)):
+            elapsed, peak, count = measure(fn, image, rois)
+            print(f"{edge:>6} {name:>7} {elapsed:>8.3f} {peak / 2**20:>8.1f} {count:>9}")
+
+if __name__ == '__main__':
+    main()
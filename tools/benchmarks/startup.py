@@ -0,0 +1,142 @@
+"""
+Cold-start cost of the analysis scripts.
+
+Every Python worker Node starts (at boot, and again after a timed-out
+job kills one) and every one-shot or --batch run pays the import time of
+its script before serving anything. Every entry module is imported
+in fresh interpreters under `python -X importtime`; the median cumulative
+import time of the module and the wall time of the whole process
+(interpreter start-up included) are reported, along with the imports with
+the largest self time.
+
+Heavy dependencies (OpenCV, scikit-learn, MediaPipe, PIL, ...) must only
+be imported on the paths that use them. The script checks that importing
+an entry module and applying the worker thread limits
+(thread_limits.apply_thread_limits, which every --worker and --batch run
+calls before its first request) does not load any of LAZY_MODULES, and
+that its median
+import time stays within STARTUP_BUDGET_MS (scaled by --budget-scale for
+slower machines). It exits with status 1 when either check fails.
+
+Usage:
+    python tools/benchmarks/startup.py [--modules skintone_detector,...]
+        [--repeat 7] [--budget-scale 1.0] [--top 8]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+TOOLS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Median import time allowed per entry module, in milliseconds. NumPy alone
+# accounts for about 80 ms of these.
+STARTUP_BUDGET_MS = {
+    "skintone_detector": 150,
+    "pose_detector": 140,
+    "analyze_image": 150,
+    "tone_arrays": 130,
+    "garment_colors": 150,
+    "quality_gate": 130,
+    "wardrobe_ranking": 130,
+    "worker": 25,
+}
+
+# Modules none of the entry modules may import at load time
+LAZY_MODULES = ("cv2", "sklearn", "mediapipe", "PIL", "requests", "cProfile", "sqlite3")
+
+def parse_importtime(stderr):
+    """
+    Parse `python -X importtime` output.
+
+    Args:
+        stderr: Text written by the interpreter
+
+    Returns:
+        List of (module, self_us, cumulative_us) tuples in import order
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+def measure(module):
+    """
+    Import a module in a fresh interpreter.
+
+    Args:
+        module: Module name, importable from tools/
+
+    Returns:
+        Dictionary with "import_ms", "process_ms", "rows" (parse_importtime)
+        and "loaded" (LAZY_MODULES present after the import and the thread
+        limits)
+    """
+    code = (
+        f"import {module}, sys, json; "
+        f"import thread_limits; thread_limits.apply_thread_limits(1); "
+        f"print(json.dumps([m for m in {LAZY_MODULES!r} if m in sys.modules]))"
+    )
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          cwd=TOOLS_DIR, capture_output=True, text=True)
+    process_ms = (time.perf_counter() - start) * 1000
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+
+    rows = parse_importtime(proc.stderr)
+    cumulative = next(c for name, _, c in reversed(rows) if name == module)
+    return {
+        "import_ms": cumulative / 1000,
+        "process_ms": process_ms,
+        "rows": rows,
+        "loaded": json.loads(proc.stdout.strip().splitlines()[-1]),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--modules', default=','.join(STARTUP_BUDGET_MS),
+                        help='Comma-separated entry modules')
+    parser.add_argument('--repeat', type=int, default=7, help='Fresh interpreters per module')
+    parser.add_argument('--budget-scale', type=float, default=1.0,
+                        help='Multiply every budget, for slower machines')
+    parser.add_argument('--top', type=int, default=8, help='Heaviest imports listed per module')
+    args = parser.parse_args()
+
+    failures = []
+    print(f"{'module':<20} {'import_ms':>10} {'process_ms':>11} {'budget_ms':>10}")
+    for module in args.modules.split(','):
+        runs = [measure(module) for _ in range(args.repeat)]
+        import_ms = statistics.median(r["import_ms"] for r in runs)
+        process_ms = statistics.median(r["process_ms"] for r in runs)
+        budget = STARTUP_BUDGET_MS.get(module)
+        budget = budget * args.budget_scale if budget is not None else None
+
+        flag = ""
+        if budget is not None and import_ms > budget:
+            failures.append(f"{module}: {import_ms:.1f} ms > {budget:.0f} ms budget")
+            flag = "  OVER BUDGET"
+        loaded = runs[0]["loaded"]
+        if loaded:
+            failures.append(f"{module}: imports {', '.join(loaded)} at start-up")
+            flag += f"  LOADS {','.join(loaded)}"
+        budget_cell = f"{budget:>10.0f}" if budget is not None else f"{'-':>10}"
+        print(f"{module:<20} {import_ms:>10.1f} {process_ms:>11.1f} {budget_cell}{flag}")
+
+        # Heaviest imports by self time, from the run closest to the median
+        typical = min(runs, key=lambda r: abs(r["import_ms"] - import_ms))
+        for name, self_us, cumulative_us in sorted(typical["rows"], key=lambda r: -r[1])[:args.top]:
+            print(f"    {name:<40} self {self_us / 1000:>7.1f} ms  cumulative {cumulative_us / 1000:>7.1f} ms")
+
+    if failures:
+        print("\n" + "\n".join(failures))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+import os
+import numpy as np
+
+from instrumentation import record_metric
+
+# Backend used by get_dominant_colors when no method is passed. 'kmeans'
+# keeps the reference results; deployments can opt in to a faster backend
+# with DOMINANT_COLOR_METHOD=subsample (see subsample_colors for how far its
+# colors drift) or per request with 'color_method'
+DEFAULT_COLOR_METHOD = os.environ.get('DOMINANT_COLOR_METHOD', 'kmeans')
+
+# Pixel budget of the subsample backend
+SUBSAMPLE_BUDGET = 20000
+
+# Bins per channel of the histogram backend (32 -> 32^3 bins of 8 levels)
+HISTOGRAM_BINS = 32
+
+def _sorted_colors(colors, counts):
+    """
+    Order cluster colors by pixel count, largest first.
+
+    Args:
+        colors: (k, 3) array of colors
+        counts: (k,) array of pixel counts
+
+    Returns:
+        List of (r, g, b) integer tuples
+    """
+    colors_with_counts = [(colors[i], counts[i]) for i in range(len(counts))]
+    colors_with_counts.sort(key=lambda x: x[1], reverse=True)
+    return [(int(c[0]), int(c[1]), int(c[2])) for c, _ in colors_with_counts]
+
+def kmeans_colors(pixels, n_colors):
+    """
+    Reference backend: KMeans with 10 restarts over every pixel.
+
+    Args:
+        pixels: (N, 3) array of RGB pixels
+        n_colors: Number of clusters
+
+    Returns:
+        List of (r, g, b) tuples, most frequent first
+    """
+    from sklearn.cluster import KMeans
+
+    kmeans = KMeans(n_clusters=n_colors, random_state=42, n_init=10)
+    kmeans.fit(pixels)
+    record_metric("clustered_pixels", len(pixels))
+    record_metric("cluster_iterations", int(kmeans.n_iter_))
+    return _sorted_colors(kmeans.cluster_centers_, np.bincount(kmeans.labels_))
+
+def subsample_colors(pixels, n_colors, budget=SUBSAMPLE_BUDGET):
+    """
+    KMeans over a fixed-size random sample of the pixels.
+
+    Identical to kmeans_colors when there are at most `budget` pixels. On the
+    synthetic skin corpus of tools/benchmarks/color_engines.py the main color
+    stays within 5 RGB units of the reference (one Monk class flip in 24
+    cases, on a boundary) while 2M pixels take 0.04 s instead of 4.8 s.
+
+    Args:
+        pixels: (N, 3) array of RGB pixels
+        n_colors: Number of clusters
+        budget: Maximum number of pixels to cluster
+
+    Returns:
+        List of (r, g, b) tuples, most frequent first
+    """
+    if len(pixels) > budget:
+        rng = np.random.default_rng(42)
+        pixels = pixels[rng.choice(len(pixels), budget, replace=False)]
+    return kmeans_colors(pixels, n_colors)
+
+def minibatch_colors(pixels, n_colors):
+    """
+    MiniBatchKMeans over every pixel.
+
+    On the synthetic skin corpus the main color drifts by up to 14 RGB units
+    from the reference (27 on low-noise sets) and 2M pixels still take
+    about 3 s, so it is mainly useful for comparison.
+
+    Args:
+        pixels: (N, 3) array of RGB pixels
+        n_colors: Number of clusters
+
+    Returns:
+        List of (r, g, b) tuples, most frequent first
+    """
+    from sklearn.cluster import MiniBatchKMeans
+
+    kmeans = MiniBatchKMeans(
+        n_clusters=n_colors, random_state=42, n_init=3, batch_size=4096
+    )
+    labels = kmeans.fit_predict(pixels)
+    record_metric("clustered_pixels", len(pixels))
+    record_metric("cluster_iterations", int(kmeans.n_steps_))
+    counts = np.bincount(labels, minlength=n_colors)
+    return _sorted_colors(kmeans.cluster_centers_, counts)
+
+def histogram_colors(pixels, n_colors, bins=HISTOGRAM_BINS, radius=2):
+    """
+    Peak picking on a quantized 3-D color histogram.
+
+    Pixels are counted into bins^3 cells; the fullest cells that are more
+    than `radius` cells away from an already chosen peak become the
+    dominant colors, each reported as the mean of the pixels within
+    `radius` cells of its peak. No iterative fitting is involved, so the
+    cost is one pass over the pixels: 2M pixels take 0.07 s. Peaks are
+    modes rather than means, so on the synthetic corpus the main color
+    differs from the reference by up to 10 RGB units (14 on low-noise
+    sets), with one tone class flip in eight cases.
+
+    Args:
+        pixels: (N, 3) array of RGB pixels
+        n_colors: Number of colors to return
+        bins: Bins per channel (must divide 256)
+        radius: Neighborhood, in cells, merged into each peak
+
+    Returns:
+        List of (r, g, b) tuples, most frequent first
+    """
+    record_metric("clustered_pixels", len(pixels))
+    shift = int(np.log2(256 // bins))
+    q = (np.asarray(pixels, dtype=np.uint8) >> shift).astype(np.intp)
+    flat = (q[:, 0] * bins + q[:, 1]) * bins + q[:, 2]
+
+    size = bins ** 3
+    counts = np.bincount(flat, minlength=size).reshape(bins, bins, bins)
+    sums = np.stack([
+        np.bincount(flat, weights=pixels[:, c], minlength=size)
+        for c in range(3)
+    ], axis=-1).reshape(bins, bins, bins, 3)
+
+    peaks = []
+    for cell in np.argsort(counts, axis=None)[::-1]:
+        if counts.flat[cell] == 0 or len(peaks) == n_colors:
+            break
+        idx = np.array(np.unravel_index(cell, counts.shape))
+        if all(np.max(np.abs(idx - p)) > radius for p in peaks):
+            peaks.append(idx)
+
+    colors = []
+    peak_counts = []
+    for p in peaks:
+        lo = np.maximum(p - radius, 0)
+        hi = np.minimum(p + radius + 1, bins)
+        window = tuple(slice(a, b) for a, b in zip(lo, hi))
+        n = counts[window].sum()
+        colors.append(sums[window].reshape(-1, 3).sum(axis=0) / n)
+        peak_counts.append(n)
+
+    return _sorted_colors(colors, peak_counts)
+
+COLOR_ENGINES = {
+    'kmeans': kmeans_colors,
+    'subsample': subsample_colors,
+    'minibatch': minibatch_colors,
+    'histogram': histogram_colors,
+}
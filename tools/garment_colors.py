@@ -0,0 +1,472 @@
+import os
+import sys
+import json
+import threading
+import numpy as np
+
+from worker import run_worker, read_request
+from batch import run_batch_cli
+from image_io import lazy_analysis_image, request_digest
+from result_cache import cached
+from instrumentation import stage, record_metric, run_instrumented
+from color_engines import COLOR_ENGINES
+from tone_arrays import rgb_to_lab_array
+
+# Cache namespace of garment color results; bump the version when the
+# segmentation, the palette or the output changes
+GARMENT_CACHE_NAMESPACE = "garmentcolors:2"
+
+# Longest edge garment photos are decoded at; colors do not need more
+GARMENT_MAX_EDGE = int(os.environ.get('GARMENT_MAX_EDGE', '256'))
+
+# Dominant color backend; the histogram one takes a few milliseconds here
+GARMENT_COLOR_METHOD = os.environ.get('GARMENT_COLOR_METHOD', 'histogram')
+
+# Named colors garments are reported with, as stored on wardrobe items
+GARMENT_PALETTE = [
+    ("Black", "#000000"),
+    ("Charcoal", "#36454F"),
+    ("Grey", "#808080"),
+    ("Silver", "#C0C0C0"),
+    ("White", "#FFFFFF"),
+    ("Off White", "#FAF9F6"),
+    ("Ivory", "#FFFFF0"),
+    ("Cream", "#FFFDD0"),
+    ("Beige", "#F5F5DC"),
+    ("Khaki", "#C3B091"),
+    ("Camel", "#C19A6B"),
+    ("Tan", "#D2B48C"),
+    ("Brown", "#7B3F00"),
+    ("Chocolate", "#4E2A1E"),
+    ("Rust", "#B7410E"),
+    ("Maroon", "#800000"),
+    ("Burgundy", "#800020"),
+    ("Red", "#D0021B"),
+    ("Coral", "#FF7F50"),
+    ("Peach", "#FFCBA4"),
+    ("Orange", "#FF8C00"),
+    ("Mustard", "#E1AD01"),
+    ("Yellow", "#FFD700"),
+    ("Gold", "#D4AF37"),
+    ("Olive Green", "#708238"),
+    ("Lime Green", "#32CD32"),
+    ("Mint Green", "#98FF98"),
+    ("Sage Green", "#9CAF88"),
+    ("Emerald Green", "#50C878"),
+    ("Forest Green", "#228B22"),
+    ("Bottle Green", "#006A4E"),
+    ("Teal", "#008080"),
+    ("Turquoise", "#40E0D0"),
+    ("Sky Blue", "#87CEEB"),
+    ("Powder Blue", "#B0E0E6"),
+    ("Denim Blue", "#1560BD"),
+    ("Royal Blue", "#4169E1"),
+    ("Cobalt Blue", "#0047AB"),
+    ("Navy Blue", "#000080"),
+    ("Lavender", "#E6E6FA"),
+    ("Lilac", "#C8A2C8"),
+    ("Purple", "#800080"),
+    ("Plum", "#8E4585"),
+    ("Magenta", "#FF00FF"),
+    ("Hot Pink", "#FF69B4"),
+    ("Pink", "#FFC0CB"),
+    ("Blush Pink", "#DE5D83"),
+    ("Mauve", "#E0B0FF"),
+]
+
+# Cells per channel of the nearest-color table (32 -> 32^3 cells of 8 levels)
+PALETTE_BINS = 32
+
+# Width of the image border that models the background, as a fraction of
+# the shorter edge
+BORDER_FRACTION = 0.04
+
+# Background colors estimated from the border
+BORDER_COLORS = 3
+
+# CIE76 distance to the nearest background color above which a pixel
+# belongs to the garment
+BACKGROUND_DELTA_E = 18.0
+
+# Share of border pixels the background colors must explain for the border
+# model to be trusted on its own; busier backgrounds go through GrabCut
+BORDER_UNIFORMITY = 0.9
+
+# GrabCut refinement passes
+GRABCUT_ITERATIONS = 3
+
+# Longest edge GrabCut runs at; its cost grows with the pixel count and the
+# mask is scaled back up afterwards
+GRABCUT_MAX_EDGE = 128
+
+# Below this share of the image the mask is treated as a failed
+# segmentation and the whole image is used
+MIN_FOREGROUND_SHARE = 0.03
+
+# Rows of a garment's foreground box split into upper and lower halves,
+# for photos of a topwear + bottomwear combination
+GARMENT_PARTS = ("upper", "lower")
+
+SEGMENTATION_METHODS = ("auto", "border", "grabcut", "none")
+
+def rgb_to_hex(color):
+    """
+    Format an (r, g, b) color as "#RRGGBB".
+    """
+    return "#{:02X}{:02X}{:02X}".format(*(int(round(c)) for c in color))
+
+_palette_table = None
+_palette_lock = threading.Lock()
+
+def build_palette_table(palette=GARMENT_PALETTE, bins=PALETTE_BINS):
+    """
+    Nearest palette entry of every quantized RGB color.
+
+    The center of each of the bins^3 cells is converted to LAB and matched
+    to the closest palette color by CIE76 distance, so naming a color later
+    is a single lookup.
+
+    Args:
+        palette: List of (name, "#RRGGBB") entries
+        bins: Cells per channel (must divide 256)
+
+    Returns:
+        (bins^3,) uint8 array of palette indices
+    """
+    step = 256 // bins
+    centers = np.arange(bins) * step + step // 2
+    cells = np.stack(np.meshgrid(centers, centers, centers, indexing='ij'), axis=-1).reshape(-1, 3)
+    palette_rgb = [[int(h[i:i + 2], 16) for i in (1, 3, 5)] for _, h in palette]
+
+    cell_lab = rgb_to_lab_array(cells).astype(np.float32)
+    palette_lab = rgb_to_lab_array(palette_rgb).astype(np.float32)
+    distances = np.linalg.norm(cell_lab[:, None, :] - palette_lab[None, :, :], axis=2)
+    return np.argmin(distances, axis=1).astype(np.uint8)
+
+def get_palette_table():
+    """
+    Table of GARMENT_PALETTE, built on first use.
+
+    Returns:
+        Array from build_palette_table
+    """
+    global _palette_table
+    if _palette_table is None:
+        with _palette_lock:
+            if _palette_table is None:
+                _palette_table = build_palette_table()
+    return _palette_table
+
+def name_colors(colors):
+    """
+    Palette names of colors through the nearest-color table.
+
+    Args:
+        colors: (N, 3) array of RGB colors
+
+    Returns:
+        List of palette names
+    """
+    shift = int(np.log2(256 // PALETTE_BINS))
+    q = np.clip(np.rint(np.asarray(colors, dtype=np.float64)), 0, 255).astype(np.intp) >> shift
+    indices = get_palette_table()[(q[:, 0] * PALETTE_BINS + q[:, 1]) * PALETTE_BINS + q[:, 2]]
+    return [GARMENT_PALETTE[i][0] for i in indices]
+
+def dominant_colors(pixels, n_colors):
+    """
+    Dominant colors of pixels that are already separated from the background.
+
+    Calls the GARMENT_COLOR_METHOD backend directly: get_dominant_colors
+    drops pure black pixels as background, which would erase black garments.
+
+    Args:
+        pixels: (N, 3) array of RGB pixels, N > 0
+        n_colors: Number of colors to return at most
+
+    Returns:
+        List of (r, g, b) tuples, most frequent first
+    """
+    return COLOR_ENGINES[GARMENT_COLOR_METHOD](pixels, max(1, min(n_colors, len(pixels))))
+
+def border_pixels(image):
+    """
+    Pixels of the strip along the image's four edges.
+
+    Args:
+        image: RGB image array
+
+    Returns:
+        Tuple of ((N, 3) array of border pixels, (H, W) bool mask of the strip)
+    """
+    height, width = image.shape[:2]
+    width_px = max(2, int(round(min(height, width) * BORDER_FRACTION)))
+    strip = np.zeros((height, width), dtype=bool)
+    strip[:width_px, :] = True
+    strip[-width_px:, :] = True
+    strip[:, :width_px] = True
+    strip[:, -width_px:] = True
+    return image[strip], strip
+
+def background_distance(image, border, strip):
+    """
+    Distance of every pixel to the nearest background color of the border.
+
+    Args:
+        image: RGB image array
+        border: (N, 3) array of border pixels
+        strip: (H, W) bool mask of the border strip
+
+    Returns:
+        Tuple of ((H, W) float32 CIE76 distances, share of border pixels
+        within BACKGROUND_DELTA_E of a background color)
+    """
+    background = dominant_colors(border, BORDER_COLORS)
+    background_lab = rgb_to_lab_array(np.rint(background)).astype(np.float32)
+
+    lab = rgb_to_lab_array(image.reshape(-1, 3)).astype(np.float32)
+    distance = np.full(len(lab), np.inf, dtype=np.float32)
+    for color in background_lab:
+        np.minimum(distance, np.linalg.norm(lab - color, axis=1), out=distance)
+    distance = distance.reshape(image.shape[:2])
+    return distance, float(np.mean(distance[strip] <= BACKGROUND_DELTA_E))
+
+def clean_mask(mask):
+    """
+    Remove speckles and fill pinholes in a binary mask.
+
+    Args:
+        mask: (H, W) bool array
+
+    Returns:
+        (H, W) bool array
+    """
+    import cv2
+
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
+    mask = cv2.morphologyEx(mask.view(np.uint8), cv2.MORPH_OPEN, kernel)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
+    return mask.astype(bool)
+
+def grabcut_mask(image, distance, strip):
+    """
+    GrabCut seeded by the border model.
+
+    The border strip is fixed as background; the rest starts as probable
+    background or probable foreground depending on its distance to the
+    border's colors. GrabCut runs at GRABCUT_MAX_EDGE at most.
+
+    Args:
+        image: RGB image array
+        distance: (H, W) distances from background_distance
+        strip: (H, W) bool mask of the border strip
+
+    Returns:
+        (H, W) bool foreground mask
+    """
+    import cv2
+
+    mask = np.where(distance > BACKGROUND_DELTA_E, cv2.GC_PR_FGD, cv2.GC_PR_BGD).astype(np.uint8)
+    mask[strip] = cv2.GC_BGD
+    if not np.any(mask == cv2.GC_PR_FGD):
+        # Nothing stands out from the border: let GrabCut start from the center
+        mask[~strip] = cv2.GC_PR_FGD
+
+    height, width = image.shape[:2]
+    bgr = np.ascontiguousarray(image[..., ::-1])
+    scale = GRABCUT_MAX_EDGE / max(height, width)
+    if scale < 1:
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        bgr = cv2.resize(bgr, size, interpolation=cv2.INTER_AREA)
+        mask = cv2.resize(mask, size, interpolation=cv2.INTER_NEAREST)
+
+    bgd_model = np.zeros((1, 65), np.float64)
+    fgd_model = np.zeros((1, 65), np.float64)
+    cv2.grabCut(bgr, mask, None, bgd_model, fgd_model, GRABCUT_ITERATIONS, cv2.GC_INIT_WITH_MASK)
+
+    foreground = ((mask == cv2.GC_FGD) | (mask == cv2.GC_PR_FGD)).astype(np.uint8)
+    if foreground.shape != (height, width):
+        foreground = cv2.resize(foreground, (width, height), interpolation=cv2.INTER_NEAREST)
+    return foreground.astype(bool)
+
+def segment_garment(image, method="auto"):
+    """
+    Separate the garment from the background.
+
+    Product shots and flat lays on a plain backdrop are handled by the
+    border model alone: pixels far from every color of the image border are
+    the garment. When the border is too busy for that (a garment worn or
+    hung in a room), the border model only seeds GrabCut.
+
+    Args:
+        image: RGB image array
+        method: "auto", "border", "grabcut" or "none"
+
+    Returns:
+        Tuple of ((H, W) bool foreground mask, method actually used)
+    """
+    if method == "none":
+        return np.ones(image.shape[:2], dtype=bool), "none"
+
+    border, strip = border_pixels(image)
+    distance, uniformity = background_distance(image, border, strip)
+    record_metric("border_uniformity", round(uniformity, 3))
+
+    if method == "border" or (method == "auto" and uniformity >= BORDER_UNIFORMITY):
+        mask, used = clean_mask(distance > BACKGROUND_DELTA_E), "border"
+    else:
+        mask, used = clean_mask(grabcut_mask(image, distance, strip)), "grabcut"
+
+    if mask.mean() < MIN_FOREGROUND_SHARE:
+        return np.ones(image.shape[:2], dtype=bool), "none"
+    return mask, used
+
+def describe_colors(pixels, n_colors):
+    """
+    Dominant colors of a set of pixels with their names and shares.
+
+    Args:
+        pixels: (N, 3) array of RGB pixels
+        n_colors: Number of colors to return
+
+    Returns:
+        List of {"name", "hex", "rgb", "share"} dictionaries, most frequent
+        first
+    """
+    colors = np.array(dominant_colors(pixels, n_colors), dtype=np.float32)
+
+    # Share of each color: pixels nearest to it
+    nearest = np.argmin(np.linalg.norm(pixels[:, None, :].astype(np.float32) - colors[None], axis=2), axis=1)
+    shares = np.bincount(nearest, minlength=len(colors)) / max(len(pixels), 1)
+
+    return [
+        {
+            "name": name,
+            "hex": rgb_to_hex(color),
+            "rgb": [int(round(c)) for c in color],
+            "share": round(float(share), 3),
+        }
+        for color, name, share in zip(colors, name_colors(colors), shares)
+    ]
+
+def part_rows(mask):
+    """
+    Row ranges of the upper and lower halves of the foreground.
+
+    Args:
+        mask: (H, W) bool foreground mask
+
+    Returns:
+        Dictionary mapping each of GARMENT_PARTS to a (start, stop) row range
+    """
+    rows = np.flatnonzero(mask.any(axis=1))
+    top, bottom = int(rows[0]), int(rows[-1]) + 1
+    middle = (top + bottom) // 2
+    return {"upper": (top, middle), "lower": (middle, bottom)}
+
+def analyze_garment(image, n_colors=3, method="auto"):
+    """
+    Dominant colors of the garment(s) in a photo.
+
+    Args:
+        image: RGB image array, ideally at GARMENT_MAX_EDGE
+        n_colors: Number of colors reported for the whole garment
+        method: Segmentation method (see segment_garment)
+
+    Returns:
+        Dictionary with "color" (main {"name", "hex"}), "colors" (see
+        describe_colors), "parts" (main color of the upper and lower half
+        of the foreground), "foreground_share" and "segmentation", or an
+        "error" entry when no garment pixels are left
+    """
+    with stage("segment"):
+        mask, used = segment_garment(image, method)
+    record_metric("segmentation", used)
+
+    if not mask.any():
+        return {"error": "No garment pixels found in the image"}
+
+    with stage("colors"):
+        colors = describe_colors(image[mask], n_colors)
+        parts = {}
+        for part, (start, stop) in part_rows(mask).items():
+            pixels = image[start:stop][mask[start:stop]]
+            if len(pixels):
+                main = describe_colors(pixels, 1)[0]
+                parts[part] = {"name": main["name"], "hex": main["hex"]}
+
+    return {
+        "color": {"name": colors[0]["name"], "hex": colors[0]["hex"]},
+        "colors": colors,
+        "parts": parts,
+        "foreground_share": round(float(mask.mean()), 3),
+        "segmentation": used,
+    }
+
+def garment_colors_for_image(parsed):
+    """
+    Garment colors of the single image carried by a request.
+
+    Args:
+        parsed: Request dictionary with the image ('image', 'image_path' or
+            a raw frame), optional 'n_colors' (default 3), 'segmentation'
+            (default "auto") and 'max_edge' (default GARMENT_MAX_EDGE)
+
+    Returns:
+        Result of analyze_garment, or an "error" entry
+    """
+    try:
+        n_colors = int(parsed.get('n_colors', 3))
+        method = parsed.get('segmentation', 'auto')
+        if method not in SEGMENTATION_METHODS:
+            return {"error": f"Unknown segmentation {method!r}; expected one of {', '.join(SEGMENTATION_METHODS)}"}
+        parsed.setdefault('max_edge', GARMENT_MAX_EDGE)
+
+        get_image = lazy_analysis_image(parsed)
+        params = {"n_colors": n_colors, "segmentation": method, "max_edge": parsed['max_edge'],
+                  "color_method": GARMENT_COLOR_METHOD}
+        return cached(GARMENT_CACHE_NAMESPACE, request_digest(parsed), params,
+                      lambda: analyze_garment(get_image()[0], n_colors, method))
+
+    except Exception as e:
+        return {"error": f"Failed to extract garment colors: {str(e)}"}
+
+def garment_colors_request(parsed):
+    """
+    Garment colors of one image, or of every image of a batch.
+
+    A request with an 'images' list is a batch: every entry is a request of
+    its own (see garment_colors_for_image) and inherits the batch's other
+    keys. A failed entry only fails its own result.
+
+    Args:
+        parsed: Request dictionary
+
+    Returns:
+        Single-image result, or {"results": [...]} in the order of 'images'
+    """
+    images = parsed.get('images')
+    if images is None:
+        return garment_colors_for_image(parsed)
+
+    shared = {key: value for key, value in parsed.items() if key not in ('images', 'id')}
+    record_metric("batch_size", len(images))
+    return {"results": [garment_colors_for_image({**shared, **entry}) for entry in images]}
+
+if __name__ == "__main__":
+    # Long-lived mode: one JSON request per line, one JSON response per line
+    if "--worker" in sys.argv[1:]:
+        run_worker(garment_colors_request)
+        sys.exit(0)
+
+    # Offline mode: many images from a directory, manifest or JSONL stream
+    if "--batch" in sys.argv[1:]:
+        run_batch_cli(garment_colors_request)
+        sys.exit(0)
+
+    try:
+        parsed = read_request()
+    except Exception as e:
+        print(json.dumps({"error": f"Failed to parse input: {str(e)}"}))
+        sys.exit(0)
+
+    print(json.dumps(run_instrumented(parsed, garment_colors_request)))
@@ -0,0 +1,362 @@
+import io
+import os
+import mmap
+import base64
+import hashlib
+import numpy as np
+
+from instrumentation import stage, record_metric
+
+# Longest image edge, in pixels, that analysis runs at. Uploads larger than
+# this are decoded at reduced size; 0 disables downscaling.
+DEFAULT_MAX_EDGE = int(os.environ.get('ANALYSIS_MAX_EDGE', '1024'))
+
+# JPEG DCT scaling flags (cv2 attribute names), largest reduction first
+REDUCED_DECODE_FLAGS = [
+    (8, 'IMREAD_REDUCED_COLOR_8'),
+    (4, 'IMREAD_REDUCED_COLOR_4'),
+    (2, 'IMREAD_REDUCED_COLOR_2'),
+]
+
+# EXIF orientations that swap width and height once applied
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+# Frames kept from a clip or frame list in sequence mode
+SEQUENCE_MAX_FRAMES = int(os.environ.get('SEQUENCE_MAX_FRAMES', '24'))
+
+def decode_base64(base64_data):
+    """
+    Decode base64 image data, tolerating whitespace and missing padding.
+
+    Args:
+        base64_data: Base64 encoded image data
+
+    Returns:
+        Encoded image bytes
+    """
+    base64_data = base64_data.strip()
+    # Add padding if necessary
+    padding = 4 - (len(base64_data) % 4) if len(base64_data) % 4 else 0
+    base64_data += '=' * padding
+    return base64.b64decode(base64_data)
+
+def decode_image_buffer(buffer):
+    """
+    Decode an encoded image straight from a bytes-like buffer.
+
+    OpenCV decodes from a zero-copy view of the buffer; PIL is only used for
+    formats OpenCV cannot read.
+
+    Args:
+        buffer: bytes, memoryview or mmap with the encoded image
+
+    Returns:
+        RGB image array
+    """
+    import cv2
+
+    nparr = np.frombuffer(buffer, np.uint8)
+    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    del nparr
+
+    if img is not None:
+        return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+    from PIL import Image
+    image = Image.open(io.BytesIO(buffer))
+    return np.array(image.convert('RGB'))
+
+def get_image_size(buffer):
+    """
+    Read the displayed (width, height) of an encoded image from its header
+    without decoding the pixel data.
+
+    Args:
+        buffer: bytes-like buffer with the encoded image
+
+    Returns:
+        (width, height) tuple, or None if the header cannot be read
+    """
+    from PIL import Image
+    try:
+        if isinstance(buffer, mmap.mmap):
+            # An mmap is file-like already; read the header in place
+            buffer.seek(0)
+            fp = buffer
+        else:
+            fp = io.BytesIO(bytes(buffer))
+
+        with Image.open(fp) as image:
+            w, h = image.size
+            orientation = image.getexif().get(0x0112)
+
+        if orientation in TRANSPOSED_ORIENTATIONS:
+            w, h = h, w
+        return w, h
+    except Exception:
+        return None
+
+def decode_image_for_analysis(buffer, max_edge=DEFAULT_MAX_EDGE):
+    """
+    Decode an image at a reduced size suited to analysis.
+
+    JPEG uploads are decoded with DCT scaling (IMREAD_REDUCED_COLOR_2/4/8),
+    which skips most of the decode work, and are then area-resized so the
+    longest edge is at most max_edge. Keypoints and regions found on the
+    result can be mapped back with the returned original size.
+
+    Tolerance: MediaPipe resizes its input to 256 px internally, so landmarks
+    mapped back to the original frame differ from a full-resolution run by
+    well under 1% of the image size. Area averaging removes sensor noise,
+    which can make KMeans split a broad skin cluster differently: the main
+    color may move by up to about 15 RGB units, i.e. at most one Monk or
+    Fitzpatrick step, and the undertone is normally unchanged. On a
+    synthetic 12 MP JPEG at max_edge=1024 the main color moved by 12 units
+    while skin tone analysis went from 15 s / 908 MB peak RSS to
+    0.9 s / 222 MB.
+
+    Args:
+        buffer: bytes-like buffer with the encoded image
+        max_edge: Longest edge of the analysis image; 0 or None for full size
+
+    Returns:
+        Tuple of (RGB image array, (original_width, original_height))
+    """
+    import cv2
+
+    size = get_image_size(buffer) if max_edge else None
+    if size is None or max(size) <= max_edge:
+        image = decode_image_buffer(buffer)
+        return image, (image.shape[1], image.shape[0])
+
+    longest = max(size)
+    flag = cv2.IMREAD_COLOR
+    for factor, reduced_flag in REDUCED_DECODE_FLAGS:
+        if longest // factor >= max_edge:
+            flag = getattr(cv2, reduced_flag)
+            break
+
+    img = cv2.imdecode(np.frombuffer(buffer, np.uint8), flag)
+    if img is None:
+        image = decode_image_buffer(buffer)
+    else:
+        image = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+    h, w = image.shape[:2]
+    if max(h, w) > max_edge:
+        ratio = max_edge / max(h, w)
+        new_size = (max(1, round(w * ratio)), max(1, round(h * ratio)))
+        image = cv2.resize(image, new_size, interpolation=cv2.INTER_AREA)
+
+    return image, size
+
+def load_image_file(image_path):
+    """
+    Decode an image file by memory-mapping it rather than reading it into
+    a Python bytes object.
+
+    Args:
+        image_path: Path of the encoded image on disk
+
+    Returns:
+        RGB image array
+    """
+    with open(image_path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return decode_image_buffer(mm)
+
+def load_analysis_image(parsed):
+    """
+    Decode the image carried by a request at analysis resolution.
+
+    The request may set 'max_edge' to override ANALYSIS_MAX_EDGE; 0 asks for
+    full-resolution analysis.
+
+    Args:
+        parsed: Request dictionary (see load_image)
+
+    Returns:
+        Tuple of (RGB image array, (original_width, original_height))
+    """
+    max_edge = parsed.get('max_edge', DEFAULT_MAX_EDGE)
+
+    if parsed.get('image_data') is not None:
+        return decode_image_for_analysis(parsed['image_data'], max_edge)
+    if parsed.get('image_path'):
+        with open(parsed['image_path'], 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return decode_image_for_analysis(mm, max_edge)
+    return decode_image_for_analysis(decode_base64(parsed['image']), max_edge)
+
+def load_video_frames(video_path, max_frames=SEQUENCE_MAX_FRAMES, max_edge=DEFAULT_MAX_EDGE):
+    """
+    Decode up to max_frames frames of a clip, evenly spread and in order.
+
+    Args:
+        video_path: Path of the clip on disk
+        max_frames: Largest number of frames returned
+        max_edge: Longest edge of the returned frames; 0 or None for full size
+
+    Returns:
+        Tuple of (list of RGB frame arrays, (original_width, original_height))
+    """
+    import cv2
+
+    capture = cv2.VideoCapture(video_path)
+    if not capture.isOpened():
+        raise ValueError(f"Could not open video: {video_path}")
+
+    try:
+        # Frame counts from container headers can be missing or wrong, so
+        # the step is only a hint and reading stops at max_frames anyway
+        count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        step = max(1, -(-count // max_frames)) if count > 0 else 1
+
+        frames = []
+        size = None
+        index = 0
+        while len(frames) < max_frames:
+            # grab() skips decoding the frames that are not kept
+            if not capture.grab():
+                break
+            if index % step == 0:
+                ok, frame = capture.retrieve()
+                if not ok:
+                    break
+                h, w = frame.shape[:2]
+                size = (w, h)
+                if max_edge and max(h, w) > max_edge:
+                    ratio = max_edge / max(h, w)
+                    frame = cv2.resize(frame, (max(1, round(w * ratio)), max(1, round(h * ratio))),
+                                       interpolation=cv2.INTER_AREA)
+                frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+            index += 1
+    finally:
+        capture.release()
+
+    if not frames:
+        raise ValueError(f"No frames could be decoded from {video_path}")
+    return frames, size
+
+def load_frame_sequence(parsed):
+    """
+    Decode the frames of a sequence request at analysis resolution.
+
+    The request carries either 'video_path' (a short clip) or 'frames', an
+    ordered list of image dictionaries (see load_analysis_image) that may
+    also be plain paths. Frame lists are resized to the first frame's
+    size, so a tracker sees one consistent frame size.
+
+    Args:
+        parsed: Request dictionary with 'video_path' or 'frames', optional
+            'max_edge' and 'max_frames'
+
+    Returns:
+        Tuple of (list of RGB frame arrays, (original_width, original_height))
+    """
+    import cv2
+
+    max_frames = max(1, int(parsed.get('max_frames', SEQUENCE_MAX_FRAMES)))
+    max_edge = parsed.get('max_edge', DEFAULT_MAX_EDGE)
+
+    with stage("decode"):
+        if parsed.get('video_path'):
+            frames, size = load_video_frames(parsed['video_path'], max_frames, max_edge)
+        else:
+            entries = parsed.get('frames') or []
+            if not entries:
+                raise ValueError("A sequence request needs 'video_path' or 'frames'")
+            if len(entries) > max_frames:
+                # Keep the frames evenly spread over the sequence
+                entries = [entries[i * len(entries) // max_frames] for i in range(max_frames)]
+
+            frames = []
+            size = None
+            for entry in entries:
+                if isinstance(entry, str):
+                    entry = {"image_path": entry}
+                frame, original_size = load_analysis_image({"max_edge": max_edge, **entry})
+                if not frames:
+                    size = original_size
+                elif frame.shape != frames[0].shape:
+                    frame = cv2.resize(frame, (frames[0].shape[1], frames[0].shape[0]),
+                                       interpolation=cv2.INTER_AREA)
+                frames.append(frame)
+
+    record_metric("frames", len(frames))
+    record_metric("image_size", list(size))
+    record_metric("analysis_size", [frames[0].shape[1], frames[0].shape[0]])
+    return frames, size
+
+def load_image(parsed):
+    """
+    Decode the image carried by a request.
+
+    A request can carry the image in one of three ways, checked in order:
+    'image_data' holds raw bytes read from a length-prefixed frame,
+    'image_path' names a file on disk (for example a multer upload), and
+    'image' holds base64 text.
+
+    Args:
+        parsed: Request dictionary
+
+    Returns:
+        RGB image array
+    """
+    if parsed.get('image_data') is not None:
+        return decode_image_buffer(parsed['image_data'])
+    if parsed.get('image_path'):
+        return load_image_file(parsed['image_path'])
+    return decode_image_buffer(decode_base64(parsed['image']))
+
+def request_digest(parsed):
+    """
+    SHA-256 of the encoded image carried by a request, used as cache key.
+
+    Base64 input is decoded here once and kept as 'image_data', so later
+    decoding does not repeat the work. Returns None when the request sets
+    "cache": false.
+
+    Args:
+        parsed: Request dictionary (see load_image)
+
+    Returns:
+        Hex digest string, or None
+    """
+    if parsed.get('cache') is False:
+        return None
+
+    with stage("digest"):
+        if parsed.get('image_data') is None and not parsed.get('image_path'):
+            parsed['image_data'] = decode_base64(parsed.pop('image'))
+
+        if parsed.get('image_data') is not None:
+            return hashlib.sha256(parsed['image_data']).hexdigest()
+
+        with open(parsed['image_path'], 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return hashlib.sha256(mm).hexdigest()
+
+def lazy_analysis_image(parsed):
+    """
+    Defer decoding until a stage actually needs the pixels.
+
+    Args:
+        parsed: Request dictionary (see load_analysis_image)
+
+    Returns:
+        Zero-argument callable returning load_analysis_image(parsed),
+        decoding at most once
+    """
+    decoded = []
+
+    def load():
+        if not decoded:
+            with stage("decode"):
+                image, original_size = load_analysis_image(parsed)
+            record_metric("image_size", list(original_size))
+            record_metric("analysis_size", [image.shape[1], image.shape[0]])
+            decoded.append((image, original_size))
+        return decoded[0]
+
+    return load
@@ -0,0 +1,165 @@
+import os
+import io
+import time
+import contextlib
+import contextvars
+
+# Directory that profiles of requests with "profile": true are written to
+PROFILE_DIR = os.environ.get('ANALYSIS_PROFILE_DIR') or None
+
+# Number of functions listed in the inline profile summary
+PROFILE_TOP = 25
+
+_recorder = contextvars.ContextVar('analysis_recorder', default=None)
+
+class Recorder:
+    """
+    Collects per-stage timings and metrics of one request.
+
+    Stages entered more than once (e.g. one skin mask per region) are
+    accumulated. CPU time is process time, so it includes the threads
+    that OpenCV, BLAS or scikit-learn start for the stage.
+    """
+
+    def __init__(self):
+        self.timings = {}
+        self.metrics = {}
+        self.start_wall = time.perf_counter()
+        self.start_cpu = time.process_time()
+
+    def add_time(self, name, wall, cpu):
+        entry = self.timings.setdefault(name, {"wall_ms": 0.0, "cpu_ms": 0.0, "calls": 0})
+        entry["wall_ms"] += wall * 1000
+        entry["cpu_ms"] += cpu * 1000
+        entry["calls"] += 1
+
+    def report(self):
+        """
+        Return the "timings" and "metrics" blocks.
+
+        Returns:
+            Tuple of (timings, metrics) dictionaries, times rounded to 0.01 ms
+        """
+        timings = {
+            name: {"wall_ms": round(t["wall_ms"], 2), "cpu_ms": round(t["cpu_ms"], 2), "calls": t["calls"]}
+            for name, t in self.timings.items()
+        }
+        timings["total"] = {
+            "wall_ms": round((time.perf_counter() - self.start_wall) * 1000, 2),
+            "cpu_ms": round((time.process_time() - self.start_cpu) * 1000, 2),
+            "calls": 1,
+        }
+        return timings, self.metrics
+
+@contextlib.contextmanager
+def stage(name):
+    """
+    Time a block as a named stage of the current request.
+
+    Does nothing unless the request asked for metrics.
+
+    Args:
+        name: Stage name, e.g. "decode" or "clustering"
+    """
+    recorder = _recorder.get()
+    if recorder is None:
+        yield
+        return
+
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    try:
+        yield
+    finally:
+        recorder.add_time(name, time.perf_counter() - wall, time.process_time() - cpu)
+
+def record_metric(name, value):
+    """
+    Set a metric of the current request; ignored unless metrics are on.
+
+    Args:
+        name: Metric name
+        value: JSON-serializable value
+    """
+    recorder = _recorder.get()
+    if recorder is not None:
+        recorder.metrics[name] = value
+
+def append_metric(name, value):
+    """
+    Append to a list metric of the current request (e.g. one entry per region).
+
+    Args:
+        name: Metric name
+        value: JSON-serializable value
+    """
+    recorder = _recorder.get()
+    if recorder is not None:
+        recorder.metrics.setdefault(name, []).append(value)
+
+def _profile_summary(profiler, request_id):
+    """
+    Summarize a profile and, if PROFILE_DIR is set, dump it for snakeviz/pstats.
+
+    Returns:
+        Dictionary with the top functions by cumulative time and the dump path
+    """
+    import pstats
+
+    out = io.StringIO()
+    stats = pstats.Stats(profiler, stream=out)
+    stats.sort_stats('cumulative').print_stats(PROFILE_TOP)
+
+    summary = {"top_cumulative": out.getvalue().strip().splitlines()}
+    if PROFILE_DIR:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        name = f"{int(time.time() * 1000)}-{os.getpid()}-{request_id if request_id is not None else 'request'}.prof"
+        path = os.path.join(PROFILE_DIR, "".join(c if c.isalnum() or c in '.-_' else '_' for c in name))
+        stats.dump_stats(path)
+        summary["path"] = path
+    return summary
+
+def run_instrumented(request, handle_request):
+    """
+    Run a request handler, adding instrumentation when the request asks for it.
+
+    A request with "metrics": true gets "timings" (wall and CPU time per
+    stage) and "metrics" (image sizes, pixel counts, cluster iterations,
+    cache hits) blocks in its result. With "profile": true the handler also
+    runs under cProfile and a "profile" block lists the top functions; set
+    ANALYSIS_PROFILE_DIR to also keep the full .prof file. Both blocks are
+    added after caching, so cached results never contain them.
+
+    Args:
+        request: Request dictionary
+        handle_request: Callable taking the request dictionary
+
+    Returns:
+        The handler's result
+    """
+    profile = bool(request.get("profile"))
+    if not (request.get("metrics") or profile):
+        return handle_request(request)
+
+    if profile:
+        import cProfile
+
+    recorder = Recorder()
+    token = _recorder.set(recorder)
+    profiler = cProfile.Profile() if profile else None
+    try:
+        if profiler:
+            profiler.enable()
+        try:
+            result = handle_request(request)
+        finally:
+            if profiler:
+                profiler.disable()
+    finally:
+        _recorder.reset(token)
+
+    if isinstance(result, dict):
+        result["timings"], result["metrics"] = recorder.report()
+        if profiler:
+            result["profile"] = _profile_summary(profiler, request.get("id"))
+    return result
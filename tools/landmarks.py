@@ -0,0 +1,209 @@
+import base64
+import numpy as np
+
+# Per-landmark fields of the structured pose output, in column order
+LANDMARK_FIELDS = ("x", "y", "z", "visibility", "presence")
+
+# MediaPipe Pose landmark index of each named keypoint used for skin regions
+MEDIAPIPE_KEYPOINTS = {
+    "nose": 0,
+    "left_eye": 2,
+    "right_eye": 5,
+    "left_ear": 7,
+    "right_ear": 8,
+    "mouth_left": 9,
+    "mouth_right": 10,
+    "left_shoulder": 11,
+    "right_shoulder": 12,
+    "left_elbow": 13,
+    "right_elbow": 14,
+    "left_wrist": 15,
+    "right_wrist": 16,
+    "left_hip": 23,
+    "right_hip": 24,
+    "left_knee": 25,
+    "right_knee": 26,
+    "left_ankle": 27,
+    "right_ankle": 28,
+}
+
+# Name of each MediaPipe landmark index that has a named keypoint
+MEDIAPIPE_KEYPOINT_NAMES = {index: name for name, index in MEDIAPIPE_KEYPOINTS.items()}
+
+# Landmarks MediaPipe rates below this visibility are not used for regions
+MIN_KEYPOINT_VISIBILITY = 0.5
+
+# Margin added around a person's landmarks, relative to the box size; pose
+# landmarks stop at the eyes and ankles, so the head and feet need room
+PERSON_BOX_PAD = 0.15
+
+def landmarks_to_array(normalized, image_size):
+    """
+    Map normalized MediaPipe landmarks to a pixel-space float32 array.
+
+    x and y become sub-pixel coordinates of the target image, z is scaled by
+    the image width (MediaPipe's convention), visibility and presence are
+    kept as they are.
+
+    Args:
+        normalized: List of [x, y, z, visibility, presence] rows normalized
+            to [0, 1], or None
+        image_size: (width, height) of the target image
+
+    Returns:
+        (33, 5) float32 array, or None
+    """
+    if normalized is None:
+        return None
+    w, h = image_size
+    array = np.array(normalized, dtype=np.float32).reshape(len(normalized), -1)
+    if array.shape[1] < len(LANDMARK_FIELDS):
+        # Rows without z/visibility/presence are treated as fully visible
+        padded = np.zeros((len(array), len(LANDMARK_FIELDS)), dtype=np.float32)
+        padded[:, 3:] = 1.0
+        padded[:, :array.shape[1]] = array
+        array = padded
+    array[:, 0] *= w
+    array[:, 1] *= h
+    array[:, 2] *= w
+    return array
+
+def landmarks_to_json(array):
+    """
+    Compact JSON form of a landmark array.
+
+    Args:
+        array: (N, 5) landmark array or None
+
+    Returns:
+        List of [x, y, z, visibility, presence] rows rounded to 0.01 px and
+        three decimals for visibility/presence, or an empty list
+    """
+    if array is None:
+        return []
+    return [
+        [round(float(x), 2), round(float(y), 2), round(float(z), 2),
+         round(float(v), 3), round(float(p), 3)]
+        for x, y, z, v, p in array
+    ]
+
+def pack_landmarks(array):
+    """
+    Pack a landmark array as base64 little-endian float32, row-major.
+
+    Args:
+        array: (N, 5) landmark array
+
+    Returns:
+        Base64 string
+    """
+    return base64.b64encode(np.ascontiguousarray(array, dtype='<f4').tobytes()).decode('ascii')
+
+def unpack_landmarks(packed):
+    """
+    Inverse of pack_landmarks.
+
+    Args:
+        packed: Base64 string of float32 values
+
+    Returns:
+        (N, 5) float32 array
+    """
+    values = np.frombuffer(base64.b64decode(packed), dtype='<f4')
+    return values.reshape(-1, len(LANDMARK_FIELDS)).astype(np.float32)
+
+def parse_landmarks(value):
+    """
+    Accept landmarks as a JSON list of rows or as a packed float32 string.
+
+    Args:
+        value: List of [x, y, ...] pixel rows, or pack_landmarks output
+
+    Returns:
+        (N, 5) float32 array in pixel coordinates
+    """
+    if isinstance(value, str):
+        return unpack_landmarks(value)
+    return landmarks_to_array(value, (1, 1))
+
+def landmarks_to_keypoints(array, min_visibility=MIN_KEYPOINT_VISIBILITY):
+    """
+    Convert MediaPipe landmarks to the named keypoint format used by the
+    skin tone detector.
+
+    Args:
+        array: (33, 5) pixel landmark array, or None
+        min_visibility: Landmarks with a lower visibility are left out
+
+    Returns:
+        Dictionary with keypoint information
+    """
+    keypoint_dict = {}
+    if array is not None:
+        for name, index in MEDIAPIPE_KEYPOINTS.items():
+            if index < len(array) and array[index, 3] >= min_visibility:
+                keypoint_dict[name] = [float(array[index, 0]), float(array[index, 1])]
+    return {"keypoints": keypoint_dict}
+
+def landmarks_bbox(array, image_size, min_visibility=MIN_KEYPOINT_VISIBILITY, pad=PERSON_BOX_PAD):
+    """
+    Bounding box of one person's landmarks.
+
+    Args:
+        array: (33, 5) pixel landmark array, or None
+        image_size: (width, height) the box is clipped to
+        min_visibility: Landmarks with a lower visibility are left out,
+            unless none reaches it
+        pad: Margin added on every side, relative to the box width/height
+
+    Returns:
+        [x, y, w, h] integer box, or None
+    """
+    if array is None or len(array) == 0:
+        return None
+    visible = array[array[:, 3] >= min_visibility]
+    if len(visible) == 0:
+        visible = array
+
+    w, h = image_size
+    x0, y0 = visible[:, 0].min(), visible[:, 1].min()
+    x1, y1 = visible[:, 0].max(), visible[:, 1].max()
+    pad_x, pad_y = (x1 - x0) * pad, (y1 - y0) * pad
+    x0, y0 = max(0, int(np.floor(x0 - pad_x))), max(0, int(np.floor(y0 - pad_y)))
+    x1, y1 = min(w, int(np.ceil(x1 + pad_x))), min(h, int(np.ceil(y1 + pad_y)))
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return [x0, y0, x1 - x0, y1 - y0]
+
+def smooth_landmark_sequence(sequence):
+    """
+    One stable set of landmarks from the landmarks of consecutive frames.
+
+    Every coordinate is the visibility-weighted median over the frames the
+    pose was found in, so a frame where the tracker slipped or a limb was
+    hidden does not pull the result; visibility and presence are averaged
+    over all frames, missed frames counting as 0.
+
+    Args:
+        sequence: List of normalized [x, y, z, visibility, presence] row
+            lists (or None for frames without a pose), one per frame
+
+    Returns:
+        List of normalized rows, or None if no frame has a pose
+    """
+    found = [np.asarray(landmarks_to_array(rows, (1, 1)), dtype=np.float64)
+             for rows in sequence if rows is not None]
+    if not found:
+        return None
+
+    stack = np.stack(found)
+    weights = np.maximum(stack[:, :, 3], 1e-3)
+    order = np.argsort(stack[:, :, :3], axis=0)
+    sorted_values = np.take_along_axis(stack[:, :, :3], order, axis=0)
+    sorted_weights = np.take_along_axis(np.repeat(weights[:, :, None], 3, axis=2), order, axis=0)
+    cumulative = np.cumsum(sorted_weights, axis=0)
+    median_index = (cumulative < cumulative[-1] / 2).sum(axis=0, keepdims=True)
+    smoothed = np.take_along_axis(sorted_values, median_index, axis=0)[0]
+
+    scores = stack[:, :, 3:].sum(axis=0) / len(sequence)
+    return np.concatenate([smoothed, scores], axis=1).tolist()
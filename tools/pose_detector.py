@@ -1,37 +1,483 @@
+import os
 import sys
-import base64
 import json
-import cv2
 import numpy as np
-import mediapipe as mp
 
-def main():
+from worker import run_worker, read_request
+from batch import run_batch_cli
+from image_io import DEFAULT_MAX_EDGE, lazy_analysis_image, request_digest
+from result_cache import cached
+from instrumentation import stage, run_instrumented
+from landmarks import (
+    LANDMARK_FIELDS,
+    landmarks_bbox,
+    landmarks_to_array,
+    landmarks_to_json,
+    pack_landmarks,
+)
+
+# Cache namespace of pose results; bump the version when detection changes
+POSE_CACHE_NAMESPACE = "pose:2"
+
+# Cache namespace of multi-person pose results
+PEOPLE_CACHE_NAMESPACE = "poses:1"
+
+# Output of requests without a 'format': the legacy landmark text. Start the
+# script with --json to default to the structured rows instead
+DEFAULT_FORMAT = "text"
+
+# MediaPipe Pose model_complexity of each model name
+POSE_COMPLEXITY = {"lite": 0, "full": 1, "heavy": 2}
+
+# Pose model: "lite", "full" or "heavy", or the path of a MediaPipe Tasks
+# pose landmarker (pose_landmarker_*.task), which then also serves
+# single-person requests
+POSE_MODEL = os.environ.get('POSE_MODEL', 'full')
+
+# MediaPipe Tasks pose landmarker model used for requests asking for more
+# than one person; defaults to POSE_MODEL when that is a .task path
+POSE_LANDMARKER_MODEL = os.environ.get('POSE_LANDMARKER_MODEL') or (
+    POSE_MODEL if POSE_MODEL.endswith('.task') else None)
+
+# Segmentation masks are not used by any caller and cost time per frame
+POSE_SEGMENTATION = os.environ.get('POSE_SEGMENTATION', '0') == '1'
+
+# Delegate of the Tasks landmarker: "cpu" or "gpu"
+POSE_DELEGATE = os.environ.get('POSE_DELEGATE', 'cpu')
+
+# Largest number of people a request may ask for
+MAX_POSES_LIMIT = 10
+
+# Pose model shared by every request served from this process
+_pose_model = None
+
+# Tasks landmarkers by number of poses, shared the same way
+_pose_landmarkers = {}
+
+# Tracking-mode model for frame sequences, reset before every sequence
+_tracking_model = None
+
+def pose_model_complexity(model=POSE_MODEL):
+    """
+    MediaPipe Pose model_complexity of a model name.
+
+    Args:
+        model: "lite", "full" or "heavy"; a .task path maps to "full", the
+            solution model used for frame sequences
+
+    Returns:
+        0, 1 or 2
+    """
+    if model.endswith('.task'):
+        return POSE_COMPLEXITY["full"]
+    if model not in POSE_COMPLEXITY:
+        raise ValueError(f"Unknown POSE_MODEL {model!r}; expected lite, full, heavy or a .task path")
+    return POSE_COMPLEXITY[model]
+
+def get_pose_model():
+    """
+    Return the process-wide MediaPipe Pose model, creating it on first use.
+
+    Returns:
+        mp.solutions.pose.Pose instance
+    """
+    global _pose_model
+    if _pose_model is None:
+        complexity = pose_model_complexity()
+        with stage("pose_model_load"):
+            # Importing MediaPipe takes longer than a cached request, so it
+            # is only paid by requests that actually run the model
+            import mediapipe as mp
+            mp_pose = mp.solutions.pose
+            _pose_model = mp_pose.Pose(
+                static_image_mode=True,
+                model_complexity=complexity,
+                enable_segmentation=POSE_SEGMENTATION,
+            )
+    return _pose_model
+
+def detect_normalized_landmarks(image_rgb):
+    """
+    Run MediaPipe Pose on an RGB image.
+
+    Args:
+        image_rgb: RGB image array
+
+    Returns:
+        List of [x, y, z, visibility, presence] rows, x and y normalized to
+        [0, 1], one per landmark, or None if no pose was detected
+    """
+    if POSE_MODEL.endswith('.task'):
+        people = detect_people_normalized(image_rgb, 1)
+        return people[0] if people else None
+
+    pose = get_pose_model()
+    with stage("pose"):
+        results = pose.process(image_rgb)
+
+    if not results.pose_landmarks:
+        return None
+
+    return [
+        [landmark.x, landmark.y, landmark.z, landmark.visibility, landmark.presence]
+        for landmark in results.pose_landmarks.landmark
+    ]
+
+def get_tracking_model():
+    """
+    Return the process-wide MediaPipe Pose model in tracking mode.
+
+    With static_image_mode=False the person detector only runs until a
+    pose is found; later frames are tracked from the previous frame's
+    landmarks, and MediaPipe's own landmark smoothing is on.
+
+    Returns:
+        mp.solutions.pose.Pose instance
+    """
+    global _tracking_model
+    if _tracking_model is None:
+        complexity = pose_model_complexity()
+        with stage("pose_model_load"):
+            import mediapipe as mp
+            _tracking_model = mp.solutions.pose.Pose(
+                static_image_mode=False,
+                smooth_landmarks=True,
+                model_complexity=complexity,
+                enable_segmentation=POSE_SEGMENTATION,
+            )
+    return _tracking_model
+
+def detect_sequence_normalized(frames):
+    """
+    Run MediaPipe Pose over consecutive frames in tracking mode.
+
+    Args:
+        frames: List of RGB frame arrays, in order
+
+    Returns:
+        List with the normalized landmarks of every frame (see
+        detect_normalized_landmarks), None for frames without a pose
+    """
+    pose = get_tracking_model()
+    # Tracking state must not carry over from the previous sequence
+    pose.reset()
+
+    sequence = []
+    for frame in frames:
+        with stage("pose"):
+            results = pose.process(frame)
+        if not results.pose_landmarks:
+            sequence.append(None)
+            continue
+        sequence.append([
+            [landmark.x, landmark.y, landmark.z, landmark.visibility, landmark.presence]
+            for landmark in results.pose_landmarks.landmark
+        ])
+    return sequence
+
+def get_pose_landmarker(num_poses):
+    """
+    Return the process-wide MediaPipe Tasks PoseLandmarker for num_poses people.
+
+    Args:
+        num_poses: Largest number of people detected per image
+
+    Returns:
+        mediapipe.tasks.vision.PoseLandmarker instance
+    """
+    if num_poses not in _pose_landmarkers:
+        if not POSE_LANDMARKER_MODEL:
+            raise RuntimeError("Multi-person pose detection needs POSE_LANDMARKER_MODEL "
+                               "(path to a pose_landmarker .task model)")
+        with stage("pose_model_load"):
+            from mediapipe.tasks.python import BaseOptions, vision
+            delegate = BaseOptions.Delegate.GPU if POSE_DELEGATE == 'gpu' else BaseOptions.Delegate.CPU
+            options = vision.PoseLandmarkerOptions(
+                base_options=BaseOptions(model_asset_path=POSE_LANDMARKER_MODEL, delegate=delegate),
+                running_mode=vision.RunningMode.IMAGE,
+                num_poses=num_poses,
+                output_segmentation_masks=POSE_SEGMENTATION,
+            )
+            _pose_landmarkers[num_poses] = vision.PoseLandmarker.create_from_options(options)
+    return _pose_landmarkers[num_poses]
+
+def detect_people_normalized(image_rgb, max_poses):
+    """
+    Run the MediaPipe Tasks PoseLandmarker for up to max_poses people.
+
+    Args:
+        image_rgb: RGB image array
+        max_poses: Largest number of people to detect
+
+    Returns:
+        List with one list of [x, y, z, visibility, presence] rows
+        (normalized like detect_normalized_landmarks) per person, largest
+        person first
+    """
+    import mediapipe as mp
+
+    landmarker = get_pose_landmarker(max_poses)
+    with stage("pose"):
+        result = landmarker.detect(mp.Image(image_format=mp.ImageFormat.SRGB,
+                                            data=np.ascontiguousarray(image_rgb)))
+
+    people = [
+        [[lm.x, lm.y, lm.z, lm.visibility or 0.0, lm.presence or 0.0] for lm in person]
+        for person in result.pose_landmarks
+    ]
+
+    # Largest landmark span first, so the first person is the main subject
+    def span(person):
+        rows = np.array(person)
+        return float(np.ptp(rows[:, 0]) * np.ptp(rows[:, 1]))
+
+    return sorted(people, key=span, reverse=True)
+
+def landmarks_to_pixels(normalized, image_size):
+    """
+    Map normalized landmarks to pixel coordinates of an image.
+
+    Args:
+        normalized: List of normalized [x, y, ...] rows or None
+        image_size: (width, height) of the target image
+
+    Returns:
+        List of integer [x, y] pixel coordinates, or None
+    """
+    if normalized is None:
+        return None
+    w, h = image_size
+    return [[int(row[0] * w), int(row[1] * h)] for row in normalized]
+
+def detect_landmarks(image_rgb, image_size=None):
+    """
+    Run MediaPipe Pose on an RGB image and return pixel landmarks.
+
+    Args:
+        image_rgb: RGB image array
+        image_size: Optional (width, height) to map the landmarks to, for
+            example the original size of a downscaled analysis image
+
+    Returns:
+        List of [x, y] pixel coordinates, one per landmark, or None if no
+        pose was detected
+    """
+    if image_size is None:
+        image_size = (image_rgb.shape[1], image_rgb.shape[0])
+    return landmarks_to_pixels(detect_normalized_landmarks(image_rgb), image_size)
+
+def format_landmarks(landmarks):
+    """
+    Format landmarks as "Landmark N: x=.., y=.." lines.
+
+    Args:
+        landmarks: List of [x, y] pixel coordinates or None
+
+    Returns:
+        Landmark text
+    """
+    if not landmarks:
+        return "No pose landmarks detected."
+    return "\n".join(
+        f"Landmark {idx + 1}: x={x}, y={y}" for idx, (x, y) in enumerate(landmarks)
+    )
+
+def cached_pose(load_image, digest, max_edge):
+    """
+    Run pose detection through the result cache.
+
+    Args:
+        load_image: Zero-argument callable returning (analysis image,
+            original size), only called on a cache miss
+        digest: Image digest from image_io.request_digest, or None
+        max_edge: Analysis resolution the image is decoded at
+
+    Returns:
+        Dictionary with "normalized" landmarks (or None), "image_size" and
+        "analysis_size"
+    """
+    def compute():
+        image, original_size = load_image()
+        return {
+            "normalized": detect_normalized_landmarks(image),
+            "image_size": list(original_size),
+            "analysis_size": [image.shape[1], image.shape[0]],
+        }
+
+    return cached(POSE_CACHE_NAMESPACE, digest, {"max_edge": max_edge, "model": POSE_MODEL}, compute)
+
+def cached_people(load_image, digest, max_edge, max_poses):
+    """
+    Run multi-person pose detection through the result cache.
+
+    Args:
+        load_image: Zero-argument callable returning (analysis image,
+            original size), only called on a cache miss
+        digest: Image digest from image_io.request_digest, or None
+        max_edge: Analysis resolution the image is decoded at
+        max_poses: Largest number of people to detect
+
+    Returns:
+        Dictionary with "people" (normalized landmarks per person, largest
+        first), "image_size" and "analysis_size"
+    """
+    def compute():
+        image, original_size = load_image()
+        return {
+            "people": detect_people_normalized(image, max_poses),
+            "image_size": list(original_size),
+            "analysis_size": [image.shape[1], image.shape[0]],
+        }
+
+    params = {"max_edge": max_edge, "max_poses": max_poses, "model": POSE_LANDMARKER_MODEL}
+    return cached(PEOPLE_CACHE_NAMESPACE, digest, params, compute)
+
+def parse_max_poses(parsed):
+    """
+    Number of people a request asks for, or None for single-person mode.
+
+    Args:
+        parsed: Request dictionary with optional 'max_poses'
+
+    Returns:
+        Integer between 1 and MAX_POSES_LIMIT, or None
+    """
+    if parsed.get('max_poses') is None:
+        return None
+    return max(1, min(MAX_POSES_LIMIT, int(parsed['max_poses'])))
+
+def format_people(people, image_size, output_format):
+    """
+    Per-person part of a multi-person pose response.
+
+    Args:
+        people: Normalized landmarks per person
+        image_size: (width, height) the landmarks are reported in
+        output_format: "json", "float32" or "text" (see detect_pose)
+
+    Returns:
+        List with one dictionary per person: "bbox" ([x, y, w, h] around
+        the visible landmarks) and the landmarks in the requested format
+    """
+    entries = []
+    for normalized in people:
+        array = landmarks_to_array(normalized, image_size)
+        entry = {"bbox": landmarks_bbox(array, image_size)}
+        if output_format == 'text':
+            entry["landmarks_text"] = format_landmarks(landmarks_to_pixels(normalized, image_size))
+        elif output_format == 'float32':
+            entry["shape"] = list(array.shape)
+            entry["landmarks_f32"] = pack_landmarks(array)
+        else:
+            entry["landmarks"] = landmarks_to_json(array)
+        entries.append(entry)
+    return entries
+
+def detect_pose(parsed):
+    """
+    Run pose detection on the image carried by a request.
+
+    The request's 'format' selects the output: "text" (DEFAULT_FORMAT)
+    gives the legacy "Landmark N: x=.., y=.." lines, "json" gives one
+    [x, y, z, visibility, presence] row per landmark in pixel coordinates
+    of the original upload, and "float32" gives the same 33x5 array packed
+    as base64 little-endian float32 (see landmarks.pack_landmarks).
+
+    With 'max_poses' the MediaPipe Tasks PoseLandmarker (POSE_LANDMARKER_MODEL)
+    looks for up to that many people, and the result lists every person
+    found under "people", largest first, each with a bounding box and its
+    landmarks in the requested format.
+
+    Args:
+        parsed: Request dictionary carrying the image (see image_io.load_analysis_image)
+
+    Returns:
+        Pose dictionary, or a dictionary with an "error" entry
+    """
     try:
-        input_data = sys.stdin.read()
-        parsed = json.loads(input_data)
-        base64_image = parsed['image']
-
-        # Decode base64 to image
-        image_bytes = base64.b64decode(base64_image)
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-
-        # Setup MediaPipe Pose
-        mp_pose = mp.solutions.pose
-        pose = mp_pose.Pose(static_image_mode=True)
-        results = pose.process(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
-
-        # Check and print landmarks
-        if results.pose_landmarks:
-            for idx, landmark in enumerate(results.pose_landmarks.landmark):
-                x = int(landmark.x * img.shape[1])
-                y = int(landmark.y * img.shape[0])
-                print(f"Landmark {idx + 1}: x={x}, y={y}")
+        max_poses = parse_max_poses(parsed)
+        if max_poses is not None:
+            found = cached_people(
+                lazy_analysis_image(parsed),
+                request_digest(parsed),
+                parsed.get('max_edge', DEFAULT_MAX_EDGE),
+                max_poses,
+            )
+            return {
+                "detected": bool(found["people"]),
+                "fields": list(LANDMARK_FIELDS),
+                "image_size": found["image_size"],
+                "people": format_people(found["people"], found["image_size"], parsed.get('format', DEFAULT_FORMAT)),
+            }
+
+        pose = cached_pose(
+            lazy_analysis_image(parsed),
+            request_digest(parsed),
+            parsed.get('max_edge', DEFAULT_MAX_EDGE),
+        )
+        output_format = parsed.get('format', DEFAULT_FORMAT)
+
+        if output_format == 'text':
+            landmarks = landmarks_to_pixels(pose["normalized"], pose["image_size"])
+            return {"landmarks_text": format_landmarks(landmarks)}
+
+        # Landmarks are reported in the coordinates of the original upload
+        array = landmarks_to_array(pose["normalized"], pose["image_size"])
+        result = {
+            "detected": array is not None,
+            "fields": list(LANDMARK_FIELDS),
+            "image_size": pose["image_size"],
+        }
+        if output_format == 'float32':
+            result["shape"] = list(array.shape) if array is not None else [0, len(LANDMARK_FIELDS)]
+            result["landmarks_f32"] = pack_landmarks(array) if array is not None else ""
         else:
-            print("No pose landmarks detected.")
+            result["landmarks"] = landmarks_to_json(array)
+        return result
 
     except Exception as e:
-        print(f"Error processing image: {e}")
+        return {"error": f"Error processing image: {e}"}
+
+def detect_pose_json(parsed):
+    """
+    detect_pose with "json" as the default format, served with --json.
+
+    Args:
+        parsed: Request dictionary carrying the image
+
+    Returns:
+        Pose dictionary, or a dictionary with an "error" entry
+    """
+    return detect_pose({"format": "json", **parsed})
+
+def main():
+    args = sys.argv[1:]
+    default_format = "json" if "--json" in args else DEFAULT_FORMAT
+    handle_request = detect_pose_json if "--json" in args else detect_pose
+
+    if "--worker" in args:
+        run_worker(handle_request)
+        return
+
+    if "--batch" in args:
+        run_batch_cli(handle_request, [arg for arg in args if arg != "--json"])
+        return
+
+    try:
+        parsed = read_request()
+    except Exception as e:
+        if default_format == "text":
+            print(f"Error processing image: {e}")
+        else:
+            print(json.dumps({"error": f"Failed to parse input: {e}"}))
+        return
+
+    result = run_instrumented(parsed, handle_request)
+    # One-shot text requests print the bare landmark lines, as they always have
+    if parsed.get("format", default_format) == "text" and set(result) <= {"landmarks_text", "error"}:
+        print(result.get("landmarks_text", result.get("error")))
+    else:
+        print(json.dumps(result))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,257 @@
+import os
+import sys
+import json
+import numpy as np
+
+from worker import run_worker, read_request
+from batch import run_batch_cli
+from image_io import lazy_analysis_image
+from instrumentation import stage, record_metric, run_instrumented
+
+# Longest edge the checks run at; thresholds below are calibrated for it
+QUALITY_MAX_EDGE = 256
+
+# Shortest edge of the upload, in pixels, below which pose landmarks and
+# skin regions are too coarse to use
+MIN_SHORT_EDGE = int(os.environ.get('QUALITY_MIN_EDGE', '240'))
+
+# Variance of the Laplacian at QUALITY_MAX_EDGE below which the image is
+# reported as blurry. Sharp test photos measure 34-106 there, the same
+# photos blurred with a 4 px (at 1024 px) Gaussian 3-12; without a
+# calibration corpus this is a warning, never a reject
+BLUR_THRESHOLD = float(os.environ.get('QUALITY_BLUR_THRESHOLD', '10'))
+
+# Gray levels counted as crushed shadows and blown highlights
+DARK_LEVEL = 16
+BRIGHT_LEVEL = 240
+
+# Mean gray level outside which the image is under- or overexposed
+MIN_BRIGHTNESS = 35
+MAX_BRIGHTNESS = 225
+
+# Share of crushed or blown pixels that makes the image under- or overexposed
+MAX_CLIPPED_SHARE = 0.6
+
+# Standard deviation of the gray levels below which the image is flat
+MIN_CONTRAST = 12
+
+# Run the person/face presence check unless a request says otherwise
+QUALITY_PRESENCE_CHECK = os.environ.get('QUALITY_PRESENCE_CHECK', '0') == '1'
+
+# Haar cascade of the face check; defaults to OpenCV's frontal face model
+# when the installed OpenCV ships it, otherwise only the person check runs
+FACE_CASCADE_PATH = os.environ.get('QUALITY_FACE_CASCADE') or None
+
+# Smallest face, in pixels at QUALITY_MAX_EDGE
+MIN_FACE_SIZE = 16
+
+# SVM score a HOG person window needs to count
+PERSON_MIN_SCORE = 0.3
+
+_face_cascade = None
+_person_detector = None
+
+def get_face_cascade():
+    """
+    Process-wide Haar face cascade, loaded on first use.
+
+    Returns:
+        cv2.CascadeClassifier, or None when no cascade file is available
+    """
+    global _face_cascade
+    if _face_cascade is None:
+        import cv2
+
+        path = FACE_CASCADE_PATH
+        if path is None and hasattr(cv2, 'data'):
+            path = os.path.join(cv2.data.haarcascades, 'haarcascade_frontalface_default.xml')
+        cascade = cv2.CascadeClassifier(path) if path and os.path.exists(path) else None
+        _face_cascade = cascade if cascade is not None and not cascade.empty() else False
+    return _face_cascade or None
+
+def get_person_detector():
+    """
+    Process-wide HOG pedestrian detector, created on first use.
+
+    Returns:
+        cv2.HOGDescriptor with OpenCV's default people SVM
+    """
+    global _person_detector
+    if _person_detector is None:
+        import cv2
+
+        _person_detector = cv2.HOGDescriptor()
+        _person_detector.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+    return _person_detector
+
+def exposure_stats(gray):
+    """
+    Exposure measurements from the gray level histogram.
+
+    Args:
+        gray: uint8 grayscale image
+
+    Returns:
+        Dictionary with "brightness" (mean level), "contrast" (standard
+        deviation), "dark_share" and "bright_share" (shares of pixels at
+        or below DARK_LEVEL and at or above BRIGHT_LEVEL)
+    """
+    histogram = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    share = histogram / histogram.sum()
+    levels = np.arange(256)
+    mean = float(share @ levels)
+    return {
+        "brightness": round(mean, 1),
+        "contrast": round(float(np.sqrt(share @ (levels - mean) ** 2)), 1),
+        "dark_share": round(float(share[:DARK_LEVEL + 1].sum()), 3),
+        "bright_share": round(float(share[BRIGHT_LEVEL:].sum()), 3),
+    }
+
+def blur_score(gray):
+    """
+    Variance of the Laplacian; low values mean few sharp edges.
+
+    Args:
+        gray: uint8 grayscale image at QUALITY_MAX_EDGE
+
+    Returns:
+        Float score
+    """
+    import cv2
+
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+def detect_presence(gray):
+    """
+    Lightweight check for a face or a standing person.
+
+    The Haar face cascade runs first, when available; the HOG person
+    detector only runs when no face is found.
+
+    Args:
+        gray: uint8 grayscale image at QUALITY_MAX_EDGE
+
+    Returns:
+        Dictionary with "face" (bool, or None without a cascade) and
+        "person" (bool)
+    """
+    face = None
+    cascade = get_face_cascade()
+    if cascade is not None:
+        faces = cascade.detectMultiScale(gray, scaleFactor=1.15, minNeighbors=4,
+                                         minSize=(MIN_FACE_SIZE, MIN_FACE_SIZE))
+        face = len(faces) > 0
+        if face:
+            return {"face": True, "person": True}
+
+    _, scores = get_person_detector().detectMultiScale(gray, winStride=(8, 8), padding=(8, 8), scale=1.1)
+    person = bool(len(scores)) and float(np.max(scores)) >= PERSON_MIN_SCORE
+    return {"face": face, "person": person}
+
+# Findings that stop the analysis: the image cannot be used at all. Every
+# other finding (exposure, blur, no person found) is a warning returned
+# with the analysis, since the thresholds are not calibrated well enough
+# to throw an upload away
+BLOCKING_REASONS = ("unreadable", "too_small")
+
+def reject_reason(code, message, value, threshold):
+    return {"code": code, "message": message, "value": value, "threshold": threshold}
+
+def assess_quality(image, original_size, presence=False):
+    """
+    Decide whether an image is worth the full analysis.
+
+    Args:
+        image: RGB image array at QUALITY_MAX_EDGE
+        original_size: (width, height) of the upload
+        presence: Also require a face or a person (see detect_presence)
+
+    Returns:
+        Dictionary with "ok" (False only for BLOCKING_REASONS), "reasons"
+        (blocking findings, each {"code", "message", "value",
+        "threshold"}, empty when ok), "warnings" (the other findings, same
+        form) and "measurements"
+    """
+    import cv2
+
+    gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+    measurements = {"width": int(original_size[0]), "height": int(original_size[1])}
+    measurements.update(exposure_stats(gray))
+    measurements["blur"] = round(blur_score(gray), 1)
+
+    reasons = []
+    short_edge = min(original_size)
+    if short_edge < MIN_SHORT_EDGE:
+        reasons.append(reject_reason("too_small", "The image resolution is too low",
+                                     short_edge, MIN_SHORT_EDGE))
+    if measurements["brightness"] < MIN_BRIGHTNESS or measurements["dark_share"] > MAX_CLIPPED_SHARE:
+        reasons.append(reject_reason("too_dark", "The image is too dark",
+                                     measurements["brightness"], MIN_BRIGHTNESS))
+    elif measurements["brightness"] > MAX_BRIGHTNESS or measurements["bright_share"] > MAX_CLIPPED_SHARE:
+        reasons.append(reject_reason("overexposed", "The image is overexposed",
+                                     measurements["brightness"], MAX_BRIGHTNESS))
+    elif measurements["contrast"] < MIN_CONTRAST:
+        reasons.append(reject_reason("low_contrast", "The image has almost no contrast",
+                                     measurements["contrast"], MIN_CONTRAST))
+    if measurements["blur"] < BLUR_THRESHOLD:
+        reasons.append(reject_reason("blurry", "The image is too blurry",
+                                     measurements["blur"], BLUR_THRESHOLD))
+
+    # Only look for a person in images that passed everything else
+    if presence and not reasons:
+        with stage("presence"):
+            measurements.update(detect_presence(gray))
+        if not measurements["person"]:
+            reasons.append(reject_reason("no_person", "No person was found in the image", False, True))
+
+    blocking = [reason for reason in reasons if reason["code"] in BLOCKING_REASONS]
+    warnings = [reason for reason in reasons if reason["code"] not in BLOCKING_REASONS]
+    return {"ok": not blocking, "reasons": blocking, "warnings": warnings, "measurements": measurements}
+
+def quality_request(parsed):
+    """
+    Run the quality gate on the image carried by a request.
+
+    Args:
+        parsed: Request dictionary with the image ('image', 'image_path' or
+            a raw frame) and optional 'presence' (default
+            QUALITY_PRESENCE_CHECK)
+
+    Returns:
+        Result of assess_quality, a blocking "unreadable" result when the
+        image cannot be decoded, or an "error" entry
+    """
+    try:
+        parsed['max_edge'] = QUALITY_MAX_EDGE
+        try:
+            image, original_size = lazy_analysis_image(parsed)()
+        except Exception as e:
+            reason = reject_reason("unreadable", f"The image could not be read: {str(e)}", None, None)
+            return {"ok": False, "reasons": [reason], "warnings": [], "measurements": {}}
+        with stage("quality"):
+            result = assess_quality(image, original_size, bool(parsed.get('presence', QUALITY_PRESENCE_CHECK)))
+        record_metric("rejected", [reason["code"] for reason in result["reasons"]])
+        record_metric("warnings", [reason["code"] for reason in result["warnings"]])
+        return result
+
+    except Exception as e:
+        return {"error": f"Failed to check image quality: {str(e)}"}
+
+if __name__ == "__main__":
+    # Long-lived mode: one JSON request per line, one JSON response per line
+    if "--worker" in sys.argv[1:]:
+        run_worker(quality_request)
+        sys.exit(0)
+
+    # Offline mode: many images from a directory, manifest or JSONL stream
+    if "--batch" in sys.argv[1:]:
+        run_batch_cli(quality_request)
+        sys.exit(0)
+
+    try:
+        parsed = read_request()
+    except Exception as e:
+        print(json.dumps({"error": f"Failed to parse input: {str(e)}"}))
+        sys.exit(0)
+
+    print(json.dumps(run_instrumented(parsed, quality_request)))
@@ -0,0 +1,173 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+from instrumentation import append_metric
+
+# Memory budget of the in-process LRU, in megabytes of serialized results
+DEFAULT_CACHE_MB = float(os.environ.get('ANALYSIS_CACHE_MB', '64'))
+
+# Optional SQLite file that keeps results across restarts
+DEFAULT_CACHE_DB = os.environ.get('ANALYSIS_CACHE_DB') or None
+
+class ResultCache:
+    """
+    Bounded LRU of analysis results with an optional SQLite backing store.
+
+    Results are stored as JSON text, so every hit returns a fresh copy and
+    the memory budget is measured in serialized bytes. Lookups check memory
+    first, then disk; disk hits are promoted into memory.
+    """
+
+    def __init__(self, max_bytes, db_path=None):
+        self.max_bytes = max_bytes
+        self.db_path = db_path
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.counters = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        self.db = None
+
+        if db_path:
+            import sqlite3
+
+            self.db = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+            self.db.commit()
+
+    def _remember(self, key, text):
+        if key in self.entries:
+            self.size -= len(self.entries.pop(key))
+        if len(text) > self.max_bytes:
+            return
+        self.entries[key] = text
+        self.size += len(text)
+        while self.size > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted)
+            self.counters["evictions"] += 1
+
+    def get(self, key):
+        """
+        Look up a result.
+
+        Args:
+            key: Cache key from make_cache_key
+
+        Returns:
+            The cached result, or None on a miss
+        """
+        with self.lock:
+            text = self.entries.get(key)
+            if text is not None:
+                self.entries.move_to_end(key)
+                self.counters["hits"] += 1
+                return json.loads(text)
+
+            if self.db is not None:
+                row = self.db.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self._remember(key, row[0])
+                    self.counters["disk_hits"] += 1
+                    return json.loads(row[0])
+
+            self.counters["misses"] += 1
+            return None
+
+    def put(self, key, result):
+        """
+        Store a result in memory and, if configured, on disk.
+
+        Args:
+            key: Cache key from make_cache_key
+            result: JSON-serializable result
+        """
+        text = json.dumps(result)
+        with self.lock:
+            self._remember(key, text)
+            if self.db is not None:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO results (key, value) VALUES (?, ?)", (key, text)
+                )
+                self.db.commit()
+
+    def stats(self):
+        """
+        Report hit/miss counters and memory usage.
+
+        Returns:
+            Dictionary of counters
+        """
+        with self.lock:
+            return {
+                **self.counters,
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "disk": self.db_path,
+            }
+
+def make_cache_key(namespace, digest, params=None):
+    """
+    Build a cache key from an image digest, the algorithm and its parameters.
+
+    Args:
+        namespace: Algorithm name and version, e.g. "skintone:3"
+        digest: SHA-256 hex digest of the encoded image
+        params: Optional JSON-serializable parameters that affect the result
+
+    Returns:
+        Key string
+    """
+    params_text = json.dumps(params or {}, sort_keys=True)
+    params_hash = hashlib.sha256(params_text.encode()).hexdigest()[:16]
+    return f"{namespace}:{digest}:{params_hash}"
+
+def cached(namespace, digest, params, compute):
+    """
+    Return a cached result, computing and storing it on a miss.
+
+    Results containing an "error" entry are not stored.
+
+    Args:
+        namespace: Algorithm name and version
+        digest: SHA-256 hex digest of the encoded image, or None to bypass
+            the cache
+        params: Parameters that affect the result
+        compute: Zero-argument callable producing the result
+
+    Returns:
+        The result
+    """
+    if digest is None:
+        return compute()
+
+    cache = get_cache()
+    key = make_cache_key(namespace, digest, params)
+    result = cache.get(key)
+    append_metric("cache", {"namespace": namespace, "hit": result is not None})
+    if result is None:
+        result = compute()
+        if not (isinstance(result, dict) and "error" in result):
+            cache.put(key, result)
+    return result
+
+_cache = None
+
+def get_cache():
+    """
+    Return the process-wide result cache, configured from ANALYSIS_CACHE_MB
+    and ANALYSIS_CACHE_DB.
+
+    Returns:
+        ResultCache instance
+    """
+    global _cache
+    if _cache is None:
+        _cache = ResultCache(int(DEFAULT_CACHE_MB * 2**20), DEFAULT_CACHE_DB)
+    return _cache
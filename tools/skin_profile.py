@@ -0,0 +1,165 @@
+import numpy as np
+
+from skin_stats import SkinColorSummary
+
+# Version of the profile state; states of another version are rebuilt
+PROFILE_VERSION = 1
+
+# Total weight every image contributes to the merged summary, whatever its
+# number of skin pixels, so a close-up does not outvote a full-body shot
+IMAGE_WEIGHT = 10000.0
+
+# Spread (mean CIE76 distance of the image means to the profile mean) at
+# which the consistency term of the confidence has dropped to 1/e; about
+# twice the distance at which two skin tones look different side by side
+CONSISTENCY_SCALE = 10.0
+
+# Skin pixels per image above which an image counts as fully covered
+FULL_COVERAGE_PIXELS = 5000
+
+def empty_profile():
+    """
+    Profile state without any image.
+
+    Returns:
+        Dictionary with "version", "summary" (SkinColorSummary.to_dict)
+        and "images" (one record per merged image)
+    """
+    return {
+        "version": PROFILE_VERSION,
+        "summary": SkinColorSummary().to_dict(),
+        "images": [],
+    }
+
+def load_profile(state):
+    """
+    Validate a profile state passed back by a client.
+
+    Args:
+        state: Profile state from a previous update, or None
+
+    Returns:
+        Tuple of (SkinColorSummary, list of image records); empty when the
+        state is missing or of another version
+    """
+    if not state or state.get("version") != PROFILE_VERSION:
+        state = empty_profile()
+    return SkinColorSummary.from_dict(state["summary"]), list(state["images"])
+
+def image_record(digest, summary):
+    """
+    Per-image record kept in the profile state.
+
+    Args:
+        digest: SHA-256 of the encoded image, or None when unknown
+        summary: SkinColorSummary of the image's skin pixels
+
+    Returns:
+        Dictionary with "digest", "pixel_count", "lab_mean" and "lab_std"
+    """
+    stats = summary.lab_stats()
+    return {
+        "digest": digest,
+        "pixel_count": stats["pixel_count"],
+        "lab_mean": stats["mean"],
+        "lab_std": stats["std"],
+    }
+
+def add_image(profile_summary, records, digest, summary):
+    """
+    Merge one image into a profile.
+
+    Each image is merged with weight IMAGE_WEIGHT / pixels, so every photo
+    has the same say in the profile's colors and LAB moments. Images whose
+    digest is already in the profile are skipped, so re-sending a photo
+    does not tilt the profile towards it.
+
+    Args:
+        profile_summary: SkinColorSummary of the profile, updated in place
+        records: List of image records of the profile, updated in place
+        digest: SHA-256 of the encoded image, or None
+        summary: SkinColorSummary of the image's skin pixels
+
+    Returns:
+        True if the image was merged, False if it was a duplicate or had
+        no skin pixels
+    """
+    if digest is not None and any(r["digest"] == digest for r in records):
+        return False
+    if summary.n == 0:
+        return False
+
+    profile_summary.merge(summary, IMAGE_WEIGHT / summary.n)
+    records.append(image_record(digest, summary))
+    return True
+
+def profile_variance(profile_summary, records):
+    """
+    How much the skin color varies within and between the profile's images.
+
+    Args:
+        profile_summary: SkinColorSummary of the profile
+        records: List of image records
+
+    Returns:
+        Dictionary with "within_image" (mean per-image LAB variance),
+        "between_images" (LAB variance of the image means), "total"
+        (LAB variance of the merged summary) and "delta_e_spread" (mean
+        CIE76 distance of the image means to the profile mean)
+    """
+    if not records:
+        return {"within_image": [0.0] * 3, "between_images": [0.0] * 3,
+                "total": [0.0] * 3, "delta_e_spread": 0.0}
+
+    means = np.array([r["lab_mean"] for r in records], dtype=np.float64)
+    stds = np.array([r["lab_std"] for r in records], dtype=np.float64)
+    total = profile_summary.lab_m2 / profile_summary.n if profile_summary.n else np.zeros(3)
+    spread = np.linalg.norm(means - profile_summary.lab_mean, axis=1).mean()
+
+    return {
+        "within_image": [round(float(v), 3) for v in (stds ** 2).mean(axis=0)],
+        "between_images": [round(float(v), 3) for v in means.var(axis=0)],
+        "total": [round(float(v), 3) for v in total],
+        "delta_e_spread": round(float(spread), 3),
+    }
+
+def profile_confidence(records, variance):
+    """
+    Confidence in the profile's skin tone, between 0 and 1.
+
+    The product of three terms: the number of images (n / (n + 1), so one
+    photo gives at most 0.5), their agreement (exp(-spread /
+    CONSISTENCY_SCALE)) and their coverage (mean share of
+    FULL_COVERAGE_PIXELS skin pixels found, capped at 1 per image).
+
+    Args:
+        records: List of image records
+        variance: Output of profile_variance
+
+    Returns:
+        Float rounded to 3 decimals
+    """
+    n = len(records)
+    if n == 0:
+        return 0.0
+    images = n / (n + 1)
+    consistency = np.exp(-variance["delta_e_spread"] / CONSISTENCY_SCALE)
+    coverage = np.mean([min(1.0, r["pixel_count"] / FULL_COVERAGE_PIXELS) for r in records])
+    return round(float(images * consistency * coverage), 3)
+
+def dump_profile(profile_summary, records):
+    """
+    Profile state to hand back to the client for the next update.
+
+    Args:
+        profile_summary: SkinColorSummary of the profile
+        records: List of image records
+
+    Returns:
+        Dictionary accepted by load_profile
+    """
+    return {
+        "version": PROFILE_VERSION,
+        "summary": profile_summary.to_dict(),
+        "images": records,
+    }
@@ -0,0 +1,206 @@
+import os
+import numpy as np
+
+from tone_arrays import rgb_to_lab_array
+
+# Bins per channel of the color summary (32 -> 32^3 bins of 8 levels)
+SUMMARY_BINS = 32
+
+# Pixels of a region masked at a time in streaming mode (whole rows)
+TILE_PIXELS = int(os.environ.get('SKIN_TILE_PIXELS', str(256 * 1024)))
+
+# Pixels converted to LAB at a time; the conversion needs ~100 bytes per pixel
+LAB_CHUNK = 65536
+
+# Rows added around each tile so the skin mask's 3x3 opening and closing
+# (four passes of radius 1) give the same result as on the whole region
+TILE_HALO = 4
+
+class SkinColorSummary:
+    """
+    Fixed-size summary of a stream of skin pixels.
+
+    Pixels are counted into a SUMMARY_BINS^3 color histogram that also
+    keeps the sum of the pixels falling into each bin, so the exact mean
+    color of every bin is known. Running LAB moments (count, mean and sum
+    of squared deviations, merged with Chan's parallel update) are kept
+    alongside. Memory is about 1 MB whatever the number of pixels, and
+    summaries can be updated one region or tile at a time.
+
+    Summaries can also be merged with a weight (e.g. to give every photo
+    of a person the same say in a profile) and stored as sparse JSON.
+    `n` is the total weight, `pixels` the number of pixels actually seen.
+    """
+
+    def __init__(self, bins=SUMMARY_BINS):
+        self.bins = bins
+        self.shift = int(np.log2(256 // bins))
+        self.counts = np.zeros(bins ** 3, dtype=np.float64)
+        self.sums = np.zeros((bins ** 3, 3), dtype=np.float64)
+        self.n = 0
+        self.pixels = 0
+        self.lab_mean = np.zeros(3)
+        self.lab_m2 = np.zeros(3)
+
+    def update(self, pixels, weight=1):
+        """
+        Add a batch of pixels.
+
+        Args:
+            pixels: (N, 3) array of 8-bit RGB pixels
+            weight: Weight of each pixel; a weight of 2 counts like adding
+                the batch twice
+        """
+        pixels = np.asarray(pixels).reshape(-1, 3)
+        if len(pixels) == 0:
+            return
+
+        q = (pixels.astype(np.uint8) >> self.shift).astype(np.intp)
+        flat = (q[:, 0] * self.bins + q[:, 1]) * self.bins + q[:, 2]
+        size = self.bins ** 3
+        self.counts += np.bincount(flat, minlength=size) * weight
+        for c in range(3):
+            self.sums[:, c] += np.bincount(flat, weights=pixels[:, c], minlength=size) * weight
+
+        self.pixels += len(pixels)
+        for start in range(0, len(pixels), LAB_CHUNK):
+            lab = rgb_to_lab_array(pixels[start:start + LAB_CHUNK])
+            mean = lab.mean(axis=0)
+            self._merge_moments(len(lab) * weight, mean, ((lab - mean) ** 2).sum(axis=0) * weight)
+
+    def _merge_moments(self, n, mean, m2):
+        if n <= 0:
+            return
+        total = self.n + n
+        delta = mean - self.lab_mean
+        self.lab_mean = self.lab_mean + delta * n / total
+        self.lab_m2 = self.lab_m2 + m2 + delta ** 2 * self.n * n / total
+        self.n = total
+
+    def merge(self, other, weight=1.0):
+        """
+        Add another summary, scaling its pixels by weight.
+
+        Args:
+            other: SkinColorSummary with the same number of bins
+            weight: Weight of each of the other summary's pixels
+        """
+        if other.bins != self.bins:
+            raise ValueError(f"Cannot merge summaries of {other.bins} and {self.bins} bins")
+        self.counts += other.counts * weight
+        self.sums += other.sums * weight
+        self.pixels += other.pixels
+        self._merge_moments(other.n * weight, other.lab_mean, other.lab_m2 * weight)
+
+    def to_dict(self):
+        """
+        Sparse JSON-serializable form: only non-empty bins are listed.
+
+        Returns:
+            Dictionary accepted by from_dict
+        """
+        occupied = np.flatnonzero(self.counts)
+        return {
+            "bins": self.bins,
+            "indices": occupied.tolist(),
+            "counts": self.counts[occupied].tolist(),
+            "sums": self.sums[occupied].tolist(),
+            "n": float(self.n),
+            "pixels": int(self.pixels),
+            "lab_mean": self.lab_mean.tolist(),
+            "lab_m2": self.lab_m2.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Rebuild a summary from to_dict output.
+
+        Args:
+            data: Dictionary from to_dict
+
+        Returns:
+            SkinColorSummary
+        """
+        summary = cls(data["bins"])
+        indices = np.asarray(data["indices"], dtype=np.intp)
+        summary.counts[indices] = data["counts"]
+        summary.sums[indices] = np.asarray(data["sums"], dtype=np.float64).reshape(-1, 3)
+        summary.n = data["n"]
+        summary.pixels = data["pixels"]
+        summary.lab_mean = np.asarray(data["lab_mean"], dtype=np.float64)
+        summary.lab_m2 = np.asarray(data["lab_m2"], dtype=np.float64)
+        return summary
+
+    def lab_stats(self):
+        """
+        LAB mean and standard deviation of every pixel seen.
+
+        Returns:
+            Dictionary with "pixel_count", "mean" and "std" ([L, a, b])
+        """
+        std = np.sqrt(self.lab_m2 / self.n) if self.n else np.zeros(3)
+        return {
+            "pixel_count": int(self.pixels),
+            "mean": [round(float(v), 3) for v in self.lab_mean],
+            "std": [round(float(v), 3) for v in std],
+        }
+
+    def bin_colors(self):
+        """
+        Mean color and pixel count of every non-empty bin.
+
+        Returns:
+            Tuple of ((k, 3) float64 colors, (k,) float64 counts)
+        """
+        occupied = np.flatnonzero(self.counts)
+        counts = self.counts[occupied]
+        return self.sums[occupied] / counts[:, None], counts
+
+    def dominant_colors(self, n_colors=3):
+        """
+        Dominant colors of the summarized pixels.
+
+        KMeans runs on the bin means weighted by their pixel counts, which
+        is KMeans over every pixel with each pixel moved to the mean of its
+        8x8x8 bin: a few thousand weighted points instead of one per pixel.
+
+        Args:
+            n_colors: Number of clusters
+
+        Returns:
+            List of (r, g, b) tuples, most frequent first
+        """
+        from sklearn.cluster import KMeans
+        from color_engines import _sorted_colors
+
+        colors, counts = self.bin_colors()
+        if len(colors) == 0:
+            return [(0, 0, 0)]
+        n_colors = min(n_colors, len(colors))
+
+        kmeans = KMeans(n_clusters=n_colors, random_state=42, n_init=10)
+        labels = kmeans.fit_predict(colors, sample_weight=counts)
+        weights = np.bincount(labels, weights=counts, minlength=n_colors)
+        return _sorted_colors(kmeans.cluster_centers_, weights)
+
+def iter_region_tiles(region, tile_pixels=TILE_PIXELS, halo=TILE_HALO):
+    """
+    Split a region into horizontal tiles with a halo of extra rows.
+
+    Args:
+        region: (x, y, w, h) tuple
+        tile_pixels: Approximate pixels per tile, rounded to whole rows
+        halo: Extra rows of the region masked above and below each tile
+
+    Yields:
+        ((x, y0, w, h0) tile with halo, (top, bottom) rows of the tile's own
+        part within it)
+    """
+    x, y, w, h = region
+    tile_rows = max(1, tile_pixels // max(w, 1))
+    for start in range(y, y + h, tile_rows):
+        stop = min(start + tile_rows, y + h)
+        y0 = max(y, start - halo)
+        y1 = min(y + h, stop + halo)
+        yield (x, y0, w, y1 - y0), (start - y0, stop - y0)
@@ -1,112 +1,64 @@
-import cv2
 import numpy as np
-from sklearn.cluster import KMeans
-import requests
-import base64
 import json
 import os
 import sys
-from PIL import Image
-import io
 import colorsys
 
-def extract_skin_regions_using_yolo(image, keypoints):
-    """
-    Extract skin regions based on YOLO keypoints.
-    This function uses body keypoints to identify face and exposed skin areas.
-    
-    Args:
-        image: RGB image array
-        keypoints: YOLO keypoints dictionary
-    
-    Returns:
-        List of regions (x, y, w, h) containing skin
-    """
-    regions = []
-    
-    # Extract face region based on keypoints
-    if 'keypoints' not in keypoints:
-        return regions
-    
-    kp = keypoints['keypoints']
-    
-    # Extract face region if nose and eyes are detected
-    face_keypoints = []
-    for point_name in ['nose', 'left_eye', 'right_eye', 'left_ear', 'right_ear']:
-        if point_name in kp:
-            face_keypoints.append(kp[point_name])
-    
-    if len(face_keypoints) >= 3:  # At least nose and eyes
-        x_coords = [p[0] for p in face_keypoints]
-        y_coords = [p[1] for p in face_keypoints]
-        
-        # Calculate bounding box with some margin
-        min_x, max_x = min(x_coords), max(x_coords)
-        min_y, max_y = min(y_coords), max(y_coords)
-        
-        # Add margins
-        width = max_x - min_x
-        height = max_y - min_y
-        
-        # Expanded face region
-        face_x = max(0, int(min_x - width * 0.3))
-        face_y = max(0, int(min_y - height * 0.3))
-        face_w = int(width * 1.6)
-        face_h = int(height * 1.8)
-        
-        # Make sure we don't exceed image dimensions
-        h, w = image.shape[:2]
-        face_w = min(face_w, w - face_x)
-        face_h = min(face_h, h - face_y)
-        
-        regions.append((face_x, face_y, face_w, face_h))
-    
-    # Additionally, extract forearm areas if available
-    arm_keypoints = []
-    for point_name in ['left_wrist', 'right_wrist', 'left_elbow', 'right_elbow']:
-        if point_name in kp:
-            arm_keypoints.append(kp[point_name])
-    
-    # Process arm regions if enough keypoints are available
-    if len(arm_keypoints) >= 2:
-        for i in range(len(arm_keypoints) - 1):
-            x1, y1 = arm_keypoints[i]
-            x2, y2 = arm_keypoints[i+1]
-            
-            min_x, max_x = min(x1, x2), max(x1, x2)
-            min_y, max_y = min(y1, y2), max(y1, y2)
-            
-            # Add margins
-            width = max(max_x - min_x, 30)
-            height = max(max_y - min_y, 30)
-            
-            arm_x = max(0, int(min_x - width * 0.2))
-            arm_y = max(0, int(min_y - height * 0.2))
-            arm_w = int(width * 1.4)
-            arm_h = int(height * 1.4)
-            
-            # Check bounds
-            h, w = image.shape[:2]
-            arm_w = min(arm_w, w - arm_x)
-            arm_h = min(arm_h, h - arm_y)
-            
-            regions.append((arm_x, arm_y, arm_w, arm_h))
-    
-    return regions
+from worker import run_worker, read_request
+from batch import run_batch_cli
+from color_engines import COLOR_ENGINES, DEFAULT_COLOR_METHOD
+from tone_arrays import classify_colors
+from image_io import (
+    DEFAULT_MAX_EDGE,
+    decode_base64,
+    decode_image_buffer,
+    lazy_analysis_image,
+    request_digest,
+)
+from result_cache import cached
+from instrumentation import stage, record_metric, append_metric, run_instrumented
+from landmarks import MEDIAPIPE_KEYPOINT_NAMES, landmarks_to_keypoints, parse_landmarks
+from skin_regions import extract_skin_rois, merge_overlapping_boxes
+from skin_stats import SkinColorSummary, iter_region_tiles
+from skin_profile import (
+    add_image,
+    dump_profile,
+    load_profile,
+    profile_confidence,
+    profile_variance,
+)
 
-def remove_non_skin_regions(image, region):
+# Cache namespace of skin tone results; bump the version when detection changes
+SKINTONE_CACHE_NAMESPACE = "skintone:4"
+
+# Cache namespace of per-image skin summaries used by profile requests
+SKIN_SUMMARY_CACHE_NAMESPACE = "skinsummary:2"
+
+# Summarize skin pixels region by region / tile by tile instead of
+# gathering them all (see detect_skin_tone_from_image)
+DEFAULT_STREAMING = os.environ.get('SKIN_STREAMING', '0') == '1'
+
+# Regions with fewer color-matched skin pixels use the permissive mask
+MIN_SKIN_MASK_PIXELS = 100
+
+# Weight of the skin pixels of each region kind in the dominant colors;
+# kinds not listed weigh 1. A pixel inside several regions takes the
+# largest weight. The fallback face box overlaps the center box, which
+# used to count its pixels twice: that weighting is kept explicitly, so a
+# skin-colored background around a face does not outweigh the face
+REGION_WEIGHTS = {"upper_center": 2}
+
+def skin_color_mask(roi):
     """
-    Attempt to filter out non-skin pixels from the region using multiple color spaces.
+    Color-space skin mask of an image area, without the permissive fallback.
     
     Args:
-        image: RGB image array
-        region: (x, y, w, h) tuple
+        roi: RGB image array (or view)
     
     Returns:
-        Filtered image with likely skin pixels
+        uint8 mask of the same height and width, 255 for likely skin pixels
     """
-    x, y, w, h = region
-    roi = image[y:y+h, x:x+w].copy()
+    import cv2
     
     # Convert to HSV color space for better skin detection
     hsv = cv2.cvtColor(roi, cv2.COLOR_RGB2HSV)
@@ -133,30 +85,150 @@ def remove_non_skin_regions(image, region):
     kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
     mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
     mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
+    return mask
+
+def permissive_skin_mask(roi):
+    """
+    Fallback mask that only removes very dark pixels.
+    
+    Args:
+        roi: RGB image array (or view)
+    
+    Returns:
+        Boolean mask of the same height and width
+    """
+    import cv2
+    
+    gray = cv2.cvtColor(roi, cv2.COLOR_RGB2GRAY)
+    return gray > 30
+
+def skin_mask(image, region):
+    """
+    Compute which pixels of a region are likely skin, using multiple color spaces.
+    
+    Args:
+        image: RGB image array
+        region: (x, y, w, h) tuple
     
-    # Apply mask to original region
-    skin = cv2.bitwise_and(roi, roi, mask=mask)
+    Returns:
+        Boolean mask of shape (h, w), True for likely skin pixels
+    """
+    x, y, w, h = region
+    # A view into the image; OpenCV reads it in place through its row stride
+    roi = image[y:y+h, x:x+w]
+    
+    mask = skin_color_mask(roi)
     
     # If we have very few skin pixels, use a more permissive approach as fallback
-    if np.count_nonzero(mask) < 100:
+    if np.count_nonzero(mask) < MIN_SKIN_MASK_PIXELS:
         # Just use the original ROI with minimal filtering
-        gray = cv2.cvtColor(roi, cv2.COLOR_RGB2GRAY)
-        _, mask = cv2.threshold(gray, 30, 255, cv2.THRESH_BINARY)  # Remove very dark pixels
-        skin = cv2.bitwise_and(roi, roi, mask=mask)
+        return permissive_skin_mask(roi)
     
-    return skin
+    return mask > 0
 
-def get_dominant_colors(image, n_colors=3):
+class SharedSkinMask:
+    """
+    Skin masks of many regions of one image, computed from shared planes.
+    
+    Overlapping regions are grouped into blocks (see
+    skin_regions.merge_overlapping_boxes) and the HSV/YCrCb mask, with its
+    morphology, is computed once per block. Each region's mask is then a
+    view into its block, so the conversion work follows the area the
+    regions cover rather than the sum of their areas. The grayscale plane
+    of the permissive fallback is only computed for blocks that need it.
+    
+    The morphology runs over the whole block rather than each region's
+    crop, so within 2 px of a region's border (the reach of the 3x3 open
+    and close) a pixel can be classified differently than skin_mask would
+    classify it; elsewhere the selection is the same. On a 1024 px image's
+    fallback boxes this is 7-14 pixels per region.
+    
+    With tiled=True each block's masks are computed a tile of rows at a
+    time (skin_stats.iter_region_tiles, whose halo makes the result
+    identical), so only one tile's color planes are alive at a time and
+    the masks themselves, one byte per pixel, are all that is kept.
+    
+    Args:
+        image: RGB image array
+        regions: List of (x, y, w, h) tuples that will be asked for
+        tiled: Compute the masks tile by tile to bound memory
+    """
+    
+    def __init__(self, image, regions, tiled=False):
+        self.image = image
+        self.tiled = tiled
+        self.blocks = merge_overlapping_boxes(regions)
+        self.color_masks = []
+        self.bright_masks = [None] * len(self.blocks)
+        for block in self.blocks:
+            self.color_masks.append(self._block_mask(block, lambda roi: skin_color_mask(roi) > 0))
+        record_metric("masked_pixels", int(sum(w * h for _, _, w, h in self.blocks)))
+    
+    def _block_mask(self, block, compute):
+        """
+        Boolean mask of a block, whole or one tile of rows at a time.
+        """
+        x, y, w, h = block
+        if not self.tiled:
+            return compute(self.image[y:y+h, x:x+w])
+        mask = np.empty((h, w), dtype=bool)
+        for (tx, ty, tw, th), (top, bottom) in iter_region_tiles(block):
+            mask[ty - y + top:ty - y + bottom] = compute(self.image[ty:ty+th, tx:tx+tw])[top:bottom]
+        return mask
+    
+    def locate(self, region):
+        """
+        Block holding a region, and the region's slices within it.
+        
+        Args:
+            region: (x, y, w, h) tuple passed to the constructor
+        
+        Returns:
+            Tuple of (block index, (row slice, column slice))
+        """
+        x, y, w, h = region
+        for index, (bx, by, bw, bh) in enumerate(self.blocks):
+            if bx <= x and by <= y and x + w <= bx + bw and y + h <= by + bh:
+                return index, (slice(y - by, y - by + h), slice(x - bx, x - bx + w))
+        raise ValueError(f"Region {region} is not covered by the shared mask")
+    
+    def region_mask(self, region):
+        """
+        Selection of skin_mask(image, region) away from the region's border,
+        as a read-only view (see the class docstring).
+        
+        Args:
+            region: (x, y, w, h) tuple passed to the constructor
+        
+        Returns:
+            Boolean (h, w) view into the shared planes; copy before changing it
+        """
+        index, window = self.locate(region)
+        mask = self.color_masks[index][window]
+        if np.count_nonzero(mask) >= MIN_SKIN_MASK_PIXELS:
+            return mask
+        
+        # Too few color-matched pixels: same permissive fallback as skin_mask
+        if self.bright_masks[index] is None:
+            self.bright_masks[index] = self._block_mask(self.blocks[index], permissive_skin_mask)
+        return self.bright_masks[index][window]
+
+def get_dominant_colors(image, n_colors=3, method=None):
     """
     Extract dominant colors from an image.
     
     Args:
         image: RGB image array
         n_colors: Number of dominant colors to extract
+        method: Dominant color backend from color_engines.COLOR_ENGINES
+            ('kmeans', 'subsample', 'minibatch' or 'histogram'); defaults to
+            DOMINANT_COLOR_METHOD
     
     Returns:
         List of (r, g, b) tuples of dominant colors
     """
+    engine = COLOR_ENGINES[method or DEFAULT_COLOR_METHOD]
+    
     pixels = image.reshape(-1, 3)
     
     # Filter out black pixels (likely background)
@@ -169,18 +241,7 @@ def get_dominant_colors(image, n_colors=3):
     if len(pixels) < n_colors:
         n_colors = max(1, len(pixels) // 2)
     
-    kmeans = KMeans(n_clusters=n_colors, random_state=42, n_init=10)
-    kmeans.fit(pixels)
-    
-    colors = kmeans.cluster_centers_
-    
-    labels = kmeans.labels_
-    counts = np.bincount(labels)
-    
-    colors_with_counts = [(colors[i], counts[i]) for i in range(len(counts))]
-    colors_with_counts.sort(key=lambda x: x[1], reverse=True)
-    
-    return [(int(c[0]), int(c[1]), int(c[2])) for c, _ in colors_with_counts]
+    return engine(pixels, n_colors)
 
 def classify_undertone(rgb_color):
     """
@@ -349,60 +410,278 @@ def classify_monk_skin_tone(rgb_color):
     else:
         return f"Darkest (Monk Scale 10) with {undertone} undertones", 10
 
-def detect_skin_tone_from_image(image, keypoints=None):
+def describe_skin_colors(dominant_colors):
     """
-    Detect skin tone from an image using YOLO keypoints or fallback to whole image analysis.
+    Classify dominant skin colors into the skin tone result.
     
     Args:
-        image: RGB image array
-        keypoints: Optional dictionary of YOLO keypoints
+        dominant_colors: List of (r, g, b) tuples, main color first
     
     Returns:
-        Dictionary with skin tone information
+        Dictionary with the dominant colors, Fitzpatrick and Monk classes
+        and undertones
     """
-    if keypoints is None:
-        keypoints = {"keypoints": {}}
+    return describe_skin_color_sets([dominant_colors])[0]
+
+def describe_skin_color_sets(color_sets):
+    """
+    Classify several lists of dominant skin colors with one classification pass.
     
-    skin_regions = extract_skin_regions_using_yolo(image, keypoints)
+    Args:
+        color_sets: List of dominant color lists (see describe_skin_colors)
     
-    # If no regions detected or very few keypoints, use multiple fallback regions
-    if not skin_regions or len(keypoints.get("keypoints", {})) < 3:
-        h, w = image.shape[:2]
+    Returns:
+        List of skin tone dictionaries, one per color list
+    """
+    # Classify every dominant color of every set at once; the first row
+    # of each set is its main color
+    with stage("classification"):
+        classes = classify_colors([color for colors in color_sets for color in colors[:3]])
+    
+    results = []
+    start = 0
+    for dominant_colors in color_sets:
+        rows = range(start, start + len(dominant_colors[:3]))
+        start = rows.stop
+        main = rows.start
+        
+        # Analyze each dominant color for more comprehensive results
+        undertone_analysis = [
+            {"color_rgb": color, "undertone": str(classes["undertone"][row])}
+            for color, row in zip(dominant_colors[:3], rows)
+        ]
+        
+        results.append({
+            "dominant_colors": dominant_colors,
+            "main_color_rgb": dominant_colors[0],
+            "fitzpatrick_classification": str(classes["fitzpatrick_classification"][main]),
+            "fitzpatrick_value": int(classes["fitzpatrick_value"][main]),
+            "monk_classification": str(classes["monk_classification"][main]),
+            "monk_value": int(classes["monk_value"][main]),
+            "undertone": str(classes["undertone"][main]),
+            "undertone_analysis": undertone_analysis
+        })
+    return results
+
+def build_skin_rois(image, keypoints, bounds=None):
+    """
+    Regions to look for skin in: pose ROIs, or fixed boxes without them.
+    
+    Args:
+        image: RGB image array
+        keypoints: Keypoints dictionary
+        bounds: Optional (x, y, w, h) box the fixed boxes are placed in,
+            e.g. one person's bounding box; defaults to the whole image
+    
+    Returns:
+        List of (kind, (x, y, w, h), shape_mask or None) tuples
+    """
+    with stage("regions"):
+        rois = extract_skin_rois(image.shape, keypoints)
+    
+    # Without usable keypoints, use multiple fallback regions
+    if not rois:
+        x, y, w, h = bounds if bounds is not None else (0, 0, image.shape[1], image.shape[0])
         
         # Add multiple regions to increase chances of finding skin
         # Center region
-        center_x = w // 4
-        center_y = h // 4
+        center_x = x + w // 4
+        center_y = y + h // 4
         center_w = w // 2
         center_h = h // 2
-        skin_regions.append((center_x, center_y, center_w, center_h))
+        rois.append(("center", (center_x, center_y, center_w, center_h), None))
         
         # Face region (upper center of the image)
-        face_x = w // 3
-        face_y = h // 6
+        face_x = x + w // 3
+        face_y = y + h // 6
         face_w = w // 3
         face_h = h // 3
-        skin_regions.append((face_x, face_y, face_w, face_h))
+        rois.append(("upper_center", (face_x, face_y, face_w, face_h), None))
+    
+    return rois
+
+def select_region_pixels(planes, rois):
+    """
+    Weight of every pixel of the regions, per block of the shared masks.
+    
+    Regions are marked on one selection per block, so a pixel inside
+    several regions (the fallback boxes, a face oval and a raised forearm)
+    is selected once, with the largest REGION_WEIGHTS weight among them.
+    
+    Args:
+        planes: SharedSkinMask covering every region
+        rois: List of (kind, region, shape_mask) tuples from build_skin_rois
+    
+    Returns:
+        Dictionary mapping block indices to uint8 (h, w) weights, 0 for
+        pixels that are not selected
+    """
+    selected = {}
+    for kind, region, shape in rois:
+        index, window = planes.locate(region)
+        mask = planes.region_mask(region)
+        if shape is not None:
+            # Only the face oval / forearm band inside the box counts
+            mask = mask & shape
+        
+        if index not in selected:
+            selected[index] = np.zeros(planes.color_masks[index].shape, dtype=np.uint8)
+        weights = selected[index][window]
+        np.maximum(weights, mask.view(np.uint8) * REGION_WEIGHTS.get(kind, 1), out=weights)
         
-        # If still no regions, use the entire image as last resort
-        if not skin_regions:
-            skin_regions = [(0, 0, w, h)]
+        append_metric("regions", {
+            "kind": kind,
+            "region": [int(v) for v in region],
+            "pixels": int(mask.size if shape is None else np.count_nonzero(shape)),
+            "skin_pixels": int(np.count_nonzero(mask)),
+        })
+    return selected
+
+def collect_skin_summary(image, rois):
+    """
+    Summarize the skin pixels of every region without gathering them.
     
-    all_skin_pixels = []
+    Selects the same pixels, with the same weights, as collect_region_pixels,
+    from masks computed tile by tile; pixels are then added to the summary
+    one tile of rows at a time. On a 12 MP image analyzed at full
+    resolution without keypoints (skin in 80% of it) peak traced memory of
+    skin detection is 28 MB instead of 476 MB, and it takes 1.1 s instead
+    of 41 s with the reference KMeans backend; the selection masks, one
+    byte per pixel of the regions, are most of those 28 MB.
     
-    # Process each region to find skin pixels
-    for region in skin_regions:
-        skin_image = remove_non_skin_regions(image, region)
+    Args:
+        image: RGB image array
+        rois: List of (kind, region, shape_mask) tuples from build_skin_rois
+    
+    Returns:
+        skin_stats.SkinColorSummary
+    """
+    summary = SkinColorSummary()
+    with stage("masking"):
+        planes = SharedSkinMask(image, [region for _, region, _ in rois], tiled=True)
+        selected = select_region_pixels(planes, rois)
+        for index, weights in sorted(selected.items()):
+            block = planes.blocks[index]
+            x, y = block[:2]
+            for (tx, ty, tw, th), _ in iter_region_tiles(block, halo=0):
+                tile = image[ty:ty+th, tx:tx+tw]
+                tile_weights = weights[ty - y:ty - y + th]
+                for weight in np.unique(tile_weights[tile_weights > 0]):
+                    summary.update(tile[tile_weights == weight], weight=int(weight))
+    
+    if summary.n == 0:
+        print("No skin pixels detected with normal filtering, using fallback method", file=sys.stderr)
+        h, w = image.shape[:2]
         
-        # Extract non-black pixels (potential skin)
-        non_black = skin_image[np.where((skin_image != [0,0,0]).all(axis=2))]
+        # Sample the center quarter of the image, keeping pixels of
+        # moderate brightness, or every pixel if none qualifies
+        center = (w // 4, h // 4, w // 2, h // 2)
+        for keep_all in (False, True):
+            for (tx, ty, tw, th), _ in iter_region_tiles(center, halo=0):
+                tile = image[ty:ty+th, tx:tx+tw]
+                if keep_all:
+                    summary.update(tile.reshape(-1, 3))
+                else:
+                    brightness = tile.sum(axis=2, dtype=np.uint16)
+                    summary.update(tile[(brightness > 150) & (brightness < 700)])
+            if summary.n:
+                break
+    
+    return summary
+
+def collect_region_pixels(image, rois, planes=None):
+    """
+    Gather the skin pixels of every region, each pixel at most once.
+    
+    Pixels of a region kind weighted in REGION_WEIGHTS are repeated that
+    many times, so the dominant color backends see the weighting.
+    
+    Args:
+        image: RGB image array
+        rois: List of (kind, region, shape_mask) tuples from build_skin_rois
+        planes: Optional SharedSkinMask covering every region, e.g. one
+            built for several people of the image; built here by default
+    
+    Returns:
+        (N, 3) array of skin pixels
+    """
+    # Pixels are selected through the boolean skin mask rather than by
+    # dropping zero-valued colors, so skin with a zero channel is kept,
+    # and each block is gathered once, without per-region copies
+    with stage("masking"):
+        if planes is None:
+            planes = SharedSkinMask(image, [region for _, region, _ in rois])
+        selected = select_region_pixels(planes, rois)
+    
+    # Boolean indexing of an (h, w, 3) view is several times slower than
+    # taking the selected rows of the flattened image by index
+    region_pixels = []
+    for index, weights in sorted(selected.items()):
+        x, y, w, h = planes.blocks[index]
+        for level in range(1, int(weights.max()) + 1):
+            mask = weights >= level
+            if image.flags.c_contiguous:
+                offsets = np.flatnonzero(mask)
+                rows = (offsets // w + y) * image.shape[1] + offsets % w + x
+                region_pixels.append(np.take(image.reshape(-1, 3), rows, axis=0))
+            else:
+                region_pixels.append(image[y:y+h, x:x+w][mask])
+    
+    if region_pixels:
+        return np.concatenate(region_pixels)
+    return np.empty((0, 3), dtype=image.dtype)
+
+def detect_skin_tone_from_image(image, keypoints=None, color_method=None, streaming=None):
+    """
+    Detect skin tone from an image using pose keypoints or fallback to whole image analysis.
+    
+    With keypoints, skin is only looked for inside precise regions of
+    interest (a face oval and elbow-wrist bands, see
+    skin_regions.extract_skin_rois); fixed boxes in the middle of the image
+    are only used when no such region can be built.
+    
+    Args:
+        image: RGB image array
+        keypoints: Optional dictionary of pose keypoints (YOLO or MediaPipe names)
+        color_method: Optional dominant color backend (see get_dominant_colors)
+        streaming: Summarize skin pixels into a fixed-size color histogram
+            with running LAB moments (skin_stats.SkinColorSummary), one
+            region tile at a time, instead of gathering every skin pixel.
+            Memory then stays bounded whatever the image size; dominant
+            colors come from the summary (color_method is not used) and
+            the result gains "lab_stats". Defaults to SKIN_STREAMING.
+    
+    Returns:
+        Dictionary with skin tone information
+    """
+    if keypoints is None:
+        keypoints = {"keypoints": {}}
+    
+    rois = build_skin_rois(image, keypoints)
+    
+    if DEFAULT_STREAMING if streaming is None else streaming:
+        summary = collect_skin_summary(image, rois)
+        record_metric("skin_pixels", summary.n)
+        if summary.n == 0:
+            return {"error": "No skin pixels detected after all filtering attempts"}
         
-        if len(non_black) > 0:
-            all_skin_pixels.extend(non_black)
+        try:
+            with stage("clustering"):
+                dominant_colors = summary.dominant_colors(n_colors=min(3, summary.n // 100 + 1))
+            result = describe_skin_colors(dominant_colors)
+            result["lab_stats"] = summary.lab_stats()
+            return result
+        except Exception as e:
+            return {
+                "error": f"Error in color analysis: {str(e)}",
+                "pixel_count": summary.n,
+            }
+    
+    all_skin_pixels = collect_region_pixels(image, rois)
     
     # If still no skin pixels, use a more aggressive approach
-    if not all_skin_pixels:
-        print("No skin pixels detected with normal filtering, using fallback method")
+    if len(all_skin_pixels) == 0:
+        print("No skin pixels detected with normal filtering, using fallback method", file=sys.stderr)
         # Use a more permissive approach: sample center regions directly
         h, w = image.shape[:2]
         
@@ -415,53 +694,31 @@ def detect_skin_tone_from_image(image, keypoints=None):
         center_region = image[center_y:center_y+center_h, center_x:center_x+center_w]
         
         # Simple filtering: remove very dark and very light pixels
-        center_pixels = center_region.reshape(-1, 3)
-        brightness = np.sum(center_pixels, axis=1)
+        brightness = center_region.sum(axis=2, dtype=np.uint16)
         
         # Keep pixels with reasonable brightness (not too dark, not too bright)
-        moderate_brightness = center_pixels[(brightness > 150) & (brightness < 700)]
+        moderate = (brightness > 150) & (brightness < 700)
         
-        if len(moderate_brightness) > 0:
-            all_skin_pixels = moderate_brightness
+        if moderate.any():
+            all_skin_pixels = center_region[moderate]
         else:
             # Last resort: just use central pixels
-            all_skin_pixels = center_pixels
+            all_skin_pixels = center_region.reshape(-1, 3)
     
-    if not all_skin_pixels:
+    record_metric("skin_pixels", len(all_skin_pixels))
+    if len(all_skin_pixels) == 0:
         return {"error": "No skin pixels detected after all filtering attempts"}
     
-    all_skin_pixels = np.array(all_skin_pixels)
-    
     # Get dominant colors from the skin pixels
     try:
-        dominant_colors = get_dominant_colors(all_skin_pixels, n_colors=min(3, len(all_skin_pixels) // 100 + 1))
-        
-        main_color = dominant_colors[0]
-        fitzpatrick_result, fitzpatrick_value = classify_skin_tone(main_color)
-        monk_result, monk_value = classify_monk_skin_tone(main_color)
+        with stage("clustering"):
+            dominant_colors = get_dominant_colors(
+                all_skin_pixels,
+                n_colors=min(3, len(all_skin_pixels) // 100 + 1),
+                method=color_method,
+            )
         
-        # Add standalone undertone classification
-        undertone = classify_undertone(main_color)
-        
-        # Analyze each dominant color for more comprehensive results
-        undertone_analysis = []
-        for color in dominant_colors[:3]:  # Analyze up to 3 dominant colors
-            if len(undertone_analysis) < 3:  # Limit to 3 results
-                undertone_analysis.append({
-                    "color_rgb": color,
-                    "undertone": classify_undertone(color)
-                })
-        
-        return {
-            "dominant_colors": dominant_colors,
-            "main_color_rgb": main_color,
-            "fitzpatrick_classification": fitzpatrick_result,
-            "fitzpatrick_value": fitzpatrick_value,
-            "monk_classification": monk_result,
-            "monk_value": monk_value,
-            "undertone": undertone,
-            "undertone_analysis": undertone_analysis
-        }
+        return describe_skin_colors(dominant_colors)
     except Exception as e:
         return {
             "error": f"Error in color analysis: {str(e)}",
@@ -469,6 +726,56 @@ def detect_skin_tone_from_image(image, keypoints=None):
             "sample_colors": all_skin_pixels[:5].tolist() if len(all_skin_pixels) >= 5 else all_skin_pixels.tolist()
         }
 
+def detect_skin_tones_for_people(image, people, color_method=None):
+    """
+    Detect the skin tone of every person in an image in one pass.
+    
+    The image is decoded and masked once: the ROIs of all people share one
+    SharedSkinMask, each person's pixels are clustered on their
+    own, and the dominant colors of everyone are classified together. A
+    person whose keypoints give no ROI is searched within their own
+    bounding box, never elsewhere in the image.
+    
+    Args:
+        image: RGB image array
+        people: List of (keypoints, bbox) tuples, bbox being an
+            (x, y, w, h) box in image coordinates or None
+        color_method: Optional dominant color backend (see get_dominant_colors)
+    
+    Returns:
+        List with one skin tone dictionary (or "error" entry) per person
+    """
+    person_rois = [build_skin_rois(image, keypoints, bounds=bbox) for keypoints, bbox in people]
+    
+    # One set of color planes for everyone; pixels are only deduplicated
+    # within a person, so people standing close still get their own skin
+    planes = SharedSkinMask(image, [region for rois in person_rois for _, region, _ in rois])
+    person_pixels = [collect_region_pixels(image, rois, planes) for rois in person_rois]
+    record_metric("skin_pixels", [len(pixels) for pixels in person_pixels])
+    
+    results = [None] * len(people)
+    color_sets = []
+    for index, pixels in enumerate(person_pixels):
+        if len(pixels) == 0:
+            results[index] = {"error": "No skin pixels detected for this person"}
+            continue
+        try:
+            with stage("clustering"):
+                dominant_colors = get_dominant_colors(
+                    pixels,
+                    n_colors=min(3, len(pixels) // 100 + 1),
+                    method=color_method,
+                )
+            color_sets.append((index, dominant_colors))
+        except Exception as e:
+            results[index] = {"error": f"Error in color analysis: {str(e)}", "pixel_count": len(pixels)}
+    
+    if color_sets:
+        described = describe_skin_color_sets([colors for _, colors in color_sets])
+        for (index, _), result in zip(color_sets, described):
+            results[index] = result
+    return results
+
 def process_base64_image(base64_data):
     """
     Process an image from base64 encoding
@@ -480,46 +787,21 @@ def process_base64_image(base64_data):
         RGB image array
     """
     try:
-        # Decode base64 data to image
-        # Handle potential padding issues
-        base64_data = base64_data.strip()
-        # Add padding if necessary
-        padding = 4 - (len(base64_data) % 4) if len(base64_data) % 4 else 0
-        base64_data += '=' * padding
-        
-        image_bytes = base64.b64decode(base64_data)
-        image = Image.open(io.BytesIO(image_bytes))
-        
-        # Convert to numpy array and ensure RGB format
-        image_array = np.array(image)
-        
-        # Check if image is RGBA and convert to RGB if needed
-        if len(image_array.shape) == 3 and image_array.shape[2] == 4:
-            # Use PIL for better RGBA to RGB conversion
-            image = image.convert('RGB')
-            image_array = np.array(image)
-        
-        # If image is grayscale, convert to RGB
-        if len(image_array.shape) == 2:
-            image_array = cv2.cvtColor(image_array, cv2.COLOR_GRAY2RGB)
-        elif len(image_array.shape) == 3 and image_array.shape[2] == 1:
-            image_array = cv2.cvtColor(image_array, cv2.COLOR_GRAY2RGB)
-        elif len(image_array.shape) == 3 and image_array.shape[2] == 3:
-            # Already RGB from PIL
-            pass
-        
-        return image_array
+        return decode_image_buffer(decode_base64(base64_data))
         
     except Exception as e:
-        print(f"Error in processing base64 image: {str(e)}")
+        print(f"Error in processing base64 image: {str(e)}", file=sys.stderr)
         raise e
 
 def parse_yolo_keypoints(keypoints_text):
     """
     Parse YOLO keypoint text into a structured format.
     
+    Also understands the legacy "Landmark N: x=.., y=.." lines of
+    pose_detector.py, which use MediaPipe's 33-landmark numbering.
+    
     Args:
-        keypoints_text: String with YOLO keypoint information
+        keypoints_text: String with YOLO or MediaPipe keypoint information
     
     Returns:
         Dictionary with keypoint information
@@ -537,7 +819,13 @@ def parse_yolo_keypoints(keypoints_text):
     try:
         lines = keypoints_text.strip().split('\n')
         for line in lines:
-            if "Keypoint" in line:
+            if "Keypoint" in line or "Landmark" in line:
+                # MediaPipe landmarks map to names through their own index
+                if "Landmark" in line:
+                    names = MEDIAPIPE_KEYPOINT_NAMES
+                else:
+                    names = dict(enumerate(keypoint_names))
+                
                 parts = line.split(":")
                 if len(parts) >= 2:
                     index_part = parts[0].strip()
@@ -546,8 +834,8 @@ def parse_yolo_keypoints(keypoints_text):
                     # Extract index (1-based in YOLO output)
                     try:
                         index = int(index_part.split()[1]) - 1  # Convert to 0-based index
-                        if 0 <= index < len(keypoint_names):
-                            keypoint_name = keypoint_names[index]
+                        if index in names:
+                            keypoint_name = names[index]
                             
                             # Extract coordinates
                             coords = coords_part.split(',')
@@ -559,11 +847,31 @@ def parse_yolo_keypoints(keypoints_text):
                         # Skip malformed lines
                         pass
     except Exception as e:
-        print(f"Error parsing keypoints: {str(e)}")
+        print(f"Error parsing keypoints: {str(e)}", file=sys.stderr)
         # Return empty keypoints rather than failing
     # print(keypoint_dict)
     return {"keypoints": keypoint_dict}
 
+def scale_keypoints(keypoints, scale_x, scale_y):
+    """
+    Scale keypoint coordinates, for example onto a downscaled image.
+    
+    Args:
+        keypoints: Keypoints dictionary
+        scale_x: Horizontal scale factor
+        scale_y: Vertical scale factor
+    
+    Returns:
+        New keypoints dictionary with scaled coordinates
+    """
+    if scale_x == 1 and scale_y == 1:
+        return keypoints
+    
+    return {"keypoints": {
+        name: [int(x * scale_x), int(y * scale_y)]
+        for name, (x, y) in keypoints.get("keypoints", {}).items()
+    }}
+
 def add_debugging_info(result, image_shape, skin_regions=None):
     """
     Add debugging information to the result dictionary
@@ -583,40 +891,205 @@ def add_debugging_info(result, image_shape, skin_regions=None):
         }
     return result
 
-if __name__ == "__main__":
-    # Read input from stdin (JSON with base64 image and optional keypoints)
-    try:
-        input_data = sys.stdin.read()
-        parsed = json.loads(input_data)
-        base64_image = parsed['image']
-        
-        # Process the base64 image
+def request_keypoints(parsed, image_array, original_size):
+    """
+    Keypoints carried by a request, mapped onto the analysis image.
+    
+    Args:
+        parsed: Request dictionary with optional 'landmarks' (pose_detector
+            JSON rows or packed float32) or 'keypoints_text'
+        image_array: Analysis image
+        original_size: (width, height) of the upload the keypoints refer to
+    
+    Returns:
+        Keypoints dictionary, empty when the request has none
+    """
+    original_w, original_h = original_size
+    
+    # Get keypoints if provided: structured MediaPipe landmarks
+    # (JSON rows or packed float32) or legacy keypoint text
+    keypoints = None
+    if parsed.get('landmarks'):
+        keypoints = landmarks_to_keypoints(parse_landmarks(parsed['landmarks']))
+    elif 'keypoints_text' in parsed and parsed['keypoints_text']:
+        keypoints = parse_yolo_keypoints(parsed['keypoints_text'])
+    
+    if keypoints is None:
+        return {"keypoints": {}}
+    
+    # Keypoints refer to the original upload; map them onto the
+    # analysis image
+    return scale_keypoints(
+        keypoints,
+        image_array.shape[1] / original_w,
+        image_array.shape[0] / original_h,
+    )
+
+def image_skin_summary(entry):
+    """
+    Skin color summary of one image of a profile request.
+    
+    Args:
+        entry: Image dictionary carrying the image (see
+            image_io.load_analysis_image) and optional 'landmarks' or
+            'keypoints_text'
+    
+    Returns:
+        Tuple of (digest or None, skin_stats.SkinColorSummary)
+    """
+    load_image = lazy_analysis_image(entry)
+    params = {
+        "max_edge": entry.get('max_edge', DEFAULT_MAX_EDGE),
+        "keypoints_text": entry.get('keypoints_text') or "",
+        "landmarks": entry.get('landmarks') or [],
+    }
+    
+    def compute():
+        image_array, original_size = load_image()
+        keypoints = request_keypoints(entry, image_array, original_size)
+        return collect_skin_summary(image_array, build_skin_rois(image_array, keypoints)).to_dict()
+    
+    digest = request_digest(entry)
+    return digest, SkinColorSummary.from_dict(cached(SKIN_SUMMARY_CACHE_NAMESPACE, digest, params, compute))
+
+def analyze_profile_request(parsed):
+    """
+    Build or update a person's skin tone profile from several images.
+    
+    Every image is reduced to a skin color summary (cached per image), and
+    the summaries are merged with equal weight per image into the profile
+    passed in 'skin_profile'. The updated profile comes back in the result,
+    so a client adds photos one request at a time without re-sending the
+    earlier ones. Images already in the profile are skipped; images sent
+    with "cache": false have no digest and are never recognized as
+    duplicates.
+    
+    Args:
+        parsed: Request dictionary with 'images' (list of image
+            dictionaries, see image_skin_summary), optional 'skin_profile'
+            (state returned by a previous call) and optional 'cache'
+    
+    Returns:
+        Dictionary with the skin tone information of the whole profile,
+        "lab_stats", "variance", "confidence", "image_count", "added",
+        "skipped", "errors" and the updated "skin_profile", or an "error"
+        entry
+    """
+    images = parsed.get('images') or []
+    if not isinstance(images, list):
+        return {"error": "'images' must be a list"}
+    
+    profile_summary, records = load_profile(parsed.get('skin_profile'))
+    added, skipped, errors = 0, 0, []
+    for index, entry in enumerate(images):
+        entry = dict(entry)
+        if 'cache' in parsed:
+            entry.setdefault('cache', parsed['cache'])
         try:
-            # Convert base64 to image array
-            image_array = process_base64_image(base64_image)
-            
-            # Get keypoints if provided
-            keypoints = None
-            if 'keypoints_text' in parsed and parsed['keypoints_text']:
-                keypoints = parse_yolo_keypoints(parsed['keypoints_text'])
-            else:
-                # Use default keypoints based on the example
-                keypoints = {"keypoints": {}}
+            digest, summary = image_skin_summary(entry)
+        except Exception as e:
+            errors.append({"index": index, "error": str(e)})
+            continue
+        if add_image(profile_summary, records, digest, summary):
+            added += 1
+        else:
+            skipped += 1
+    
+    if not records:
+        result = {"error": "No skin pixels detected in any image"}
+        if errors:
+            result["errors"] = errors
+        return result
+    
+    try:
+        with stage("clustering"):
+            result = describe_skin_colors(profile_summary.dominant_colors(3))
+    except Exception as e:
+        return {"error": f"Error analyzing skin colors: {str(e)}"}
+    
+    variance = profile_variance(profile_summary, records)
+    result.update({
+        "lab_stats": profile_summary.lab_stats(),
+        "variance": variance,
+        "confidence": profile_confidence(records, variance),
+        "image_count": len(records),
+        "added": added,
+        "skipped": skipped,
+        "errors": errors,
+        "skin_profile": dump_profile(profile_summary, records),
+    })
+    return result
+
+def analyze_request(parsed):
+    """
+    Run skin tone detection for a single request.
+
+    Results are served from the result cache when the same image was
+    analyzed with the same parameters before.
+
+    Args:
+        parsed: Request dictionary carrying the image (see
+            image_io.load_analysis_image), optional 'landmarks' (pose_detector
+            JSON rows or packed float32), optional 'keypoints_text',
+            optional 'color_method' and optional 'streaming'; requests with
+            "op": "profile" go to analyze_profile_request
+
+    Returns:
+        Dictionary with skin tone information or an "error" entry
+    """
+    if parsed.get('op') == 'profile':
+        return analyze_profile_request(parsed)
+    
+    try:
+        load_image = lazy_analysis_image(parsed)
+        color_method = parsed.get('color_method') or DEFAULT_COLOR_METHOD
+        streaming = bool(parsed.get('streaming', DEFAULT_STREAMING))
+        params = {
+            "max_edge": parsed.get('max_edge', DEFAULT_MAX_EDGE),
+            "color_method": color_method,
+            "streaming": streaming,
+            "keypoints_text": parsed.get('keypoints_text') or "",
+            "landmarks": parsed.get('landmarks') or [],
+        }
+
+        def compute():
+            # Decode the image from whichever input the request carries
+            image_array, (original_w, original_h) = load_image()
+
+            keypoints = request_keypoints(parsed, image_array, (original_w, original_h))
             
             # Detect skin tone
-            skin_tone_info = detect_skin_tone_from_image(image_array, keypoints)
-            
+            skin_tone_info = detect_skin_tone_from_image(image_array, keypoints, color_method, streaming)
+
             # Add debugging info if error
             if "error" in skin_tone_info:
                 skin_tone_info = add_debugging_info(skin_tone_info, image_array.shape)
-            
-            # Output the result as JSON
-            print(json.dumps(skin_tone_info))
-            
-        except Exception as e:
-            error_result = {"error": f"Failed to process image: {str(e)}"}
-            print(json.dumps(error_result))
-            
+
+            return skin_tone_info
+
+        return cached(SKINTONE_CACHE_NAMESPACE, request_digest(parsed), params, compute)
+
+    except Exception as e:
+        return {"error": f"Failed to process image: {str(e)}"}
+
+if __name__ == "__main__":
+    # Long-lived mode: one JSON request per line, one JSON response per line
+    if "--worker" in sys.argv[1:]:
+        run_worker(analyze_request)
+        sys.exit(0)
+
+    # Offline mode: many images from a directory, manifest or JSONL stream
+    if "--batch" in sys.argv[1:]:
+        run_batch_cli(analyze_request)
+        sys.exit(0)
+
+    # Read input from stdin (JSON with the image and optional keypoints)
+    try:
+        parsed = read_request()
     except Exception as e:
         error_result = {"error": f"Failed to parse input: {str(e)}"}
-        print(json.dumps(error_result))
\ No newline at end of file
+        print(json.dumps(error_result))
+        sys.exit(0)
+
+    # Output the result as JSON
+    print(json.dumps(run_instrumented(parsed, analyze_request)))
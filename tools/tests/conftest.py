@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The analysis tools are flat modules run from tools/, not a package
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
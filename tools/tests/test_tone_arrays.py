@@ -0,0 +1,68 @@
+"""
+The array classifiers of tone_arrays must agree exactly with the scalar
+classifiers of skintone_detector, which they replace on the hot path.
+
+Run with: python -m pytest tools/tests
+"""
+import numpy as np
+import pytest
+
+import tone_arrays
+import tone_lut
+from skintone_detector import classify_skin_tone, classify_monk_skin_tone, classify_undertone
+
+@pytest.fixture(scope="module")
+def colors():
+    """Every gray, a grid over the skin range and uniform random colors."""
+    grays = np.repeat(np.arange(256)[:, None], 3, axis=1)
+    levels = [np.arange(lo, 256, 5) for lo in (90, 40, 20)]
+    skin = np.stack(np.meshgrid(*levels, indexing='ij'), axis=-1).reshape(-1, 3)
+    rng = np.random.default_rng(0)
+    return np.concatenate([grays, skin, rng.integers(0, 256, size=(40000, 3))])
+
+@pytest.fixture(scope="module")
+def scalar(colors):
+    """Scalar classes of every color: (fitzpatrick, monk, undertone, labels)."""
+    fitzpatrick, monk, undertone, fitzpatrick_labels, monk_labels = [], [], [], [], []
+    for color in colors.tolist():
+        label, value = classify_skin_tone(color)
+        fitzpatrick.append(value)
+        fitzpatrick_labels.append(label)
+        label, value = classify_monk_skin_tone(color)
+        monk.append(value)
+        monk_labels.append(label)
+        undertone.append(classify_undertone(color))
+    return {
+        "fitzpatrick_value": np.array(fitzpatrick),
+        "fitzpatrick_classification": np.array(fitzpatrick_labels),
+        "monk_value": np.array(monk),
+        "monk_classification": np.array(monk_labels),
+        "undertone": np.array(undertone),
+    }
+
+@pytest.fixture
+def no_lut(monkeypatch):
+    """Make classify_colors take the array path even when a table exists."""
+    monkeypatch.setattr(tone_lut, "_lut", None)
+    monkeypatch.setattr(tone_lut, "_lut_loaded", True)
+
+def mismatches(colors, expected, actual):
+    wrong = np.flatnonzero(np.asarray(expected) != np.asarray(actual))
+    return [(colors[i].tolist(), expected[i], actual[i]) for i in wrong[:5]]
+
+def test_fitzpatrick_matches_scalar(colors, scalar):
+    actual = tone_arrays.classify_skin_tone_array(colors)
+    assert mismatches(colors, scalar["fitzpatrick_value"], actual) == []
+
+def test_monk_matches_scalar(colors, scalar):
+    actual = tone_arrays.classify_monk_skin_tone_array(colors)
+    assert mismatches(colors, scalar["monk_value"], actual) == []
+
+def test_undertone_matches_scalar(colors, scalar):
+    actual = tone_arrays.UNDERTONES[tone_arrays.classify_undertone_array(colors)]
+    assert mismatches(colors, scalar["undertone"], actual) == []
+
+def test_classify_colors_matches_scalar(colors, scalar, no_lut):
+    result = tone_arrays.classify_colors(colors)
+    for key, expected in scalar.items():
+        assert mismatches(colors, expected, result[key]) == [], key
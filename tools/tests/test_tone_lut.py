@@ -0,0 +1,68 @@
+"""
+The memory-mapped tone table must agree with the classifiers it stands in
+for: tone_arrays.classify_colors on the array path and the scalar
+classifiers of skintone_detector. A table is built from the current code
+for the test, and the installed table, when there is one, is sampled too.
+
+Run with: python -m pytest tools/tests
+"""
+import shutil
+
+import numpy as np
+import pytest
+
+import tone_arrays
+import tone_lut
+from skintone_detector import classify_skin_tone, classify_monk_skin_tone, classify_undertone
+
+@pytest.fixture(scope="module")
+def built_lut(tmp_path_factory):
+    """Table built from the current classifiers, and its path."""
+    path = str(tmp_path_factory.mktemp("lut") / "tone_lut.bin")
+    tone_lut.build_lut(path)
+    return tone_lut.load_lut(path), path
+
+@pytest.fixture(scope="module")
+def colors():
+    """Every gray and uniform random colors."""
+    rng = np.random.default_rng(1)
+    grays = np.repeat(np.arange(256)[:, None], 3, axis=1)
+    return np.concatenate([grays, rng.integers(0, 256, size=(200000, 3))])
+
+def classify_with(monkeypatch, lut, colors):
+    """classify_colors with the given table, or on the array path for None."""
+    monkeypatch.setattr(tone_lut, "_lut", lut)
+    monkeypatch.setattr(tone_lut, "_lut_loaded", True)
+    return tone_arrays.classify_colors(colors)
+
+def test_built_table_matches_classify_colors(monkeypatch, built_lut, colors):
+    lut, _ = built_lut
+    from_table = classify_with(monkeypatch, lut, colors)
+    from_arrays = classify_with(monkeypatch, None, colors)
+    for key in from_arrays:
+        wrong = np.flatnonzero(from_table[key] != from_arrays[key])
+        assert wrong.size == 0, (key, colors[wrong[:5]].tolist())
+
+def test_built_table_matches_scalar_classifiers(built_lut, colors):
+    lut, _ = built_lut
+    sample = colors[:20000]
+    undertone, monk, fitzpatrick = tone_lut.decode_codes(tone_lut.lookup_codes(sample, lut))
+    for color, u, m, f in zip(sample.tolist(), undertone, monk, fitzpatrick):
+        expected = (classify_undertone(color), classify_monk_skin_tone(color)[1], classify_skin_tone(color)[1])
+        assert (tone_arrays.UNDERTONES[u], m, f) == expected, color
+
+def test_classifier_edit_retires_the_table(monkeypatch, built_lut, tmp_path):
+    _, path = built_lut
+    source = tmp_path / "tone_arrays.py"
+    shutil.copy(tone_arrays.__file__, source)
+    source.write_text(source.read_text().replace("b_ratio > 0.31", "b_ratio > 0.30"))
+
+    monkeypatch.setattr(tone_arrays, "__file__", str(source))
+    assert tone_lut.read_stamp(path) != tone_lut.lut_stamp()
+    assert tone_lut.load_lut(path) is None
+
+def test_installed_table_matches_classifiers():
+    if tone_lut.load_lut() is None:
+        pytest.skip("no table for the current classifiers at TONE_LUT_PATH")
+    report = tone_lut.verify_lut(samples=20000)
+    assert report["mismatch_count"] == 0, report["mismatches"]
@@ -0,0 +1,81 @@
+import os
+import sys
+
+# Threads each analysis process may use in OpenCV, BLAS and OpenMP; 0 leaves
+# every library at its own default, usually one thread per core, which
+# oversubscribes the CPU as soon as several workers run at once
+ANALYSIS_THREADS = int(os.environ.get('ANALYSIS_THREADS', '0'))
+
+# Variables OpenCV, BLAS and OpenMP read when they are loaded. They take
+# effect in processes started with them (the Node worker pool sets them)
+# and for libraries imported after apply_thread_limits, like the lazily
+# imported cv2; apply_thread_limits also changes runtimes loaded earlier
+THREAD_ENV_VARS = (
+    "OPENCV_FOR_THREADS_NUM",
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+)
+
+_applied = None
+
+def thread_env(threads):
+    """
+    Environment of a child process limited to a number of threads.
+
+    Args:
+        threads: Threads per process
+
+    Returns:
+        Dictionary of environment variables
+    """
+    env = {name: str(threads) for name in THREAD_ENV_VARS}
+    env["ANALYSIS_THREADS"] = str(threads)
+    return env
+
+def apply_thread_limits(threads=None):
+    """
+    Limit the threads OpenCV, BLAS and OpenMP use in this process.
+
+    Nothing is imported here, so scripts that never use OpenCV do not pay
+    for it: the environment is set for libraries loaded later (cv2 reads
+    OPENCV_FOR_THREADS_NUM when it is first imported) and for child
+    processes. Libraries already loaded are changed in place: cv2 with
+    cv2.setNumThreads, and NumPy's OpenBLAS or scikit-learn's OpenMP
+    through threadpoolctl, when it is installed and the process was not
+    started with the limit already. MediaPipe's own executors cannot be
+    sized from Python; running one worker per core keeps them from
+    competing.
+
+    Only the first call with a limit has an effect.
+
+    Args:
+        threads: Threads per process; defaults to ANALYSIS_THREADS, and 0
+            or less leaves the libraries alone
+
+    Returns:
+        The limit in effect, or None when the libraries use their defaults
+    """
+    global _applied
+    threads = ANALYSIS_THREADS if threads is None else threads
+    if _applied is not None or threads <= 0:
+        return _applied
+
+    env = thread_env(threads)
+    started_with_limits = all(os.environ.get(name) == value for name, value in env.items())
+    for name, value in env.items():
+        os.environ.setdefault(name, value)
+
+    if 'cv2' in sys.modules:
+        sys.modules['cv2'].setNumThreads(threads)
+    if not started_with_limits and ('numpy' in sys.modules or 'sklearn' in sys.modules):
+        try:
+            from threadpoolctl import threadpool_limits
+            threadpool_limits(threads)
+        except ImportError:
+            pass
+
+    _applied = threads
+    return _applied
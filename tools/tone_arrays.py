@@ -0,0 +1,274 @@
+import numpy as np
+
+# Class labels indexed by the codes returned from the array classifiers
+UNDERTONES = np.array(["cool", "olive", "neutral", "warm", "neutral-cool", "neutral-olive"])
+
+FITZPATRICK_LABELS = np.array([
+    "Very Fair (Fitzpatrick Type I)",
+    "Fair (Fitzpatrick Type II)",
+    "Light/Medium (Fitzpatrick Type III)",
+    "Moderate Brown/Olive (Fitzpatrick Type IV)",
+    "Brown (Fitzpatrick Type V)",
+    "Dark Brown/Black (Fitzpatrick Type VI)",
+])
+
+MONK_LABELS = np.array([
+    "Lightest (Monk Scale 1)",
+    "Very Light (Monk Scale 2)",
+    "Light (Monk Scale 3)",
+    "Light Medium (Monk Scale 4)",
+    "Medium (Monk Scale 5)",
+    "Medium Deep (Monk Scale 6)",
+    "Deep (Monk Scale 7)",
+    "Deep Dark (Monk Scale 8)",
+    "Very Dark (Monk Scale 9)",
+    "Darkest (Monk Scale 10)",
+])
+
+# Luminance thresholds, lightest class first (value is "greater than")
+FITZPATRICK_THRESHOLDS = [200, 180, 160, 120, 80]
+MONK_THRESHOLDS = [220, 200, 180, 160, 140, 120, 100, 80, 60]
+
+def _srgb_to_linear(channel):
+    """Scalar sRGB companding, written exactly as in classify_undertone."""
+    var = channel / 255.0
+    var = (var > 0.04045) and ((var + 0.055) / 1.055) ** 2.4 or var / 12.92
+    return var * 100
+
+def _lab_f(t):
+    """Scalar XYZ->LAB companding, written exactly as in classify_undertone."""
+    return (t > 0.008856) and t ** (1/3) or (7.787 * t) + (16 / 116)
+
+# Linear sRGB (x100) of every 8-bit channel value, computed with Python floats
+# so that table lookups reproduce the scalar conversion bit for bit
+SRGB_LINEAR_TABLE = np.array([_srgb_to_linear(v) for v in range(256)])
+
+# Values that classify_undertone compares L, a and b against
+_L_THRESHOLDS = (70.0,)
+_A_THRESHOLDS = (0.0, 8.0)
+_B_THRESHOLDS = (0.0, -2.0, -4.0, 4.0, -6.0, 6.0)
+
+def _as_colors(colors):
+    """
+    Validate an (N, 3) array of 8-bit RGB colors.
+
+    Args:
+        colors: Array-like of (r, g, b) integer colors
+
+    Returns:
+        (N, 3) int64 array
+    """
+    colors = np.asarray(colors)
+    if colors.ndim == 1:
+        colors = colors.reshape(1, -1)
+    if colors.ndim != 2 or colors.shape[1] != 3:
+        raise ValueError(f"Expected an (N, 3) color array, got shape {colors.shape}")
+    if not np.issubdtype(colors.dtype, np.integer):
+        if not np.all(np.mod(colors, 1) == 0):
+            raise ValueError("Colors must be integer RGB values")
+    colors = colors.astype(np.int64)
+    if colors.size and (colors.min() < 0 or colors.max() > 255):
+        raise ValueError("Colors must be in the range 0-255")
+    return colors
+
+def rgb_to_lab_array(colors):
+    """
+    Convert 8-bit RGB colors to CIE LAB the same way classify_undertone does.
+
+    The sRGB companding comes from a table built with Python floats. NumPy's
+    vectorized cube root may differ from Python's pow in the last bit, so
+    any color whose L, a or b lands within 1e-9 of a classification
+    threshold is recomputed with the scalar formula.
+
+    Args:
+        colors: (N, 3) array of integer RGB colors
+
+    Returns:
+        (N, 3) float64 array of L, a, b values
+    """
+    colors = _as_colors(colors)
+
+    var_r = SRGB_LINEAR_TABLE[colors[:, 0]]
+    var_g = SRGB_LINEAR_TABLE[colors[:, 1]]
+    var_b = SRGB_LINEAR_TABLE[colors[:, 2]]
+
+    # Observer = 2°, Illuminant = D65
+    X = var_r * 0.4124 + var_g * 0.3576 + var_b * 0.1805
+    Y = var_r * 0.2126 + var_g * 0.7152 + var_b * 0.0722
+    Z = var_r * 0.0193 + var_g * 0.1192 + var_b * 0.9505
+
+    X /= 95.047
+    Y /= 100.000
+    Z /= 108.883
+
+    fx = np.where(X > 0.008856, np.power(X, 1/3), (7.787 * X) + (16 / 116))
+    fy = np.where(Y > 0.008856, np.power(Y, 1/3), (7.787 * Y) + (16 / 116))
+    fz = np.where(Z > 0.008856, np.power(Z, 1/3), (7.787 * Z) + (16 / 116))
+
+    lab = np.empty((len(colors), 3))
+    lab[:, 0] = (116 * fy) - 16
+    lab[:, 1] = 500 * (fx - fy)
+    lab[:, 2] = 200 * (fy - fz)
+
+    # Recompute colors sitting on a threshold with the exact scalar path
+    eps = 1e-9
+    near = np.zeros(len(colors), dtype=bool)
+    for column, thresholds in ((0, _L_THRESHOLDS), (1, _A_THRESHOLDS), (2, _B_THRESHOLDS)):
+        for t in thresholds:
+            near |= np.abs(lab[:, column] - t) < eps
+
+    for i in np.flatnonzero(near):
+        sx, sy, sz = X[i], Y[i], Z[i]
+        sx, sy, sz = _lab_f(float(sx)), _lab_f(float(sy)), _lab_f(float(sz))
+        lab[i] = ((116 * sy) - 16, 500 * (sx - sy), 200 * (sy - sz))
+
+    return lab
+
+def luminance_array(colors):
+    """
+    Perceived luminance (0.299 R + 0.587 G + 0.114 B) of each color.
+
+    Args:
+        colors: (N, 3) array of integer RGB colors
+
+    Returns:
+        (N,) float64 array
+    """
+    colors = _as_colors(colors).astype(np.float64)
+    return 0.299 * colors[:, 0] + 0.587 * colors[:, 1] + 0.114 * colors[:, 2]
+
+def classify_undertone_array(colors):
+    """
+    Array version of classify_undertone.
+
+    Args:
+        colors: (N, 3) array of integer RGB colors
+
+    Returns:
+        (N,) int array of indices into UNDERTONES
+    """
+    colors = _as_colors(colors)
+    r = colors[:, 0].astype(np.float64)
+    g = colors[:, 1].astype(np.float64)
+    b = colors[:, 2].astype(np.float64)
+
+    total = colors.sum(axis=1).astype(np.float64)
+    has_total = total > 0
+    safe_total = np.where(has_total, total, 1)
+    r_ratio = np.where(has_total, r / safe_total, 0)
+    g_ratio = np.where(has_total, g / safe_total, 0)
+    b_ratio = np.where(has_total, b / safe_total, 0)
+
+    # Blue to red ratio for cool undertones
+    br_ratio = np.where(r > 0, b / np.where(r > 0, r, 1), 0)
+
+    # Green presence helps identify olive undertones
+    green_presence = g_ratio - (r_ratio + b_ratio) / 2
+
+    lab = rgb_to_lab_array(colors)
+    L, a, b_val = lab[:, 0], lab[:, 1], lab[:, 2]
+
+    is_fair_skin = L > 70
+    blue_presence = b_ratio > 0.31
+
+    cool, olive, neutral, warm, neutral_cool, neutral_olive = range(len(UNDERTONES))
+    conditions = [
+        is_fair_skin & ((b_val < -2) | (br_ratio > 0.85) | blue_presence),
+        (green_presence > 0.02) & (g_ratio > 0.33),
+        (a < 0) & (b_val < 0),
+        b_val < -4,
+        (a < 8) & (np.abs(b_val) < 6),
+        (a > 8) & (b_val > 0),
+        (a > 0) & (b_val < 0) & (np.abs(b_val) > 4),
+        (a > 0) & (b_val < 0),
+        (a < 0) & (b_val > 0),
+    ]
+    choices = [cool, olive, cool, cool, neutral, warm, cool, neutral_cool, neutral_olive]
+    return np.select(conditions, choices, default=neutral)
+
+def classify_skin_tone_array(colors):
+    """
+    Array version of classify_skin_tone.
+
+    Args:
+        colors: (N, 3) array of integer RGB colors
+
+    Returns:
+        (N,) int array of Fitzpatrick types 1-6
+    """
+    luminance = luminance_array(colors)
+    return 1 + (luminance[:, None] <= np.array(FITZPATRICK_THRESHOLDS)).sum(axis=1)
+
+def classify_monk_skin_tone_array(colors):
+    """
+    Array version of the numeric part of classify_monk_skin_tone.
+
+    Args:
+        colors: (N, 3) array of integer RGB colors
+
+    Returns:
+        (N,) int array of Monk values 1-10
+    """
+    luminance = luminance_array(colors)
+    return 1 + (luminance[:, None] <= np.array(MONK_THRESHOLDS)).sum(axis=1)
+
+def classify_colors(colors):
+    """
+    Classify many colors in one pass.
+
+    Results match classify_skin_tone, classify_monk_skin_tone and
+    classify_undertone exactly; the undertone is computed once per color and
+    reused for the Monk description. When the generated lookup table is
+    available (see tone_lut) all three classes come from one table lookup
+    instead of the LAB conversion.
+
+    Args:
+        colors: (N, 3) array of integer RGB colors
+
+    Returns:
+        Dictionary of (N,) arrays: fitzpatrick_value, fitzpatrick_classification,
+        monk_value, monk_classification, undertone
+    """
+    from tone_lut import lookup_codes, decode_codes
+
+    colors = _as_colors(colors)
+    codes = lookup_codes(colors)
+    if codes is not None:
+        undertone_index, monk, fitzpatrick = decode_codes(codes)
+    else:
+        fitzpatrick = classify_skin_tone_array(colors)
+        monk = classify_monk_skin_tone_array(colors)
+        undertone_index = classify_undertone_array(colors)
+    undertone = UNDERTONES[undertone_index]
+
+    monk_classification = np.char.add(
+        np.char.add(MONK_LABELS[monk - 1], " with "),
+        np.char.add(undertone, " undertones"),
+    )
+
+    return {
+        "fitzpatrick_value": fitzpatrick,
+        "fitzpatrick_classification": FITZPATRICK_LABELS[fitzpatrick - 1],
+        "monk_value": monk,
+        "monk_classification": monk_classification,
+        "undertone": undertone,
+    }
+
+if __name__ == "__main__":
+    # Bulk re-scoring: one {"id": ..., "rgb": [r, g, b]} object per input
+    # line, one classification object per output line
+    import sys
+    import json
+
+    records = [json.loads(line) for line in sys.stdin if line.strip()]
+    if records:
+        result = classify_colors([record["rgb"] for record in records])
+        for i, record in enumerate(records):
+            print(json.dumps({
+                "id": record.get("id"),
+                "fitzpatrick_value": int(result["fitzpatrick_value"][i]),
+                "fitzpatrick_classification": str(result["fitzpatrick_classification"][i]),
+                "monk_value": int(result["monk_value"][i]),
+                "monk_classification": str(result["monk_classification"][i]),
+                "undertone": str(result["undertone"][i]),
+            }))
@@ -0,0 +1,287 @@
+import os
+import sys
+import json
+import hashlib
+import threading
+import numpy as np
+
+import tone_arrays
+from tone_arrays import (
+    UNDERTONES,
+    FITZPATRICK_THRESHOLDS,
+    MONK_THRESHOLDS,
+    _as_colors,
+    classify_undertone_array,
+    classify_monk_skin_tone_array,
+)
+
+# Bump when the layout of the table or of its codes changes; changes to the
+# classifiers are picked up by lut_stamp on their own
+LUT_FORMAT = 2
+
+# Generated table; build it with `python3 tone_lut.py`
+DEFAULT_LUT_PATH = os.environ.get('TONE_LUT_PATH') or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'tone_lut.bin')
+
+# File header: magic, then the version stamp, padded to HEADER_SIZE bytes
+LUT_MAGIC = b'TONELUT1'
+HEADER_SIZE = 64
+
+# Number of codes per undertone: one per Monk value
+MONK_LEVELS = len(MONK_THRESHOLDS) + 1
+
+def _fitzpatrick_for_monk():
+    """
+    Fitzpatrick type of every Monk value.
+
+    Every Fitzpatrick threshold is also a Monk threshold, so each Monk band
+    lies inside one Fitzpatrick band and the code only has to store Monk.
+
+    Returns:
+        (MONK_LEVELS + 1,) int array indexed by Monk value 1-10
+    """
+    if not set(FITZPATRICK_THRESHOLDS) <= set(MONK_THRESHOLDS):
+        raise ValueError("Fitzpatrick thresholds must be a subset of the Monk thresholds")
+    # Any luminance inside each Monk band: the band's lower bound plus a bit
+    lower = [*MONK_THRESHOLDS, -1]
+    fitzpatrick = [1 + sum(bound + 0.5 <= t for t in FITZPATRICK_THRESHOLDS) for bound in lower]
+    return np.array([0, *fitzpatrick])
+
+FITZPATRICK_FOR_MONK = _fitzpatrick_for_monk()
+
+def lut_stamp():
+    """
+    Version stamp of the table the current classification code would build.
+
+    The stamp hashes LUT_FORMAT and the source of tone_arrays, which holds
+    every rule and constant the codes are computed from (thresholds,
+    labels, the LAB conversion and the undertone cut-offs). Any edit to
+    that module therefore retires existing tables, even one that would not
+    change a code; rebuilding takes under a minute.
+
+    Returns:
+        32-character hex string
+    """
+    digest = hashlib.sha256(f"format:{LUT_FORMAT}\n".encode())
+    with open(tone_arrays.__file__, 'rb') as f:
+        digest.update(f.read())
+    return digest.hexdigest()[:32]
+
+def compute_codes(colors):
+    """
+    Class codes of colors, computed without the table.
+
+    A code packs the undertone index and the Monk value into one byte:
+    undertone * MONK_LEVELS + (monk - 1).
+
+    Args:
+        colors: (N, 3) array of integer RGB colors
+
+    Returns:
+        (N,) uint8 array
+    """
+    undertone = classify_undertone_array(colors)
+    monk = classify_monk_skin_tone_array(colors)
+    return (undertone * MONK_LEVELS + monk - 1).astype(np.uint8)
+
+def build_lut(path=DEFAULT_LUT_PATH):
+    """
+    Generate the table of every 8-bit RGB color (16 MB) and write it to path.
+
+    The file is written next to path, checked with verify_lut against the
+    scalar classifiers and only then renamed into place, so running workers
+    never map a half-written or wrong table.
+
+    Args:
+        path: Destination file
+
+    Returns:
+        Report of verify_lut
+
+    Raises:
+        ValueError: When the new table disagrees with the scalar classifiers
+    """
+    levels = np.arange(256, dtype=np.int64)
+    gb = np.stack(np.meshgrid(levels, levels, indexing='ij'), axis=-1).reshape(-1, 2)
+    colors = np.empty((len(gb), 3), dtype=np.int64)
+    colors[:, 1:] = gb
+
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write((LUT_MAGIC + lut_stamp().encode()).ljust(HEADER_SIZE, b'\0'))
+        for r in range(256):
+            colors[:, 0] = r
+            f.write(compute_codes(colors).tobytes())
+
+    report = verify_lut(tmp)
+    if report.get("error") or report["mismatch_count"]:
+        os.remove(tmp)
+        raise ValueError(f"Table disagrees with the scalar classifiers: {json.dumps(report)}")
+    os.replace(tmp, path)
+    return report
+
+def read_stamp(path):
+    """
+    Version stamp stored in a table file.
+
+    Returns:
+        Stamp string, or None if the file is missing or not a table
+    """
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(HEADER_SIZE)
+    except OSError:
+        return None
+    if len(header) < HEADER_SIZE or not header.startswith(LUT_MAGIC):
+        return None
+    return header[len(LUT_MAGIC):].rstrip(b'\0').decode('ascii', 'replace')
+
+_lut = None
+_lut_loaded = False
+_lut_lock = threading.Lock()
+
+def load_lut(path=DEFAULT_LUT_PATH):
+    """
+    Memory-map the table if it exists and matches the current stamp.
+
+    The mapping is shared by every thread, and by every worker process
+    through the page cache, so the 16 MB are only paid once per machine.
+
+    Args:
+        path: Table file
+
+    Returns:
+        Read-only (256**3,) uint8 array, or None when the table is missing
+        or was built by other classification code
+    """
+    stamp = read_stamp(path)
+    if stamp != lut_stamp():
+        if stamp is not None:
+            # Classification falls back to the array code, correct but slower
+            print(f"Ignoring stale tone table {path} (stamp {stamp}, expected {lut_stamp()}); "
+                  f"rebuild it with `python3 tone_lut.py`", file=sys.stderr)
+        return None
+    return np.memmap(path, dtype=np.uint8, mode='r', offset=HEADER_SIZE, shape=(256 ** 3,))
+
+def get_lut():
+    """
+    Table of the default path, mapped on first use.
+
+    Returns:
+        Array from load_lut, or None
+    """
+    global _lut, _lut_loaded
+    if not _lut_loaded:
+        with _lut_lock:
+            if not _lut_loaded:
+                _lut = load_lut()
+                _lut_loaded = True
+    return _lut
+
+def lookup_codes(colors, lut=None):
+    """
+    Class codes of colors with a single table lookup.
+
+    Works for any number of colors, including every pixel of an image.
+
+    Args:
+        colors: (..., 3) array of integer RGB colors
+        lut: Table from load_lut; defaults to get_lut()
+
+    Returns:
+        uint8 array of codes with the shape of colors minus its last axis,
+        or None when no table is available
+    """
+    lut = get_lut() if lut is None else lut
+    if lut is None:
+        return None
+    colors = np.asarray(colors)
+    if colors.dtype != np.uint8:
+        colors = _as_colors(colors.reshape(-1, 3)).reshape(colors.shape)
+    index = (colors[..., 0].astype(np.intp) << 16) | (colors[..., 1].astype(np.intp) << 8) | colors[..., 2]
+    return lut[index]
+
+def decode_codes(codes):
+    """
+    Split class codes into their classes.
+
+    Args:
+        codes: uint8 array of codes
+
+    Returns:
+        Tuple of (undertone indices into UNDERTONES, Monk values 1-10,
+        Fitzpatrick types 1-6)
+    """
+    codes = np.asarray(codes, dtype=np.intp)
+    monk = codes % MONK_LEVELS + 1
+    return codes // MONK_LEVELS, monk, FITZPATRICK_FOR_MONK[monk]
+
+def verify_lut(path=DEFAULT_LUT_PATH, samples=200000, full=False, seed=0):
+    """
+    Check the table against the scalar reference classifiers.
+
+    Random colors plus every gray are classified with classify_undertone,
+    classify_skin_tone and classify_monk_skin_tone from skintone_detector.
+    With full=True every color is also compared with compute_codes.
+
+    Args:
+        path: Table file
+        samples: Number of random colors checked against the scalar code
+        full: Also compare all 16.7M colors with the array classifiers
+        seed: Random seed of the sample
+
+    Returns:
+        Dictionary with "checked" and "mismatches" (first 20 at most), or
+        an "error" entry when the table is missing or stale
+    """
+    from skintone_detector import classify_undertone, classify_skin_tone, classify_monk_skin_tone
+
+    lut = load_lut(path)
+    if lut is None:
+        return {"error": f"No table for stamp {lut_stamp()} at {path} (found {read_stamp(path)})"}
+
+    rng = np.random.default_rng(seed)
+    grays = np.repeat(np.arange(256)[:, None], 3, axis=1)
+    colors = np.concatenate([grays, rng.integers(0, 256, size=(samples, 3))])
+    undertone, monk, fitzpatrick = decode_codes(lookup_codes(colors, lut))
+
+    mismatches = []
+    for color, u, m, f in zip(colors.tolist(), undertone, monk, fitzpatrick):
+        expected = (classify_undertone(color), classify_monk_skin_tone(color)[1], classify_skin_tone(color)[1])
+        if expected != (UNDERTONES[u], m, f):
+            mismatches.append({"rgb": color, "expected": list(expected), "lut": [str(UNDERTONES[u]), int(m), int(f)]})
+    checked = len(colors)
+
+    if full:
+        levels = np.arange(256, dtype=np.int64)
+        gb = np.stack(np.meshgrid(levels, levels, indexing='ij'), axis=-1).reshape(-1, 2)
+        block = np.empty((len(gb), 3), dtype=np.int64)
+        block[:, 1:] = gb
+        for r in range(256):
+            block[:, 0] = r
+            expected = compute_codes(block)
+            actual = lut[r << 16:(r + 1) << 16]
+            for i in np.flatnonzero(expected != actual)[:20]:
+                mismatches.append({"rgb": block[i].tolist(), "expected_code": int(expected[i]), "lut_code": int(actual[i])})
+        checked += 256 ** 3
+
+    return {"checked": checked, "mismatches": mismatches[:20], "mismatch_count": len(mismatches)}
+
+if __name__ == "__main__":
+    # python3 tone_lut.py [PATH]                  build and check the table
+    # python3 tone_lut.py --verify [--full] [PATH] check it against the reference
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    path = args[0] if args else DEFAULT_LUT_PATH
+
+    if "--verify" in sys.argv[1:]:
+        report = verify_lut(path, full="--full" in sys.argv[1:])
+        print(json.dumps(report, indent=2))
+        sys.exit(0 if not report.get("error") and not report["mismatch_count"] else 1)
+
+    try:
+        report = build_lut(path)
+    except ValueError as e:
+        print(json.dumps({"error": str(e)}))
+        sys.exit(1)
+    print(json.dumps({"path": path, "stamp": lut_stamp(), "bytes": os.path.getsize(path),
+                      "checked": report["checked"]}))
@@ -0,0 +1,223 @@
+import os
+import sys
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+from worker import run_worker, read_request
+from instrumentation import stage, record_metric, run_instrumented
+from tone_arrays import rgb_to_lab_array
+
+# Warmth of each undertone returned by the skin tone detector (and of the
+# cool/warm/neutral values stored on users): +1 favors warm garment
+# colors, -1 cool ones, 0 neither
+UNDERTONE_WARMTH = {
+    "warm": 1.0,
+    "olive": 0.4,
+    "neutral-olive": 0.3,
+    "neutral": 0.0,
+    "neutral-cool": -0.5,
+    "cool": -1.0,
+}
+
+# LAB hue angle, in degrees, of the warmest colors (orange to yellow); the
+# coolest (blue to violet) sit opposite
+WARM_HUE = 60.0
+
+# Chroma at which a garment color's hue counts fully; greys, black, white
+# and beige are below it and score on contrast alone
+FULL_CHROMA = 40.0
+
+# Lightness difference to the skin that counts as full contrast
+CONTRAST_TARGET = 30.0
+
+# CIE76 distance to the skin below which a garment starts to wash out
+WASHOUT_DELTA_E = 15.0
+
+# Weights of the undertone harmony, contrast and wash-out terms
+HARMONY_WEIGHT = 0.5
+CONTRAST_WEIGHT = 0.3
+WASHOUT_WEIGHT = 0.4
+
+# Garment indices kept per process, least recently used dropped first
+INDEX_CACHE_SIZE = int(os.environ.get('WARDROBE_INDEX_CACHE', '256'))
+
+def hex_to_rgb_array(hexes):
+    """
+    Parse "#RRGGBB" strings into an array in one pass.
+
+    Args:
+        hexes: List of "#RRGGBB" (or "RRGGBB") strings
+
+    Returns:
+        (N, 3) uint8 array
+    """
+    digits = "".join(h.strip().lstrip('#') for h in hexes)
+    if len(digits) != 6 * len(hexes):
+        raise ValueError("Garment colors must be 6-digit hex values like #FF5733")
+    return np.frombuffer(bytes.fromhex(digits), dtype=np.uint8).reshape(-1, 3)
+
+class GarmentColorIndex:
+    """
+    LAB matrix of a wardrobe's garment colors.
+
+    Everything that does not depend on the skin tone is computed once when
+    the index is built: the LAB color of every garment, and its warmth
+    (cosine of the hue angle to WARM_HUE, scaled down for low-chroma
+    colors). Scoring against a skin tone is then a few array operations
+    over the whole wardrobe.
+    """
+
+    def __init__(self, ids, hexes):
+        self.ids = list(ids)
+        self.hexes = list(hexes)
+        self.rgb = hex_to_rgb_array(self.hexes)
+        self.lab = rgb_to_lab_array(self.rgb).astype(np.float32)
+
+        a, b = self.lab[:, 1], self.lab[:, 2]
+        chroma = np.hypot(a, b)
+        hue = np.arctan2(b, a)
+        self.warmth = (np.cos(hue - np.radians(WARM_HUE)) * np.minimum(chroma / FULL_CHROMA, 1.0)).astype(np.float32)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def score(self, undertone=None, skin_rgb=None):
+        """
+        Compatibility of every garment color with a skin tone.
+
+        The score adds HARMONY_WEIGHT x undertone warmth x garment warmth
+        and CONTRAST_WEIGHT x the lightness contrast to the skin (capped at
+        CONTRAST_TARGET), and subtracts WASHOUT_WEIGHT x a penalty that
+        grows as the garment's color approaches the skin's. Without a skin
+        color only the undertone term is used.
+
+        Args:
+            undertone: Undertone name (see UNDERTONE_WARMTH), or None
+            skin_rgb: (r, g, b) main skin color, or None
+
+        Returns:
+            Tuple of ((N,) float32 scores, (N,) float32 distances to the
+            skin color or None)
+        """
+        warmth = UNDERTONE_WARMTH.get((undertone or "neutral").lower(), 0.0)
+        scores = HARMONY_WEIGHT * warmth * self.warmth
+        if skin_rgb is None:
+            return scores, None
+
+        skin_lab = rgb_to_lab_array([skin_rgb])[0].astype(np.float32)
+        delta_e = np.linalg.norm(self.lab - skin_lab, axis=1)
+        contrast = np.minimum(np.abs(self.lab[:, 0] - skin_lab[0]) / CONTRAST_TARGET, 1.0)
+        washout = np.exp(-(delta_e / WASHOUT_DELTA_E) ** 2)
+        return scores + CONTRAST_WEIGHT * contrast - WASHOUT_WEIGHT * washout, delta_e
+
+    def top_k(self, k, undertone=None, skin_rgb=None):
+        """
+        The k best-scoring garments, best first.
+
+        Args:
+            k: Number of garments; 0 or less ranks the whole wardrobe
+            undertone: Undertone name, or None
+            skin_rgb: (r, g, b) main skin color, or None
+
+        Returns:
+            List of {"id", "hex", "score", "delta_e"} dictionaries
+        """
+        scores, delta_e = self.score(undertone, skin_rgb)
+        if 0 < k < len(scores):
+            # argpartition finds the k best in linear time; only they are sorted
+            best = np.argpartition(-scores, k - 1)[:k]
+        else:
+            best = np.arange(len(scores))
+        best = best[np.argsort(-scores[best], kind='stable')]
+        return [
+            {
+                "id": self.ids[i],
+                "hex": self.hexes[i],
+                "score": round(float(scores[i]), 4),
+                "delta_e": None if delta_e is None else round(float(delta_e[i]), 2),
+            }
+            for i in best
+        ]
+
+_indices = OrderedDict()
+_indices_lock = threading.Lock()
+
+def get_index(items, index_key=None):
+    """
+    Build a garment index, or reuse the one built for the same wardrobe.
+
+    Args:
+        items: List of {"id", "hex"} dictionaries
+        index_key: Optional caller key identifying this version of the
+            wardrobe (e.g. user id and last update time); defaults to a
+            hash of the items
+
+    Returns:
+        GarmentColorIndex
+    """
+    if index_key is None:
+        index_key = hashlib.sha256(json.dumps(
+            [[item.get("id"), item.get("hex")] for item in items]).encode()).hexdigest()
+
+    with _indices_lock:
+        index = _indices.get(index_key)
+        if index is not None:
+            _indices.move_to_end(index_key)
+    record_metric("index_cached", index is not None)
+    if index is not None:
+        return index
+
+    with stage("index"):
+        index = GarmentColorIndex([item.get("id") for item in items], [item["hex"] for item in items])
+    with _indices_lock:
+        _indices[index_key] = index
+        while len(_indices) > INDEX_CACHE_SIZE:
+            _indices.popitem(last=False)
+    return index
+
+def rank_request(parsed):
+    """
+    Rank wardrobe items by how well their colors suit a skin tone.
+
+    Args:
+        parsed: Request dictionary with 'items' (list of {"id", "hex"}),
+            'skin' (a skin tone result or any dictionary with
+            'main_color_rgb' and/or 'undertone'), optional 'top_k'
+            (default 10, 0 for all) and optional 'index_key'
+
+    Returns:
+        Dictionary with "results" (best first) and "count", or an "error"
+        entry
+    """
+    try:
+        items = parsed.get('items') or []
+        skin = parsed.get('skin') or {}
+        if not items:
+            return {"results": [], "count": 0}
+        if not skin.get('undertone') and not skin.get('main_color_rgb'):
+            return {"error": "A skin 'undertone' or 'main_color_rgb' is required"}
+
+        index = get_index(items, parsed.get('index_key'))
+        with stage("ranking"):
+            results = index.top_k(int(parsed.get('top_k', 10)), skin.get('undertone'), skin.get('main_color_rgb'))
+        return {"results": results, "count": len(index)}
+
+    except Exception as e:
+        return {"error": f"Failed to rank wardrobe: {str(e)}"}
+
+if __name__ == "__main__":
+    # Long-lived mode: one JSON request per line, one JSON response per line
+    if "--worker" in sys.argv[1:]:
+        run_worker(rank_request)
+        sys.exit(0)
+
+    try:
+        parsed = read_request()
+    except Exception as e:
+        print(json.dumps({"error": f"Failed to parse input: {str(e)}"}))
+        sys.exit(0)
+
+    print(json.dumps(run_instrumented(parsed, rank_request)))
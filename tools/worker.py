@@ -0,0 +1,100 @@
+import sys
+import json
+import contextlib
+
+from result_cache import get_cache
+from instrumentation import run_instrumented
+from thread_limits import apply_thread_limits
+
+def read_frame(stream, request):
+    """
+    Attach the raw image frame that follows a request header, if any.
+
+    A header with "image_bytes": N is followed on the stream by exactly N
+    bytes of encoded image data, which are stored as request["image_data"].
+
+    Args:
+        stream: Binary input stream
+        request: Parsed request header
+
+    Returns:
+        The request dictionary
+    """
+    length = request.pop("image_bytes", None)
+    if length is None:
+        return request
+
+    data = stream.read(int(length))
+    if len(data) != int(length):
+        raise ValueError(f"Expected {length} image bytes, got {len(data)}")
+    request["image_data"] = data
+    return request
+
+def read_request():
+    """
+    Read a single request from stdin for one-shot invocations.
+
+    Accepts either a plain JSON document or a JSON header line followed by
+    a raw image frame.
+
+    Returns:
+        Parsed request dictionary
+    """
+    stream = sys.stdin.buffer
+    header = stream.readline()
+    try:
+        request = json.loads(header)
+    except ValueError:
+        request = None
+
+    if isinstance(request, dict) and "image_bytes" in request:
+        return read_frame(stream, request)
+
+    return json.loads(header + stream.read())
+
+def run_worker(handle_request):
+    """
+    Serve analysis requests from a long-lived process.
+
+    Reads one JSON request per line from stdin and writes one JSON response
+    per line to stdout. A request may be followed by a raw image frame (see
+    read_frame). Each response carries the "id" of its request so the caller
+    can match responses to pending requests. A request with
+    "op": "cache_stats" returns the result cache counters instead, and
+    "metrics" / "profile" flags add instrumentation (see
+    instrumentation.run_instrumented). Anything the handler prints is
+    redirected to stderr so it cannot corrupt the response stream.
+
+    The process is limited to ANALYSIS_THREADS threads before the first
+    request (see thread_limits.apply_thread_limits).
+
+    Args:
+        handle_request: Callable taking the parsed request dictionary and
+            returning a JSON-serializable result
+    """
+    apply_thread_limits()
+    stream = sys.stdin.buffer
+    out = sys.stdout
+
+    while True:
+        line = stream.readline()
+        if not line:
+            break
+        if not line.strip():
+            continue
+
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            read_frame(stream, request)
+            if request.get("op") == "cache_stats":
+                result = get_cache().stats()
+            else:
+                with contextlib.redirect_stdout(sys.stderr):
+                    result = run_instrumented(request, handle_request)
+        except Exception as e:
+            result = {"error": f"Failed to process request: {str(e)}"}
+
+        out.write(json.dumps({"id": request_id, "result": result}) + "\n")
+        out.flush()